@@ -3,12 +3,18 @@ import json
 import re
 import os
 import base64
-from typing import List, Dict, Any
+import time
+import random
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from colorama import Fore, Style
 from config import Config
 from rag_engine import RAGEngine
 from document_processor import DocumentProcessor
 from pdf_processor import PDFProcessor
+import tracing
+from json_stream import JSONArrayStream, parse_json_reply
+from prompt_encoder import EvidenceTable, encode_decision_fields, encode_index_ranges, log_reduction
+import metrics
 
 def extract_json_from_response(text):
     """
@@ -22,19 +28,187 @@ def extract_json_from_response(text):
         return match.group(0)
     return text
 
+# Errors worth another attempt: timeouts, dropped connections, rate limits and 5xx responses
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+ANALYSIS_KEYS = ("fields_to_fill", "restored_cells")
+DECISION_KEYS = ("filled_cells", "restored_cells")
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """Full-jitter exponential backoff; a Retry-After header of a rate limit response takes precedence"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(Config.LLM_BACKOFF_MAX, Config.LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _answered(result: Dict[str, Any], keys) -> set:
+    return {cell.get("index") for key in keys for cell in result.get(key) or []}
+
+
 class AIClient:
-    def __init__(self):
+    def __init__(self, collection: str = None):
+        # Retries are done by _with_retries, which also covers streamed replies
         self.client = openai.OpenAI(
             api_key=Config.OPENAI_API_KEY,
-            base_url=Config.OPENAI_BASE_URL
+            base_url=Config.OPENAI_BASE_URL,
+            timeout=Config.LLM_TIMEOUT,
+            max_retries=0
         )
         self.model = Config.OPENAI_MODEL
-        self.rag_engine = RAGEngine()
+        self.rag_engine = RAGEngine(collection=collection)
         self.doc_processor = DocumentProcessor()
         self.pdf_processor = PDFProcessor()
 
-    def analyze_empty_fields_by_index(self, document_content: str) -> Dict[str, Any]:
-        """Analyze all indexed fields in the document, decide which need to be filled, and restore content for those that do not."""
+    @staticmethod
+    def _payload_size(messages: List[Dict[str, Any]]):
+        """Characters of text and bytes of base64 images in the request messages"""
+        image_bytes = 0
+        prompt_chars = 0
+        for message in messages:
+            content = message.get("content")
+            parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+            for part in parts:
+                if part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    image_bytes += len(url.split("base64,", 1)[-1]) * 3 // 4
+                else:
+                    prompt_chars += len(part.get("text") or "")
+        return prompt_chars, image_bytes
+
+    @staticmethod
+    def _record_usage(operation: str, attrs: Dict[str, Any], usage):
+        if usage is None:
+            return
+        attrs["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+        attrs["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+        metrics.LLM_TOKENS.labels(operation=operation, kind="prompt").inc(attrs["prompt_tokens"])
+        metrics.LLM_TOKENS.labels(operation=operation, kind="completion").inc(attrs["completion_tokens"])
+
+    def _with_retries(self, operation: str, call: Callable[[], Any], can_retry: Callable[[], bool] = lambda: True):
+        """
+        Run `call`, retrying timeouts, connection errors, rate limits and 5xx
+        responses up to Config.LLM_MAX_RETRIES times with jittered exponential
+        backoff. `can_retry` vetoes a retry (e.g. once part of a stream was used).
+        """
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= Config.LLM_MAX_RETRIES or not can_retry():
+                    raise
+                delay = backoff_delay(attempt, e)
+                attempt += 1
+                metrics.LLM_RETRIES.labels(operation=operation, error=type(e).__name__).inc()
+                tracing.increment("llm.retries")
+                print(f"{Fore.YELLOW}{operation}: {type(e).__name__}, retry {attempt}/{Config.LLM_MAX_RETRIES} "
+                      f"in {delay:.1f}s{Style.RESET_ALL}")
+                time.sleep(delay)
+
+    def _chat_completion(self, operation: str, **kwargs):
+        """chat.completions.create wrapped in a tracing span with token usage and image payload size"""
+        prompt_chars, image_bytes = self._payload_size(kwargs.get("messages", []))
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span(f"llm.{operation}", model=kwargs.get("model", self.model),
+                              prompt_chars=prompt_chars, image_bytes=image_bytes) as attrs:
+                response = self._with_retries(operation, lambda: self.client.chat.completions.create(**kwargs))
+                self._record_usage(operation, attrs, getattr(response, "usage", None))
+            status = "ok"
+        finally:
+            metrics.LLM_CALLS.labels(operation=operation, status=status).inc()
+            metrics.LLM_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+            if image_bytes:
+                metrics.LLM_IMAGE_BYTES.labels(operation=operation).inc(image_bytes)
+        tracing.increment("llm.calls")
+        return response
+
+    def _stream_completion(self, operation: str, on_text: Callable[[str], None], **kwargs) -> str:
+        """
+        Streaming variant of _chat_completion: `on_text` receives every content
+        delta as it arrives; returns the whole reply text. Time to the first
+        token is traced and exported as a metric.
+        """
+        prompt_chars, image_bytes = self._payload_size(kwargs.get("messages", []))
+        started = time.perf_counter()
+        status = "error"
+        parts: List[str] = []
+        try:
+            with tracing.span(f"llm.{operation}", model=kwargs.get("model", self.model), stream=True,
+                              prompt_chars=prompt_chars, image_bytes=image_bytes) as attrs:
+                usage = []
+
+                def consume():
+                    try:
+                        stream = self.client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+                    except openai.BadRequestError:
+                        # Some OpenAI-compatible servers reject stream_options; usage is then not reported
+                        stream = self.client.chat.completions.create(stream=True, **kwargs)
+                    for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            usage.append(chunk.usage)
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        if not parts:
+                            first_token = time.perf_counter() - started
+                            attrs["first_token_s"] = round(first_token, 4)
+                            metrics.LLM_FIRST_TOKEN.labels(operation=operation).observe(first_token)
+                        parts.append(delta)
+                        on_text(delta)
+
+                # A stream that broke after text was handed on is not restarted; callers keep what arrived
+                self._with_retries(operation, consume, can_retry=lambda: not parts)
+                self._record_usage(operation, attrs, usage[-1] if usage else None)
+            status = "ok"
+        finally:
+            metrics.LLM_CALLS.labels(operation=operation, status=status).inc()
+            metrics.LLM_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+            if image_bytes:
+                metrics.LLM_IMAGE_BYTES.labels(operation=operation).inc(image_bytes)
+        tracing.increment("llm.calls")
+        return "".join(parts)
+
+    def _analysis_completion(self, operation: str, stream: JSONArrayStream,
+                             on_field: Optional[Callable[[Dict[str, Any]], None]], **kwargs) -> str:
+        """
+        Reply text of a field analysis call. With Config.LLM_STREAMING the reply is
+        streamed into `stream` and `on_field` is called with each "fields_to_fill"
+        entry as soon as it is complete, while the model is still generating.
+        """
+        if not Config.LLM_STREAMING:
+            response = self._chat_completion(operation, **kwargs)
+            print("AI raw response:", response)
+            return response.choices[0].message.content
+
+        def on_text(delta: str):
+            for key, element in stream.feed(delta):
+                if key == "fields_to_fill" and on_field:
+                    on_field(element)
+
+        return self._stream_completion(operation, on_text, **kwargs)
+
+    def analyze_empty_fields_by_index(self, document_content: str, candidates: Optional[List[int]] = None,
+                                      on_field: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                      expected: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Analyze all indexed fields in the document, decide which need to be filled, and restore content for those that do not.
+        With `candidates`, only those cell indices are analyzed; the rest were already resolved locally.
+        `on_field` is called with each field to fill as soon as it is streamed (Config.LLM_STREAMING).
+        `expected` are the indices the reply must cover (default `candidates`); missing ones are asked for again.
+        """
+        result = self._analyze_text_once(document_content, candidates, on_field)
+        return self._complete_analysis(result, document_content, expected or candidates, on_field)
+
+    def _analyze_text_once(self, document_content: str, candidates: Optional[List[int]],
+                           on_field: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
         prompt = f"""
         You are given a document with all table cells labeled with an [index] (e.g., [1], [2], etc.).
         For each cell:
@@ -58,13 +232,16 @@ class AIClient:
           ]
         }}
         
+        {self._candidate_note(candidates)}
         Document content:
         {document_content}
 
         Only return valid JSON.
         """
+        stream = JSONArrayStream(("fields_to_fill", "restored_cells"))
+        result = None
         try:
-            response = self.client.chat.completions.create(
+            result = self._analysis_completion("analyze_fields", stream, on_field,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a smart document understanding assistant, good at understanding labeled fields in tables."},
@@ -72,34 +249,61 @@ class AIClient:
                 ],
                 temperature=0.1
             )
-            print("AI raw response:", response)
-            result = response.choices[0].message.content
             
             print(f"AI response content: {result}")
-            
-            if not result or not result.strip():
-                print("Warning: AI returned empty response")
-                return {"fields_to_fill": [], "restored_cells": []}
-            
-            if result.strip().startswith("```"):
-                match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", result, re.IGNORECASE)
-                if match:
-                    result = match.group(1)
-            
-            print(f"Processed result: {result}")
-            
-            result = extract_json_from_response(result)
-            parsed_result = json.loads(result)
-            print(f"Successfully parsed JSON: {parsed_result}")
-            return parsed_result
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Failed to parse: {result}")
-            return {"fields_to_fill": [], "restored_cells": []}
+            return self._parse_analysis(result)
         except Exception as e:
             print(f"Error analyzing fields by index: {e}")
+            return self._partial_analysis(stream)
+
+    def _complete_analysis(self, result: Dict[str, Any], document_content: str, expected: Optional[List[int]],
+                           on_field: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+        """
+        Ask again, text only, for the expected cells a reply did not cover (cut
+        off, malformed or failed), up to Config.LLM_REASK_ROUNDS times.
+        """
+        if not expected:
+            return result
+        for round_number in range(1, Config.LLM_REASK_ROUNDS + 1):
+            missing = [index for index in expected if index not in _answered(result, ANALYSIS_KEYS)]
+            if not missing:
+                break
+            print(f"{Fore.YELLOW}Analysis did not cover {len(missing)} cells, asking again for those only "
+                  f"(round {round_number}){Style.RESET_ALL}")
+            tracing.increment("llm.reask_cells", len(missing))
+            more = self._analyze_text_once(document_content, missing, on_field)
+            wanted = set(missing)
+            for key in ANALYSIS_KEYS:
+                result.setdefault(key, []).extend(cell for cell in more.get(key) or [] if cell.get("index") in wanted)
+        return result
+
+    @staticmethod
+    def _parse_analysis(result: Optional[str]) -> Dict[str, Any]:
+        if not result or not result.strip():
+            print("Warning: AI returned empty response")
             return {"fields_to_fill": [], "restored_cells": []}
+        parsed, complete = parse_json_reply(result, ANALYSIS_KEYS)
+        if not complete:
+            print(f"{Fore.YELLOW}Analysis reply is not valid JSON, kept {len(parsed['fields_to_fill'])} complete "
+                  f"fields and {len(parsed['restored_cells'])} restored cells{Style.RESET_ALL}")
+        return parsed
+
+    @staticmethod
+    def _partial_analysis(stream: JSONArrayStream) -> Dict[str, Any]:
+        """Entries that were complete before a streamed reply broke off or turned out not to be valid JSON"""
+        partial = stream.partial()
+        if partial["fields_to_fill"]:
+            print(f"{Fore.YELLOW}Using {len(partial['fields_to_fill'])} fields received before the reply failed{Style.RESET_ALL}")
+        return partial
+
+    @staticmethod
+    def _candidate_note(candidates: Optional[List[int]]) -> str:
+        """Prompt line restricting the analysis to the cells the local pre-classifier left undecided"""
+        if candidates is None:
+            return ""
+        return (f"Candidate cells: {encode_index_ranges(candidates)}\n"
+                "        Only these indices are undecided; all other cells are labels, headers or fixed text that are already handled. "
+                "Return only candidate indices in either list.\n")
 
     def search_with_rag(self, field_info: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         if self.rag_engine.get_index_stats()["document_count"] == 0:
@@ -107,17 +311,18 @@ class AIClient:
             return []
 
         all_results = []
-        for field in field_info:
+        with tracing.span("rag.search", field_count=len(field_info)) as attrs:
+            batch_results = self.rag_engine.semantic_search_batch(field_info, top_k=3)
+            attrs["hit_fields"] = sum(1 for results in batch_results if results)
+        for field, results in zip(field_info, batch_results):
             index = field.get("index")
             desc = field.get("description", "")
             print(f"\n{Fore.CYAN} Field [{index}] - {desc}{Style.RESET_ALL}")
 
-            results = self.rag_engine.semantic_search([field], top_k=3)
-
             if results:
                 for i, r in enumerate(results, 1):
                     content = r.get("content", "").strip()
-                    score = r.get("similarity_score", 0)
+                    score = r.get("rerank_score", r.get("similarity_score", 0))
                     print(f"{Fore.GREEN}  {i}. Score: {score:.3f}{Style.RESET_ALL}")
                     print(f"     Content: {content}")
             else:
@@ -153,7 +358,7 @@ class AIClient:
         }}
         """
         try:
-            response = self.client.chat.completions.create(
+            response = self._chat_completion("fill_with_rag",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a professional document filling assistant using RAG."},
@@ -185,13 +390,20 @@ class AIClient:
     def update_rag_index(self, new_documents: List[Dict[str, Any]]):
         self.rag_engine.update_index(new_documents)
 
+    def use_collection(self, collection: str):
+        self.rag_engine.use_collection(collection)
+
     def fill_document(self, field_info: List[Dict[str, Any]], user_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         return self.fill_document_with_rag(field_info, user_data)
 
-    def final_fill_decision(self, all_fields: list, described_fields: list) -> dict:
+    def final_fill_decision(self, all_fields: list, described_fields: list, evidence: Optional[EvidenceTable] = None) -> dict:
         """
         Let the LLM decide, for each cell, whether to fill it (and with what content) or restore its original content,
         based on the cell's content, description, and RAG evidence.
+        Described fields carry either their own 'rag_evidence' hits or 'evidence_refs'
+        into the shared `evidence` table from RAGEngine.retrieve_evidence.
+        Cells missing from the reply (cut off, malformed, failed call) are asked for
+        again on their own; cells still without a decision keep their original text.
         """
         index_to_desc = {f["index"]: f for f in described_fields}
         merged_fields = []
@@ -201,14 +413,103 @@ class AIClient:
             merged = field.copy()
             merged["description"] = desc_info.get("description", "")
             merged["suggested_content_type"] = desc_info.get("suggested_content_type", "")
-            merged["rag_evidence"] = desc_info.get("rag_evidence", [])
+            if evidence is not None and "evidence_refs" in desc_info:
+                merged["evidence_refs"] = desc_info["evidence_refs"]
+            else:
+                merged["rag_evidence"] = desc_info.get("rag_evidence", [])
             merged_fields.append(merged)
 
-        prompt = f"""
-        You are an intelligent document filling assistant. For each table cell (with index), you are given:
+        result = self._decision_once(merged_fields, evidence)
+        for round_number in range(1, Config.LLM_REASK_ROUNDS + 1):
+            answered = _answered(result, DECISION_KEYS)
+            missing = [field for field in merged_fields if field["index"] not in answered]
+            if not missing:
+                break
+            print(f"{Fore.YELLOW}Decision did not cover {len(missing)} cells, asking again for those only "
+                  f"(round {round_number}){Style.RESET_ALL}")
+            tracing.increment("llm.reask_cells", len(missing))
+            more = self._decision_once(*self._scoped_evidence(missing, evidence))
+            wanted = {field["index"] for field in missing}
+            for key in DECISION_KEYS:
+                result.setdefault(key, []).extend(cell for cell in more.get(key) or [] if cell.get("index") in wanted)
+
+        answered = _answered(result, DECISION_KEYS)
+        unanswered = [field for field in merged_fields if field["index"] not in answered]
+        if unanswered:
+            # Never leave [index] tags in the output: cells without a decision keep their original text
+            print(f"{Fore.YELLOW}{len(unanswered)} cells got no decision, keeping their original text{Style.RESET_ALL}")
+            result.setdefault("restored_cells", []).extend(
+                {"index": field["index"], "restored_content": field.get("text", "")} for field in unanswered)
+        return result
+
+    @staticmethod
+    def _scoped_evidence(fields: List[Dict[str, Any]],
+                         evidence: Optional[EvidenceTable]) -> Tuple[List[Dict[str, Any]], Optional[EvidenceTable]]:
+        """Copies of `fields` with their evidence references renumbered into a table of only the chunks they cite"""
+        if evidence is None:
+            return fields, None
+        scoped = EvidenceTable()
+        remapped = []
+        for field in fields:
+            if "evidence_refs" in field:
+                field = dict(field, evidence_refs=[scoped.add(evidence.get(ref)) for ref in field["evidence_refs"]])
+            remapped.append(field)
+        return remapped, scoped
+
+    def _decision_once(self, merged_fields: List[Dict[str, Any]], evidence: Optional[EvidenceTable]) -> Dict[str, Any]:
+        """One decision call; a failed call or malformed reply yields the cells that were complete"""
+        if Config.PROMPT_COMPACT:
+            prompt = self._compact_decision_prompt(merged_fields, evidence)
+        else:
+            legacy_fields = []
+            for merged in merged_fields:
+                merged = dict(merged)
+                if "evidence_refs" in merged:
+                    merged["rag_evidence"] = [evidence.get(ref) for ref in merged.pop("evidence_refs")]
+                legacy_fields.append(merged)
+            prompt = self._decision_prompt(json.dumps(legacy_fields, ensure_ascii=False, indent=2))
+        try:
+            response = self._chat_completion("decision",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a professional document filling assistant using RAG."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2
+            )
+            print("AI raw response:", response)
+            result, complete = parse_json_reply(response.choices[0].message.content, DECISION_KEYS)
+            if not complete:
+                print(f"{Fore.YELLOW}Decision reply is not valid JSON, kept {len(result['filled_cells'])} filled "
+                      f"and {len(result['restored_cells'])} restored cells{Style.RESET_ALL}")
+            return result
+        except Exception as e:
+            print(f"Error in final fill decision: {e}")
+            return {"filled_cells": [], "restored_cells": []}
+
+    def _decision_prompt(self, fields_block: str, evidence_block: Optional[str] = None) -> str:
+        if evidence_block is None:
+            input_description = """
         - The cell's current content (may include an [index] tag)
         - A semantic description of what the cell means
-        - RAG evidence (knowledge base search results, may be empty)
+        - RAG evidence (knowledge base search results, may be empty)"""
+            inputs = f"""Input fields:
+        {fields_block}"""
+        else:
+            input_description = """
+        - The cell's current content, in quotes
+        - A semantic description of what the cell means and the expected content type (only for cells the analysis marked as fillable)
+        - The ids of its RAG evidence (knowledge base search results, listed once under Evidence; may be empty)
+
+        Cells are given one per line as: [index] "current content" | meaning | content type | evidence: E1,E2"""
+            inputs = f"""Cells:
+{fields_block}
+
+        Evidence:
+{evidence_block}"""
+
+        return f"""
+        You are an intelligent document filling assistant. For each table cell (with index), you are given:{input_description}
 
         For each cell:
         - If there is enough RAG evidence to fill the cell, output the content to fill. (If there is placeholder in the cell, keep it and append the content to fill after it)
@@ -224,34 +525,37 @@ class AIClient:
           ]
         }}
 
-        Input fields:
-        {json.dumps(merged_fields, ensure_ascii=False, indent=2)}
+        {inputs}
 
         Only return valid JSON.
         """
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional document filling assistant using RAG."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2
-            )
-            print("AI raw response:", response)
-            result = response.choices[0].message.content
-            if result.strip().startswith("```"):
-                match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", result, re.IGNORECASE)
-                if match:
-                    result = match.group(1)
-            result = extract_json_from_response(result)
-            return json.loads(result)
-        except Exception as e:
-            print(f"Error in final fill decision: {e}")
-            return {"filled_cells": [], "restored_cells": []}
 
-    def analyze_empty_fields_with_images(self, document_content: str, page_images: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze empty fields in document using both images and text content"""
+    def _compact_decision_prompt(self, merged_fields: List[Dict[str, Any]], evidence: Optional[EvidenceTable] = None) -> str:
+        """Decision prompt with one line per cell and every evidence chunk listed once"""
+        fields_block, evidence_block = encode_decision_fields(merged_fields, evidence)
+        if Config.PROMPT_REDUCTION_REPORT:
+            legacy_fields = [{**{k: v for k, v in field.items() if k != "evidence_refs"},
+                              "rag_evidence": [evidence.get(ref) for ref in field.get("evidence_refs", [])]
+                              if "evidence_refs" in field else field.get("rag_evidence", [])}
+                             for field in merged_fields]
+            log_reduction("Decision prompt", json.dumps(legacy_fields, ensure_ascii=False, indent=2, default=str),
+                          f"{fields_block}\n{evidence_block}")
+        return self._decision_prompt(fields_block, evidence_block)
+
+    def analyze_empty_fields_with_images(self, document_content: str, page_images: List[Dict[str, Any]],
+                                         candidates: Optional[List[int]] = None,
+                                         on_field: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                         expected: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Analyze empty fields in document using both images and text content;
+        `candidates`, `on_field` and `expected` as in analyze_empty_fields_by_index.
+        """
+        result = self._analyze_with_images_once(document_content, page_images, candidates, on_field)
+        return self._complete_analysis(result, document_content, expected or candidates, on_field)
+
+    def _analyze_with_images_once(self, document_content: str, page_images: List[Dict[str, Any]],
+                                  candidates: Optional[List[int]],
+                                  on_field: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
         
         messages = [
             {
@@ -310,6 +614,7 @@ class AIClient:
           ]
         }}
 
+        {self._candidate_note(candidates)}
         Document text content:
         {document_content}
 
@@ -322,42 +627,21 @@ class AIClient:
             "content": prompt
         })
         
+        stream = JSONArrayStream(("fields_to_fill", "restored_cells"))
+        result = None
         try:
-            response = self.client.chat.completions.create(
+            result = self._analysis_completion("analyze_fields_vision", stream, on_field,
                 model=self.model,
                 messages=messages,
                 temperature=0.1,
                 max_tokens=20000
             )
             
-            print("AI raw response:", response)
-            result = response.choices[0].message.content
-            
             print(f"AI response content: {result}")
-            
-            if not result or not result.strip():
-                print("Warning: AI returned empty response")
-                return {"fields_to_fill": [], "restored_cells": []}
-            
-            if result.strip().startswith("```"):
-                match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", result, re.IGNORECASE)
-                if match:
-                    result = match.group(1)
-            
-            print(f"Processed result: {result}")
-            
-            result = extract_json_from_response(result)
-            parsed_result = json.loads(result)
-            print(f"Successfully parsed JSON: {parsed_result}")
-            return parsed_result
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Failed to parse: {result}")
-            return {"fields_to_fill": [], "restored_cells": []}
+            return self._parse_analysis(result)
         except Exception as e:
             print(f"Error analyzing fields with images: {e}")
-            return {"fields_to_fill": [], "restored_cells": []}
+            return self._partial_analysis(stream)
 
     def split_text_with_llm(self, text: str, max_chunk_length: int = 300) -> list:
         """
@@ -373,7 +657,7 @@ class AIClient:
         {text}
         """
         try:
-            response = self.client.chat.completions.create(
+            response = self._chat_completion("split_text",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are an intelligent assistant skilled at splitting long text into semantically complete chunks."},
@@ -520,7 +804,7 @@ class AIClient:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = self._chat_completion("extract_knowledge",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a professional document knowledge extraction assistant, skilled at extracting structured information from various documents."},
@@ -593,7 +877,7 @@ class AIClient:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = self._chat_completion("extract_knowledge_legacy",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a professional document understanding assistant, skilled at extracting knowledge from files."},
@@ -0,0 +1,89 @@
+import re
+import math
+import heapq
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable
+
+_CJK_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_WORD = re.compile(r'[a-z0-9]+(?:[._@/:+-][a-z0-9]+)*')
+_WORD_PART = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize mixed Chinese/Latin text for lexical retrieval.
+    CJK runs become overlapping bigrams (single characters stay unigrams);
+    Latin words and numbers are kept whole, and compound tokens such as
+    emails, dates or phone numbers are also emitted with their parts.
+    """
+    if not text:
+        return []
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in _WORD.findall(text):
+        tokens.append(word)
+        parts = _WORD_PART.findall(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+            # "138-1234-5678" and "13812345678" should match each other
+            tokens.append(''.join(parts))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = 60) -> Dict[int, float]:
+    """Fuse several ranked lists of document positions with reciprocal-rank fusion"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_pos in enumerate(ranking, 1):
+            fused[doc_pos] = fused.get(doc_pos, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+class BM25Index:
+    """Incremental inverted index scored with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, texts: Iterable[str]):
+        """Append documents; their positions continue after the existing ones"""
+        for text in texts:
+            doc_pos = len(self.doc_lengths)
+            term_freqs = Counter(tokenize(text))
+            for term, freq in term_freqs.items():
+                self.postings.setdefault(term, {})[doc_pos] = freq
+            length = sum(term_freqs.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Return (document position, score) pairs, best first"""
+        doc_count = len(self.doc_lengths)
+        if doc_count == 0:
+            return []
+        avg_length = self.total_length / doc_count or 1.0
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_pos, freq in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_pos] / avg_length)
+                scores[doc_pos] = scores.get(doc_pos, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,94 @@
+import re
+import math
+from typing import List, Dict, Any, Tuple, Optional
+
+from config import Config
+from fact_index import canonical_field
+
+# Blanks inside a cell that the model is expected to fill in place
+PLACEHOLDER_PATTERN = re.compile(r'_{2,}|＿{2,}|□|☐|（\s*）|\(\s*\)|年\s+月\s+日|[Xx×]{3,}|…|\.{3,}')
+# Text that is already a value (numbers, dates, amounts, e-mail addresses)
+VALUE_PATTERN = re.compile(r'^[\d\s\-/.:：年月日号%¥$,，+]+$|^[\w.+-]+@[\w-]+(\.[\w-]+)+$')
+
+# Logistic weights of the static-cell score; positive pushes towards "static"
+WEIGHTS = {
+    'bias': -1.0,
+    'long_text': 3.0,        # prose, notes, instructions
+    'labels_empty': 2.0,     # the cell to the right or below is empty
+    'colon_label': 1.0,      # "姓名：" next to an empty cell
+    'colon_inline': -3.0,    # "姓名：" with no empty neighbour: the value goes into this cell
+    'known_label': 1.0,      # a label of the fact index vocabulary
+    'short_text': 1.0,
+    'bold': 1.5,
+    'first_row': 1.0,        # title / column headers
+    'merged': 2.0,           # same text as an adjacent cell (merged cell)
+    'value': 0.5,            # already filled in
+}
+
+
+def _cell_key(field: Dict[str, Any]) -> Tuple[Any, int, int]:
+    table = field.get('sheet_name') if field.get('type') == 'excel_cell' else field.get('table_index')
+    return table, field.get('row_index'), field.get('col_index')
+
+
+def _is_bold(field: Dict[str, Any]) -> bool:
+    if 'bold' in field:
+        return bool(field['bold'])
+    runs = [run for paragraph in (field.get('original_format') or {}).get('paragraphs', [])
+            for run in paragraph.get('runs', []) if (run.get('text') or '').strip()]
+    return bool(runs) and all(run.get('bold') for run in runs)
+
+
+def cell_features(field: Dict[str, Any], grid: Dict[Tuple[Any, int, int], Dict[str, Any]],
+                  first_rows: Dict[Any, int]) -> Dict[str, float]:
+    """Binary features of a non-empty cell for the static-cell score"""
+    text = (field.get('text') or '').strip()
+    table, row, col = _cell_key(field)
+    neighbours = [grid.get((table, row, col + 1)), grid.get((table, row + 1, col))]
+    previous = [grid.get((table, row, col - 1)), grid.get((table, row - 1, col))]
+    labels_empty = any(n is not None and not (n.get('text') or '').strip() for n in neighbours)
+    colon = text.endswith((':', '：'))
+    return {
+        'long_text': float(len(text) >= Config.CELL_STATIC_MIN_CHARS),
+        'labels_empty': float(labels_empty),
+        'colon_label': float(colon and labels_empty),
+        'colon_inline': float(colon and not labels_empty),
+        'known_label': float(canonical_field(text) is not None),
+        'short_text': float(len(text) <= 12 and not VALUE_PATTERN.match(text)),
+        'bold': float(_is_bold(field)),
+        'first_row': float(row == first_rows.get(table)),
+        'merged': float(any(n is not None and (n.get('text') or '').strip() == text for n in neighbours + previous)),
+        'value': float(bool(VALUE_PATTERN.match(text))),
+    }
+
+
+def static_probability(features: Dict[str, float]) -> float:
+    score = WEIGHTS['bias'] + sum(WEIGHTS[name] * value for name, value in features.items())
+    return 1 / (1 + math.exp(-score))
+
+
+def classify_cells(all_fields: List[Dict[str, Any]],
+                   threshold: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split numbered cells into cells resolved locally and cells for the model.
+    Empty cells and cells with in-place blanks always go to the model; other
+    cells are static (restored unchanged) when their score reaches `threshold`
+    (default Config.CELL_STATIC_THRESHOLD). Returns (restored_cells, model_fields).
+    """
+    threshold = Config.CELL_STATIC_THRESHOLD if threshold is None else threshold
+    grid = {_cell_key(field): field for field in all_fields}
+    first_rows: Dict[Any, int] = {}
+    for table, row, _ in grid:
+        first_rows[table] = min(row, first_rows.get(table, row))
+
+    restored, model_fields = [], []
+    for field in all_fields:
+        text = (field.get('text') or '').strip()
+        if not text or PLACEHOLDER_PATTERN.search(text):
+            model_fields.append(field)
+            continue
+        if static_probability(cell_features(field, grid, first_rows)) >= threshold:
+            restored.append({'index': field['index'], 'restored_content': field.get('text', '')})
+        else:
+            model_fields.append(field)
+    return restored, model_fields
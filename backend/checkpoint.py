@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import uuid
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Set
+from colorama import Fore, Style
+
+from config import Config
+
+# Bump when the shape of a stored stage result changes
+CHECKPOINT_VERSION = 1
+
+# Run directories in use by this process, never claimed by a resumed run
+_active_runs: Set[str] = set()
+_active_lock = threading.Lock()
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_key(file_path: str, collection: Optional[str] = None, knowledge: Optional[str] = None) -> str:
+    """
+    Checkpoint key of a form: hash of the file contents, the knowledge
+    collection it is filled from and the version of that collection's
+    contents (see RAGCollection.knowledge_version), so ingesting new
+    knowledge starts the form over instead of resuming stale evidence.
+    """
+    key = f"{CHECKPOINT_VERSION}:{collection or ''}:{knowledge or ''}:{file_sha256(file_path)}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _new_run_id() -> str:
+    return f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+
+
+class CheckpointStore:
+    """
+    Stage results of one form run, one pickle per stage under
+    Config.CHECKPOINT_DIR/<input key>/<run id>, plus a manifest.json listing
+    the stored stages. Every run has its own directory, so two runs of the
+    same form never write to or delete each other's results; a resumed run
+    takes over the directory of the latest unfinished run by renaming it.
+    Results keep python-docx values (alignments, colors) of the numbered
+    cells, hence pickle rather than JSON. A result refers to files (numbered
+    document, page images) that it is only valid with; it is not loaded once
+    any of them is gone. Once the run succeeds its directory is deleted and
+    only <input key>/completed.json with the output path is kept.
+    """
+
+    def __init__(self, key: str, source: Optional[str] = None, directory: Optional[str] = None,
+                 run: Optional[str] = None):
+        self.key = key
+        self.source = source
+        self.root = os.path.join(directory or Config.CHECKPOINT_DIR, key)
+        self.run = run or _new_run_id()
+        self.directory = os.path.join(self.root, self.run)
+        self.lock = threading.Lock()
+        with _active_lock:
+            _active_runs.add(self.directory)
+
+    @classmethod
+    def open(cls, key: str, source: Optional[str] = None, resume: bool = False,
+             directory: Optional[str] = None) -> 'CheckpointStore':
+        """Store of a new run; with resume=True it continues the latest unfinished run of the form, if any"""
+        store = cls(key, source=source, directory=directory)
+        if resume:
+            store._claim_latest_run()
+        return store
+
+    def _claim_latest_run(self):
+        try:
+            runs = sorted((name for name in os.listdir(self.root)
+                           if os.path.isdir(os.path.join(self.root, name))), reverse=True)
+        except OSError:
+            return
+        for run in runs:
+            path = os.path.join(self.root, run)
+            with _active_lock:
+                if path in _active_runs:
+                    continue
+                try:
+                    # The rename fails for every other run trying to claim the same directory
+                    os.rename(path, self.directory)
+                except OSError:
+                    continue
+            return
+
+    def release(self):
+        """The run is over; its directory (if left) may now be resumed or pruned"""
+        with _active_lock:
+            _active_runs.discard(self.directory)
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.directory, f"{stage}.pkl")
+
+    def load(self, stage: str) -> Tuple[bool, Any]:
+        """(True, result) for a stored stage whose files still exist, else (False, None)"""
+        path = self._path(stage)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, 'rb') as f:
+                record = pickle.load(f)
+        except Exception as e:
+            print(f"{Fore.YELLOW}Ignoring unreadable checkpoint {path}: {e}{Style.RESET_ALL}")
+            return False, None
+        if record.get('version') != CHECKPOINT_VERSION:
+            return False, None
+        missing = [file for file in record.get('files') or [] if not os.path.exists(file)]
+        if missing:
+            print(f"{Fore.YELLOW}Checkpoint of stage '{stage}' refers to missing files ({missing[0]}), "
+                  f"running it again{Style.RESET_ALL}")
+            return False, None
+        return True, record['value']
+
+    def save(self, stage: str, value: Any, files: Iterable[str] = ()):
+        record = {'version': CHECKPOINT_VERSION, 'stage': stage, 'saved': time.time(),
+                  'files': [file for file in files if file], 'value': value}
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(self._path(stage), pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+            manifest = self.manifest()
+            manifest.update({'key': self.key, 'source': os.path.basename(self.source) if self.source else None})
+            manifest.setdefault('stages', {})[stage] = record['saved']
+            self._write(os.path.join(self.directory, 'manifest.json'),
+                        json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.directory, 'manifest.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stages(self) -> List[str]:
+        """Stages with a stored result"""
+        return list(self.manifest().get('stages', {}))
+
+    def complete(self, output: str):
+        """Drop the stage results of a finished run, keeping only where its output went"""
+        completed = {'key': self.key, 'source': os.path.basename(self.source) if self.source else None,
+                     'output': os.path.abspath(output), 'completed': time.time()}
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self._write(os.path.join(self.root, 'completed.json'),
+                        json.dumps(completed, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def completed_output(self) -> Optional[str]:
+        """Output of an earlier successful run of the form, if it still exists"""
+        try:
+            with open(os.path.join(self.root, 'completed.json'), 'r', encoding='utf-8') as f:
+                output = json.load(f).get('output')
+        except (OSError, ValueError):
+            return None
+        return output if output and os.path.exists(output) else None
+
+    def clear(self):
+        """Remove the stage results of this run"""
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    @staticmethod
+    def clear_all(directory: Optional[str] = None) -> int:
+        """Remove the checkpoints of all forms, returns how many forms had checkpoints"""
+        directory = directory or Config.CHECKPOINT_DIR
+        if not os.path.isdir(directory):
+            return 0
+        removed = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def prune(max_age: float, directory: Optional[str] = None) -> int:
+        """Remove runs and completion records not touched for max_age seconds, returns how many were removed"""
+        directory = directory or Config.CHECKPOINT_DIR
+        if not os.path.isdir(directory):
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for key in os.listdir(directory):
+            root = os.path.join(directory, key)
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                with _active_lock:
+                    if path in _active_runs:
+                        continue
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+            try:
+                os.rmdir(root)  # Only succeeds once nothing of the form is left
+            except OSError:
+                pass
+        return removed
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        # Write-then-rename so an interrupted run never leaves a half-written checkpoint
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
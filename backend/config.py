@@ -15,7 +15,92 @@ class Config:
     # Highlight color configuration
     HIGHLIGHT_COLOR = 'FFFF00'  # Yellow
 
+    # RAG collection configuration
+    RAG_COLLECTIONS_DIR = os.path.join(TEMP_DIR, 'rag_collections')
+    RAG_DEFAULT_COLLECTION = 'default'
+    RAG_CACHE_SIZE = 8  # Number of loaded collections kept in memory
+    RAG_INDEX_TYPE = 'flat'  # 'flat' (exact inner product) or 'hnsw' (approximate, for large collections)
+    RAG_HNSW_M = 32  # Graph neighbours per node
+    RAG_HNSW_EF_CONSTRUCTION = 80
+    RAG_HNSW_EF_SEARCH = 64  # Candidate list size at query time (recall vs. latency)
+    RAG_ENCODE_BATCH_SIZE = 32  # Chunks per embedding forward pass
+
+    # RAG retrieval configuration
+    RAG_RETRIEVAL_MODE = 'hybrid'  # 'dense', 'lexical' or 'hybrid'
+    RAG_CANDIDATE_POOL = 20  # Per-retriever candidates fused in hybrid mode
+    RAG_RRF_K = 60  # Reciprocal-rank fusion constant
+    # Field descriptions answered from the lexical index alone when it has hits (matched
+    # against the description only; generic content types such as 'date' or 'number' do not count)
+    RAG_EXACT_VALUE_KEYWORDS = ('身份证', '证件号', '电话', '手机', '邮箱', '编号', '号码',
+                                'phone', 'e-mail', 'email', 'id number', 'id card')
+
+    # Optional cross-encoder re-ranking of retrieved evidence (runs on CPU)
+    RERANK_ENABLED = False
+    RERANK_MODEL = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
+    RERANK_CANDIDATES = 20  # Candidate pool per field taken from the indexes
+    RERANK_TOP_N = 2  # Evidence chunks kept per field after re-ranking
+    RERANK_MIN_SCORE = None  # Drop chunks scoring below this, None keeps all top-N
+    RERANK_MAX_BATCH = 256  # Upper bound on pairs per forward pass
+
+    # LLM call robustness: per-call timeout, retries with jittered exponential backoff for
+    # timeouts / connection errors / 429 / 5xx, and re-asking only for cells a reply left out
+    LLM_TIMEOUT = 120  # Seconds per call (between chunks when streaming)
+    LLM_MAX_RETRIES = 3
+    LLM_BACKOFF_BASE = 1.0  # Seconds; attempt n waits uniform(0, min(MAX, BASE * 2**n))
+    LLM_BACKOFF_MAX = 30.0
+    LLM_REASK_ROUNDS = 1  # Follow-up calls for cells missing from an analysis or decision reply
+
+    # Run independent pipeline stages concurrently (rendering / text extraction / RAG warm-up,
+    # static-cell restore alongside the LLM calls); False runs them one at a time
+    PIPELINE_OVERLAP = True
+
+    # Stream field analysis replies; fields are handed on (evidence prefetch) while the model still generates
+    LLM_STREAMING = True
+
+    # Prompts list one cell per line with evidence referenced by id, without formatting metadata
+    PROMPT_COMPACT = True
+    # Also build the legacy prompt of every table to print and trace the estimated token saving (debugging aid)
+    PROMPT_REDUCTION_REPORT = False
+
+    # Local pre-classification of numbered cells: obviously static cells (labels,
+    # headers, prose) are restored without being sent to the analysis/decision LLM
+    CELL_PRECLASSIFY = True
+    CELL_STATIC_THRESHOLD = 0.8  # Minimum static probability to resolve a cell locally
+    CELL_STATIC_MIN_CHARS = 30  # Text at least this long counts as static prose
+
+    # Field analysis of known form templates (temp/templates), reused on a structural match
+    # so identical forms skip page rendering and the analysis LLM call
+    TEMPLATE_STORE_ENABLED = True
+    TEMPLATE_STORE_DIR = os.path.join(TEMP_DIR, 'templates')
+
+    # Stage results of every form run (mid_docs/checkpoints, keyed by form contents and the
+    # collection contents), so main.py --resume continues a failed run after its last finished stage
+    CHECKPOINT_ENABLED = True
+    CHECKPOINT_DIR = os.path.join(MID_DIR, 'checkpoints')
+    CHECKPOINT_TTL = 7 * 24 * 3600  # Checkpoints of failed runs untouched this long (seconds) are removed
+
+    # Key/value fact index: fields resolved here skip RAG and the decision LLM
+    FACT_INDEX_ENABLED = True
+    FACT_INDEX_MIN_CONFIDENCE = 'high'  # 'high' or 'medium'
+
+    # Run log (temp/document_fill_log_*.txt and structured *.jsonl next to it)
+    LOG_JSON = True  # Also write one JSON record per printed line
+    LOG_FLUSH_INTERVAL = 1.0  # Seconds between flushes of the background writer
+    LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the text and JSON logs beyond this size
+    LOG_BACKUP_COUNT = 3  # Rotated files kept (log.1 ... log.N)
+
+    # Per-document tracing of stages, LLM calls and RAG (temp/traces)
+    TRACING_ENABLED = True
+    TRACE_DIR = os.path.join(TEMP_DIR, 'traces')
+    TRACE_FORMAT = 'json'  # 'json', 'otlp' (OpenTelemetry OTLP/JSON) or 'both'
+    TRACE_SUMMARY = True  # Print a per-run summary table after each document
+
+    # Long-running service mode (main.py --serve)
+    SERVICE_HOST = '127.0.0.1'
+    SERVICE_PORT = 8765
+    SERVICE_WORKERS = 2  # Warm DocumentFiller instances, i.e. concurrent requests
+
     @classmethod
     def create_directories(cls):
-        for directory in [cls.INPUT_DIR, cls.OUTPUT_DIR, cls.TEMP_DIR, cls.MID_DIR]:
-            os.makedirs(directory, exist_ok=True) 
\ No newline at end of file
+        for directory in [cls.INPUT_DIR, cls.OUTPUT_DIR, cls.TEMP_DIR, cls.MID_DIR, cls.RAG_COLLECTIONS_DIR]:
+            os.makedirs(directory, exist_ok=True) 
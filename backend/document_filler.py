@@ -0,0 +1,684 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable
+from colorama import Fore, Style
+
+from config import Config
+from ai_client import AIClient
+from document_processor import DocumentProcessor
+from pdf_processor import PDFProcessor
+import tracing
+from prompt_encoder import EvidenceTable
+from cell_classifier import classify_cells
+from template_store import TemplateStore, template_fingerprint
+from pipeline import StageGraph, StopPipeline
+from checkpoint import CheckpointStore, input_key, file_sha256
+import metrics
+
+class _EvidencePrefetch:
+    """
+    Evidence retrieval for fields streamed by the analysis call, run on one
+    background thread so it overlaps with the model still generating the rest.
+    """
+
+    def __init__(self, rag_engine, top_k: int = 3):
+        self.rag_engine = rag_engine
+        self.top_k = top_k
+        self.tracer = tracing.get_tracer()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-prefetch")
+        self.futures = {}
+
+    def submit(self, field: Dict[str, Any]):
+        key = (field.get("index"), field.get("description"), field.get("suggested_content_type"))
+        if key[0] is not None and key not in self.futures:
+            self.futures[key] = self.executor.submit(self._search, dict(field))
+
+    def _search(self, field: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tracing.set_tracer(self.tracer)
+        with tracing.span("rag.prefetch", index=field.get("index")):
+            return self.rag_engine.semantic_search_batch([field], top_k=self.top_k)[0]
+
+    def results(self, fields: List[Dict[str, Any]]) -> Dict[Any, List[Dict[str, Any]]]:
+        """Hits of the prefetched fields among `fields`; a field whose final description differs is searched again"""
+        hits = {}
+        for field in fields:
+            future = self.futures.get((field.get("index"), field.get("description"), field.get("suggested_content_type")))
+            if future is None:
+                continue
+            try:
+                hits[field["index"]] = future.result()
+            except Exception as e:
+                print(f"{Fore.YELLOW}Prefetch for field [{field['index']}] failed, searching again: {e}{Style.RESET_ALL}")
+        return hits
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DocumentFiller:
+    # Pipeline stages in execution order, reported by progress events
+    PIPELINE_STAGES = ("number_fields", "classify", "render", "extract", "analyze", "fact_lookup", "rag", "decision", "restore", "fill")
+
+    def __init__(self, enable_monitoring: bool = False, monitor_interval: int = 100, collection: str = None):
+        Config.create_directories()
+        self.progress_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.ai_client = AIClient(collection=collection)
+        self.doc_processor = DocumentProcessor()
+        self.pdf_processor = PDFProcessor()
+        self.template_store = TemplateStore() if Config.TEMPLATE_STORE_ENABLED else None
+        
+        self.monitor = None
+        self.enable_monitoring = enable_monitoring
+        self.monitor_interval = monitor_interval
+        if enable_monitoring:
+            from monitor import SystemMonitor
+            self.monitor = SystemMonitor(interval = monitor_interval)
+            print(f"{Fore.GREEN}✓ Document filling system initialized with monitoring capability{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}✓ Document filling system initialized{Style.RESET_ALL}")
+            
+        rag_stats = self.ai_client.get_rag_stats()
+        print(f"{Fore.CYAN}RAG engine status: {rag_stats['status']} (collection: {rag_stats['collection']}){Style.RESET_ALL}")
+
+    def warm_up(self):
+        """Load the embedding model and the current collection before the first form arrives"""
+        self.ai_client.rag_engine.warm_up()
+
+    def use_collection(self, collection: str):
+        """Switch the RAG collection used for ingestion and retrieval"""
+        self.ai_client.use_collection(collection)
+
+    def add_progress_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Register a callback receiving structured progress events"""
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self.progress_listeners:
+            self.progress_listeners.remove(listener)
+
+    def emit_progress(self, event: str, **data):
+        """
+        Send a progress event to all listeners.
+        Events: document_start, stage_start, stage_end, field_evidence, document_end.
+        """
+        payload = {"event": event, "timestamp": time.time(), **data}
+        for listener in list(self.progress_listeners):
+            try:
+                listener(payload)
+            except Exception as e:
+                print(f"{Fore.YELLOW}Progress listener failed: {e}{Style.RESET_ALL}")
+
+    @contextmanager
+    def _stage(self, name: str, **data):
+        """Emit stage_start/stage_end around a pipeline stage; the yielded dict is added to stage_end"""
+        position = self.PIPELINE_STAGES.index(name) + 1 if name in self.PIPELINE_STAGES else None
+        self.emit_progress("stage_start", stage=name, position=position, total=len(self.PIPELINE_STAGES), **data)
+        info: Dict[str, Any] = {}
+        started = time.perf_counter()
+        ok = False
+        if self.monitor:
+            self.monitor.enter_stage(name)
+        try:
+            with tracing.span(f"stage.{name}", **data) as attrs:
+                yield info
+                attrs.update(info)
+            ok = True
+        finally:
+            if self.monitor:
+                self.monitor.exit_stage(name)
+            metrics.STAGE_DURATION.labels(stage=name, status="ok" if ok else "error").observe(time.perf_counter() - started)
+            self.emit_progress("stage_end", stage=name, position=position, total=len(self.PIPELINE_STAGES),
+                               ok=ok, duration=round(time.perf_counter() - started, 3), **info)
+
+    def process_document(self, file_path: str, output_dir: Optional[str] = None, resume: bool = False) -> str:
+        """
+        Fill one form; the filled file is written to output_dir (default Config.OUTPUT_DIR).
+        With resume=True, stages checkpointed by an earlier run of the same form are not run again.
+        """
+        print(f"\n{Fore.CYAN}Start processing document: {file_path}{Style.RESET_ALL}")
+        started = time.perf_counter()
+        self.emit_progress("document_start", file=file_path)
+        
+        if self.enable_monitoring and self.monitor:
+            self.monitor.start_monitoring()
+        tracer = tracing.Tracer(os.path.basename(file_path), file=file_path) if Config.TRACING_ENABLED else None
+        tracing.set_tracer(tracer)
+        output = file_path
+        trace_files: List[str] = []
+        metrics.DOCUMENTS_IN_FLIGHT.inc()
+        try:
+            with tracing.span("process_document", file=os.path.basename(file_path)):
+                output = self._run_pipeline(file_path, output_dir, resume)
+            return output
+        except Exception as e:
+            print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+            if Config.CHECKPOINT_ENABLED:
+                print(f"{Fore.YELLOW}Finished stages are checkpointed, run again with --resume to continue from them{Style.RESET_ALL}")
+            self.emit_progress("error", message=str(e))
+            return file_path
+        finally:
+            metrics.DOCUMENTS_IN_FLIGHT.dec()
+            metrics.DOCUMENTS.labels(status="ok" if output != file_path else "error").inc()
+            metrics.DOCUMENT_DURATION.observe(time.perf_counter() - started)
+            tracing.set_tracer(None)
+            if tracer is not None:
+                trace_files = self._finish_trace(tracer)
+            self.emit_progress("document_end", file=file_path, output=output, ok=output != file_path,
+                               duration=round(time.perf_counter() - started, 3), trace_files=trace_files)
+
+    def _finish_trace(self, tracer: "tracing.Tracer") -> List[str]:
+        """Print the per-run summary table and export the trace"""
+        try:
+            if Config.TRACE_SUMMARY:
+                tracer.print_summary()
+            paths = tracer.save()
+            for path in paths:
+                print(f"{Fore.CYAN}Trace saved to: {path}{Style.RESET_ALL}")
+            return paths
+        except Exception as e:
+            print(f"{Fore.YELLOW}Failed to export trace: {e}{Style.RESET_ALL}")
+            return []
+
+    def _run_pipeline(self, file_path: str, output_dir: Optional[str], resume: bool = False) -> str:
+        """
+        The fill pipeline as a stage graph. Stages start as soon as their inputs
+        are ready: text extraction runs alongside page rendering, the RAG warm-up
+        alongside everything before retrieval, and restoring the locally
+        classified static cells alongside the analysis and decision calls.
+        The numbering, rendering, extraction, analysis, retrieval and decision
+        results are checkpointed under Config.CHECKPOINT_DIR, keyed by the form
+        contents and the collection with its current contents, for resume=True.
+        A successful run deletes them again; those of failed runs expire after
+        Config.CHECKPOINT_TTL.
+        """
+        checkpoint = None
+        if Config.CHECKPOINT_ENABLED:
+            CheckpointStore.prune(Config.CHECKPOINT_TTL)
+            rag_engine = self.ai_client.rag_engine
+            key = input_key(file_path, rag_engine.collection_name, rag_engine.collection.knowledge_version())
+            checkpoint = CheckpointStore.open(key, source=file_path, resume=resume)
+            completed = checkpoint.completed_output() if resume else None
+            if completed:
+                checkpoint.release()
+                print(f"{Fore.GREEN}✓ Already filled in an earlier run: {completed}{Style.RESET_ALL}")
+                return completed
+        graph = StageGraph("fill", max_workers=None if Config.PIPELINE_OVERLAP else 1,
+                           checkpoint=checkpoint, resume=resume)
+        graph.add("number", lambda: self._number_stage(file_path),
+                  checkpoint=lambda number: (number, [number[1]]))
+        graph.add("warm_up", self._warm_up_stage)
+        graph.add("classify", self._classify_stage, ["number"])
+        graph.add("template", self._template_stage, ["number", "classify"])
+        graph.add("render", self._render_stage, ["number", "template"],
+                  checkpoint=lambda render: (render, [page['image_path'] for page in render[0]]))
+        graph.add("extract", self._extract_stage, ["number", "template"], checkpoint=True)
+        graph.add("restore_static", self._restore_static_stage, ["number", "classify"])
+        # The evidence prefetch of a run does not outlive it
+        graph.add("analyze", lambda *args: self._analyze_stage(file_path, *args),
+                  ["number", "classify", "template", "render", "extract"],
+                  checkpoint=lambda analyze: ((analyze[0], None), []))
+        graph.add("fact_lookup", self._fact_lookup_stage, ["number", "classify", "analyze"])
+        graph.add("rag", self._rag_stage, ["analyze", "fact_lookup", "warm_up"], checkpoint=True)
+        graph.add("decision", self._decision_stage, ["classify", "fact_lookup", "rag"], checkpoint=True)
+        graph.add("restore", self._restore_stage, ["number", "restore_static", "decision"])
+        graph.add("fill", lambda *args: self._fill_stage(file_path, output_dir, *args), ["number", "restore", "decision"])
+        try:
+            output = graph.run("fill")
+            if checkpoint:
+                checkpoint.complete(output)
+            return output
+        finally:
+            if checkpoint:
+                checkpoint.release()
+            graph.print_summary()
+            # Stopped or failed before retrieval: the prefetch thread is still up
+            _, prefetch = graph.results.get("analyze") or (None, None)
+            if prefetch:
+                prefetch.close()
+            page_images, pdf_path = graph.results.get("render") or ([], None)
+            if pdf_path:
+                self.pdf_processor.cleanup_temp_files(pdf_path)
+
+    def _number_stage(self, file_path: str):
+        with self._stage("number_fields") as info:
+            print(f"{Fore.YELLOW}Step 1: Number all fields in the document...{Style.RESET_ALL}")
+            # 使用统一的字段标记接口
+            all_fields, numbered_file = self.doc_processor.find_and_number_all_fields(file_path)
+            info["field_count"] = len(all_fields)
+        if not all_fields:
+            print(f"{Fore.RED}No fields found in the document.{Style.RESET_ALL}")
+            raise StopPipeline(file_path)
+        print(f"{Fore.GREEN}Found {len(all_fields)} fields in the document{Style.RESET_ALL}")
+        return all_fields, numbered_file
+
+    def _warm_up_stage(self):
+        with tracing.span("rag.warm_up"):
+            self.warm_up()
+
+    def _classify_stage(self, number):
+        all_fields, numbered_file = number
+        if not Config.CELL_PRECLASSIFY:
+            return [], all_fields, None
+        with self._stage("classify", field_count=len(all_fields)) as info:
+            static_cells, model_fields = self._classify_cells(all_fields)
+            info["static_cells"] = len(static_cells)
+            info["model_cells"] = len(model_fields)
+        if not model_fields:
+            print(f"{Fore.BLUE}All cells are static, nothing to analyze or fill{Style.RESET_ALL}")
+            with self._stage("restore", cell_count=len(static_cells)):
+                restored_file = self._restore_cells(numbered_file, all_fields, static_cells)
+            raise StopPipeline(restored_file)
+        return static_cells, model_fields, [field["index"] for field in model_fields]
+
+    def _template_stage(self, number, classify):
+        all_fields, _ = number
+        fingerprint = template_fingerprint(all_fields, classify[2])
+        return fingerprint, self._lookup_template(fingerprint)
+
+    def _render_stage(self, number, template):
+        if template[1]:
+            return [], None
+        with self._stage("render") as info:
+            page_images, pdf_path = self._render_pages(number[1])
+            info["page_count"] = len(page_images)
+        return page_images, pdf_path
+
+    def _extract_stage(self, number, template):
+        if template[1]:
+            return None
+        with self._stage("extract") as info:
+            doc_text = self.doc_processor.extract_document_content(number[1])
+            info["chars"] = len(doc_text)
+        return doc_text
+
+    def _restore_static_stage(self, number, classify):
+        """Restore the locally classified static cells while the LLM stages run; later restores build on this file"""
+        all_fields, numbered_file = number
+        static_cells = classify[0]
+        if not static_cells:
+            return numbered_file
+        with self._stage("restore", cell_count=len(static_cells), cells="static"):
+            return self._restore_cells(numbered_file, all_fields, static_cells)
+
+    def _analyze_stage(self, file_path: str, number, classify, template, render, extract):
+        _, numbered_file = number
+        fingerprint, ai_response = template
+        prefetch = None
+        if not ai_response:
+            page_images = render[0]
+            if Config.LLM_STREAMING:
+                prefetch = _EvidencePrefetch(self.ai_client.rag_engine)
+            # Without the pre-classifier every numbered cell must be covered by the reply
+            expected = classify[2] if classify[2] is not None else [field["index"] for field in number[0]]
+            try:
+                with self._stage("analyze", with_images=bool(page_images)) as info:
+                    ai_response = self._analyze_fields(extract, page_images, classify[2],
+                                                       on_field=prefetch.submit if prefetch else None, expected=expected)
+                    info["fields_to_fill"] = len(ai_response.get("fields_to_fill") or [])
+                    info["restored_cells"] = len(ai_response.get("restored_cells") or [])
+                    if prefetch:
+                        info["prefetched"] = len(prefetch.futures)
+            except BaseException:
+                if prefetch:
+                    prefetch.close()
+                raise
+            covered = {cell.get("index") for key in ("fields_to_fill", "restored_cells") for cell in ai_response.get(key) or []}
+            if self.template_store and covered >= set(expected):
+                # An analysis that left cells out (failed or cut-off reply) is not reused for later forms
+                self.template_store.save(fingerprint, ai_response, source=file_path)
+        if not ai_response.get("fields_to_fill"):
+            print(f"{Fore.RED}AI did not return any field descriptions.{Style.RESET_ALL}")
+            if prefetch:
+                prefetch.close()
+            raise StopPipeline(numbered_file)
+        return ai_response, prefetch
+
+    def _fact_lookup_stage(self, number, classify, analyze):
+        all_fields = number[0]
+        model_fields = classify[1]
+        described_fields = analyze[0]["fields_to_fill"]
+        with self._stage("fact_lookup") as info:
+            direct_fills = self._answer_fields_from_facts(all_fields, described_fields)
+            info["answered"] = len(direct_fills)
+        if not direct_fills:
+            return described_fields, model_fields, []
+        answered = {cell["index"] for cell in direct_fills}
+        return ([f for f in described_fields if f.get("index") not in answered],
+                [f for f in model_fields if f["index"] not in answered], direct_fills)
+
+    def _rag_stage(self, analyze, fact_lookup, warm_up):
+        """Returns the evidence table and the described fields carrying their evidence references"""
+        prefetch = analyze[1]
+        described_fields = fact_lookup[0]
+        with self._stage("rag", field_count=len(described_fields)) as info:
+            prefetched = {}
+            if prefetch:
+                prefetched = prefetch.results(described_fields)
+                prefetch.close()
+            evidence = self._retrieve_evidence(described_fields, prefetched)
+            info["prefetched"] = len(prefetched)
+            info["fields_with_evidence"] = sum(1 for field in described_fields if field.get("evidence_refs"))
+            info["unique_evidence"] = len(evidence)
+        return evidence, described_fields
+
+    def _decision_stage(self, classify, fact_lookup, rag):
+        _, decision_fields, direct_fills = fact_lookup
+        evidence, described_fields = rag
+        with self._stage("decision", field_count=len(decision_fields)) as info:
+            print(f"{Fore.YELLOW}Step 5: AI makes final fill/restore decision...{Style.RESET_ALL}")
+            final_decision = self.ai_client.final_fill_decision(decision_fields, described_fields, evidence)
+            filled_cells = final_decision.get("filled_cells", []) + direct_fills
+            restored_cells = final_decision.get("restored_cells", [])
+            info["filled_cells"] = len(filled_cells)
+            info["restored_cells"] = len(restored_cells)
+        self._print_decision(filled_cells, classify[0] + restored_cells)
+        return filled_cells, restored_cells
+
+    def _restore_stage(self, number, static_file: str, decision):
+        all_fields = number[0]
+        restored_cells = decision[1]
+        if not restored_cells:
+            return static_file
+        with self._stage("restore", cell_count=len(restored_cells)):
+            return self._restore_cells(static_file, all_fields, restored_cells)
+
+    def _fill_stage(self, file_path: str, output_dir: Optional[str], number, restored_file: str, decision):
+        all_fields, numbered_file = number
+        filled_cells = decision[0]
+        if not filled_cells and restored_file == numbered_file:
+            print(f"{Fore.YELLOW}No cells to fill or restore according to AI.{Style.RESET_ALL}")
+            return numbered_file
+        if not filled_cells:
+            print(f"{Fore.BLUE}No cells need to be filled, returning restored file: {restored_file}{Style.RESET_ALL}")
+            return restored_file
+        with self._stage("fill", cell_count=len(filled_cells)):
+            return self._fill_cells(file_path, restored_file, all_fields, filled_cells, output_dir)
+
+    def _render_pages(self, numbered_file: str):
+        print(f"{Fore.YELLOW}Step 2: Convert document to PDF and generate page screenshots...{Style.RESET_ALL}")
+        try:
+            pdf_result = self.pdf_processor.process_document_with_images(numbered_file)
+            page_images = pdf_result['page_images']
+            pdf_path = pdf_result['pdf_path']
+            print(f"{Fore.GREEN}✓ PDF conversion and screenshots completed, total {len(page_images)} pages{Style.RESET_ALL}")
+        except Exception as e:
+            print(f"{Fore.RED}PDF processing failed: {e}, will use text-only analysis{Style.RESET_ALL}")
+            page_images = []
+            pdf_path = None
+        return page_images, pdf_path
+
+    def _classify_cells(self, all_fields: List[Dict[str, Any]]):
+        """Restore labels, headers and prose locally; only the remaining cells go to the LLM"""
+        static_cells, model_fields = classify_cells(all_fields)
+        tracing.increment("classify.static_cells", len(static_cells))
+        print(f"{Fore.GREEN}✓ {len(static_cells)} static cells resolved locally, "
+              f"{len(model_fields)} cells left for the AI{Style.RESET_ALL}")
+        return static_cells, model_fields
+
+    def _lookup_template(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Field analysis stored for an identical form, or None"""
+        if not self.template_store:
+            return None
+        ai_response = self.template_store.lookup(fingerprint)
+        metrics.TEMPLATE_LOOKUPS.labels(result="hit" if ai_response else "miss").inc()
+        if ai_response:
+            tracing.increment("template_store.hits")
+            print(f"{Fore.GREEN}✓ Known template {fingerprint[:12]}: reusing the analysis of "
+                  f"{len(ai_response['fields_to_fill'])} fields, skipping rendering and AI analysis{Style.RESET_ALL}")
+        return ai_response
+
+    def _analyze_fields(self, doc_text: str, page_images: List[Dict[str, Any]],
+                        candidates: Optional[List[int]] = None,
+                        on_field: Optional[Callable[[Dict[str, Any]], None]] = None,
+                        expected: Optional[List[int]] = None) -> Dict[str, Any]:
+        print(f"{Fore.YELLOW}Step 3: AI analyzes fields (combining images and text content)...{Style.RESET_ALL}")
+        
+        if page_images:
+            ai_response = self.ai_client.analyze_empty_fields_with_images(doc_text, page_images, candidates, on_field, expected)
+            print(f"{Fore.GREEN}✓ Analysis with images and text content completed{Style.RESET_ALL}")
+        else:
+            ai_response = self.ai_client.analyze_empty_fields_by_index(doc_text, candidates, on_field, expected)
+            print(f"{Fore.GREEN}✓ Text-only content analysis completed{Style.RESET_ALL}")
+        if candidates is not None:
+            # Indices the pre-classifier already restored stay restored even if the model lists them
+            allowed = set(candidates)
+            ai_response["fields_to_fill"] = [f for f in ai_response.get("fields_to_fill") or [] if f.get("index") in allowed]
+
+        if ai_response.get("fields_to_fill"):
+            print(f"\n{Fore.CYAN}=== AI Field Analysis Results ==={Style.RESET_ALL}")
+            for field in ai_response["fields_to_fill"]:
+                print(f"Field [{field.get('index', 'N/A')}] | Description: {field.get('description', 'N/A')} | Content Type: {field.get('suggested_content_type', 'N/A')}")
+        if ai_response.get('restored_cells'):
+            print(f"\n{Fore.BLUE}=== AI Restored Cells ==={Style.RESET_ALL}")
+            for cell in ai_response['restored_cells']:
+                print(f"Restored Field [{cell.get('index', 'N/A')}] | Content: {cell.get('restored_content', 'N/A')}")
+        return ai_response
+
+    def _retrieve_evidence(self, described_fields: List[Dict[str, Any]],
+                           prefetched: Optional[Dict[Any, List[Dict[str, Any]]]] = None) -> EvidenceTable:
+        """Attach evidence references to every described field; returns the shared evidence table"""
+        print(f"{Fore.YELLOW}Step 4: RAG search for each field...{Style.RESET_ALL}")
+        if prefetched:
+            print(f"{Fore.GREEN}✓ {len(prefetched)} fields already searched while the analysis was streaming{Style.RESET_ALL}")
+        evidence, all_refs = self.ai_client.rag_engine.retrieve_evidence(described_fields, top_k=3, prefetched=prefetched)
+        for position, (field, refs) in enumerate(zip(described_fields, all_refs), 1):
+            print(f"\n{Fore.CYAN}--- Field [{field['index']}] ---{Style.RESET_ALL}")
+            print(f"{Fore.WHITE}Description: {field.get('description', 'N/A')}{Style.RESET_ALL}")
+            print(f"{Fore.WHITE}Content Type: {field.get('suggested_content_type', 'N/A')}{Style.RESET_ALL}")
+            
+            field["evidence_refs"] = refs
+            self.emit_progress("field_evidence", index=field['index'], hits=len(refs),
+                               position=position, total=len(described_fields))
+            
+            if refs:
+                print(f"{Fore.GREEN}✓ Found {len(refs)} RAG matches:{Style.RESET_ALL}")
+                for i, ref in enumerate(refs, 1):
+                    result = evidence.get(ref)
+                    score = result.get('rerank_score', result.get('similarity_score', 0))
+                    content = result.get('content', 'N/A')
+                    print(f"  {i}. [{ref}] Score: {score:.3f}")
+                    print(f"     Content: {content[:100]}{'...' if len(content) > 100 else ''}")
+            else:
+                print(f"{Fore.RED}✗ No RAG matches found{Style.RESET_ALL}")
+        
+        references = sum(len(refs) for refs in all_refs)
+        print(f"\n{Fore.GREEN}✓ RAG evidence added to all described fields: "
+              f"{references} references to {len(evidence)} unique chunks{Style.RESET_ALL}")
+        return evidence
+
+    def _print_decision(self, filled_cells: List[Dict[str, Any]], restored_cells: List[Dict[str, Any]]):
+        print(f"\n{Fore.CYAN}=== AI Decision Results ==={Style.RESET_ALL}")
+        if filled_cells:
+            print(f"\n{Fore.GREEN}✓ Cells to be filled ({len(filled_cells)}):{Style.RESET_ALL}")
+            for cell in filled_cells:
+                idx = cell.get('index')
+                content = cell.get('content', 'N/A')
+                print(f"  Field [{idx}]: {content}")
+        else:
+            print(f"\n{Fore.YELLOW}No cells to be filled{Style.RESET_ALL}")
+            
+        if restored_cells:
+            print(f"\n{Fore.BLUE}✓ Cells to be restored ({len(restored_cells)}):{Style.RESET_ALL}")
+            for cell in restored_cells:
+                idx = cell.get('index')
+                content = cell.get('restored_content', 'N/A')
+                print(f"  Field [{idx}]: {content}")
+        else:
+            print(f"\n{Fore.YELLOW}No cells to be restored{Style.RESET_ALL}")
+
+    def _restore_cells(self, numbered_file: str, all_fields: List[Dict[str, Any]], restored_cells: List[Dict[str, Any]]) -> str:
+        print(f"{Fore.YELLOW}Step 6: Restoring {len(restored_cells)} cells...{Style.RESET_ALL}")
+        indexed_fields = {f["index"]: f for f in all_fields}
+        for cell_info in restored_cells:
+            idx = cell_info.get("index")
+            field = indexed_fields.get(idx)
+            if field:
+                cell_info["original_format"] = field.get("original_format")
+        # 使用统一的恢复接口
+        restored_file = self.doc_processor.restore_cells_content_from_indexed(numbered_file, restored_cells)
+        print(f"{Fore.GREEN}✓ Cells restored: {restored_file}{Style.RESET_ALL}")
+        return restored_file
+
+    def _fill_cells(self, file_path: str, restored_file: str, all_fields: List[Dict[str, Any]], filled_cells: List[Dict[str, Any]],
+                    output_dir: Optional[str] = None) -> str:
+        print(f"{Fore.YELLOW}Filling cells with AI-generated content...{Style.RESET_ALL}")
+        # 根据文件类型准备填充数据
+        file_ext = os.path.splitext(file_path)[1].lower()
+        indexed_fields = {f["index"]: f for f in all_fields}
+        
+        for ans in filled_cells:
+            idx = ans["index"]
+            field = indexed_fields.get(idx)
+            if not field:
+                print(f"{Fore.YELLOW}Warning: index {idx} not found in all_fields{Style.RESET_ALL}")
+                continue
+            
+            # 为不同文件类型设置不同的字段信息
+            if file_ext == '.docx':
+                # Word文档字段映射
+                ans["table_index"] = field["table_index"]
+                ans["row_index"] = field["row_index"]
+                ans["col_index"] = field["col_index"]
+            elif file_ext in ['.xlsx', '.xls']:
+                # Excel文档字段映射
+                ans["sheet_name"] = field["sheet_name"]
+                ans["row_index"] = field["row_index"]
+                ans["col_index"] = field["col_index"]
+            
+            ans["original_format"] = field.get("original_format")
+        
+        filled_file = self.doc_processor.fill_document(restored_file, filled_cells, output_dir)
+        print(f"{Fore.GREEN}✓ Document filled: {filled_file}{Style.RESET_ALL}")
+        return filled_file
+    
+    def _answer_fields_from_facts(self, all_fields: List[Dict[str, Any]], described_fields: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Answer fields that map to a single known fact directly, without RAG or the decision LLM"""
+        if not Config.FACT_INDEX_ENABLED:
+            return []
+        accepted = ('high',) if Config.FACT_INDEX_MIN_CONFIDENCE == 'high' else ('high', 'medium')
+
+        indexed_fields = {f["index"]: f for f in all_fields}
+        rows = {}
+        for f in all_fields:
+            rows.setdefault((f.get("table_index", f.get("sheet_name")), f.get("row_index")), []).append(f)
+
+        answers = []
+        for field in described_fields:
+            cell = indexed_fields.get(field.get("index"))
+            if not cell:
+                continue
+            # The nearest non-empty cell to the left in the same row is usually the field label
+            left_label = ""
+            row = rows.get((cell.get("table_index", cell.get("sheet_name")), cell.get("row_index")), [])
+            for neighbour in sorted(row, key=lambda f: f.get("col_index", 0), reverse=True):
+                if neighbour.get("col_index", 0) < cell.get("col_index", 0) and neighbour.get("text"):
+                    left_label = neighbour["text"]
+                    break
+
+            cell_text = cell.get("text", "")
+            fact = self.ai_client.rag_engine.lookup_fact([cell_text, left_label, field.get("description", "")])
+            if not fact or fact["confidence"] not in accepted:
+                continue
+            answers.append({"index": cell["index"], "content": f"{cell_text}{fact['value']}" if cell_text else fact["value"]})
+            print(f"  Field [{cell['index']}] answered from fact '{fact['key']}': {fact['value']}")
+
+        tracing.increment("fact_index.hits", len(answers))
+        metrics.FACT_ANSWERS.inc(len(answers))
+        if answers:
+            print(f"{Fore.GREEN}✓ {len(answers)} fields answered directly from the fact index{Style.RESET_ALL}")
+        return answers
+
+    def stop_monitoring_and_generate_report(self, charts: bool = False):
+        """Stop monitoring and save the samples; charts are only drawn when asked for"""
+        if self.monitor and self.enable_monitoring:
+            print(f"\n{Fore.CYAN}=== Stop monitoring and generate report ==={Style.RESET_ALL}")
+            self.monitor.stop_monitoring()
+            
+            self.monitor.print_summary()
+            data_file = self.monitor.save_data()
+            print(f"{Fore.GREEN}✓ Monitoring data saved to: {data_file}{Style.RESET_ALL}")
+
+            chart_file = None
+            if charts:
+                chart_file = self.monitor.generate_charts()
+                print(f"{Fore.GREEN}✓ Monitoring chart saved to: {chart_file}{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.CYAN}Render charts on demand: python monitor.py chart {data_file}{Style.RESET_ALL}")
+            
+            return data_file, chart_file
+        else:
+            print(f"{Fore.YELLOW}Monitoring not enabled{Style.RESET_ALL}")
+            return None, None
+
+    def ingest_knowledge(self, knowledge_file: Optional[str] = None, knowledge_files: Optional[List[str]] = None,
+                         skip_ingested: bool = False) -> bool:
+        """
+        Build the current RAG collection from a single text file or from multiple txt/doc/docx/pdf files.
+        With skip_ingested=True, files whose contents are already in the collection are not ingested again.
+        """
+        paths = knowledge_files or [knowledge_file]
+        if skip_ingested:
+            collection = self.ai_client.rag_engine.collection
+            ingested = [p for p in paths if p and os.path.exists(p) and collection.has_knowledge(file_sha256(p))]
+            if ingested:
+                print(f"{Fore.GREEN}✓ {len(ingested)} knowledge files already in collection "
+                      f"'{collection.name}', skipping them{Style.RESET_ALL}")
+            paths = [p for p in paths if p not in ingested]
+            if not paths:
+                return True
+            if knowledge_files:
+                knowledge_files = paths
+        with self._stage("ingest", file_count=len(paths)) as info:
+            ok = self._ingest_knowledge(knowledge_file, knowledge_files)
+            info["success"] = ok
+            info["document_count"] = self.ai_client.get_rag_stats()["document_count"]
+        if ok:
+            self.ai_client.rag_engine.collection.mark_knowledge({file_sha256(p): os.path.basename(p) for p in paths})
+        return ok
+
+    def _ingest_knowledge(self, knowledge_file: Optional[str], knowledge_files: Optional[List[str]]) -> bool:
+        if knowledge_files:
+            print(f"{Fore.CYAN}Building RAG knowledge base from files...{Style.RESET_ALL}")
+
+            for f in knowledge_files:
+                if not os.path.exists(f):
+                    print(f"{Fore.RED}Knowledge file not found: {f}{Style.RESET_ALL}")
+                    return False
+
+            success = self.ai_client.build_rag_from_files(knowledge_files)
+            if not success:
+                print(f"{Fore.RED}Failed to build RAG knowledge base from files{Style.RESET_ALL}")
+            return success
+
+        if not knowledge_file or not os.path.exists(knowledge_file):
+            print(f"{Fore.RED}Knowledge file not found: {knowledge_file}{Style.RESET_ALL}")
+            return False
+
+        print(f"{Fore.CYAN}Building RAG knowledge base from text file...{Style.RESET_ALL}")
+        with open(knowledge_file, 'r', encoding='utf-8') as f:
+            full_text = f.read()
+        llm_chunks = self.ai_client.split_text_with_llm(full_text, max_chunk_length=300)
+        if llm_chunks and len(llm_chunks) > 0:
+            documents = [ {'id': i, 'content': chunk} for i, chunk in enumerate(llm_chunks) ]
+            self.ai_client.update_rag_index(documents)
+        else:
+            documents = self.ai_client.rag_engine.load_txt_knowledge(knowledge_file)
+            self.ai_client.update_rag_index(documents)
+        return True
+
+    def prepare_form(self, file_path: str) -> Optional[str]:
+        """Return a processable form path, converting .doc to .docx; None for unsupported formats"""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.doc':
+            # 将.doc转换为.docx
+            docx_path = file_path + 'x'
+            print(f"{Fore.YELLOW}Converting {file_path} to {docx_path}{Style.RESET_ALL}")
+            return self.doc_processor.convert_doc_to_docx(file_path, docx_path)
+        elif ext in ['.xls', '.xlsx', '.docx']:
+            # 支持的格式，直接处理
+            print(f"{Fore.CYAN}Processing {ext.upper()} file: {os.path.basename(file_path)}{Style.RESET_ALL}")
+            return file_path
+        print(f"{Fore.YELLOW}Warning: Unsupported file format {ext} for file: {file_path}{Style.RESET_ALL}")
+        return None
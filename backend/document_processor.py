@@ -1,13 +1,15 @@
 import os
 import re
 import time
-from typing import List, Dict, Any, Tuple
+import uuid
+from typing import List, Dict, Any, Tuple, Optional
 from docx import Document
 from docx.oxml.shared import OxmlElement, qn
 import openpyxl
 from openpyxl.styles import PatternFill
 from openpyxl.cell import MergedCell
 from config import Config
+from prompt_encoder import encode_grid_row, log_reduction
 import subprocess
 import shutil
 
@@ -15,6 +17,11 @@ class DocumentProcessor:
     def __init__(self):
         self.highlight_color = Config.HIGHLIGHT_COLOR
 
+    def _mid_path(self, file_path: str, tag: str, ext: str) -> str:
+        """Unique intermediate file path, safe for concurrent jobs processing same-named forms"""
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(Config.MID_DIR, f"{base_name}_{tag}_{int(time.time())}_{uuid.uuid4().hex[:8]}{ext}")
+
     def extract_document_content(self, file_path: str) -> str:
         file_ext = os.path.splitext(file_path)[1].lower()
         if file_ext == '.docx':
@@ -26,29 +33,31 @@ class DocumentProcessor:
 
     def _extract_docx_content(self, file_path: str) -> str:
         doc = Document(file_path)
-        content = []
-        for table in doc.tables:
-            for row in table.rows:
-                row_content = []
-                for cell in row.cells:
-                    row_content.append(cell.text.strip())
-                content.append(' | '.join(row_content))
-        return '\n'.join(content)
+        rows = [[cell.text for cell in row.cells] for table in doc.tables for row in table.rows]
+        return self._grid_text(rows)
 
     def _extract_excel_content(self, file_path: str) -> str:
         wb = openpyxl.load_workbook(file_path)
-        content = []
+        rows = []
         for sheet_name in wb.sheetnames:
             ws = wb[sheet_name]
-            content.append(f"=== Sheet: {sheet_name} ===")
-            
-            for row in ws.iter_rows():
-                row_content = []
-                for cell in row:
-                    row_content.append(str(cell.value).strip())
-                content.append(' | '.join(row_content))
+            rows.append(f"=== Sheet: {sheet_name} ===")
+            rows.extend([cell.value for cell in row] for row in ws.iter_rows())
         wb.close()
-        return '\n'.join(content)
+        return self._grid_text(rows)
+
+    def _grid_text(self, rows: List[Any]) -> str:
+        """Pipe-delimited grid for the field-analysis prompt; compact unless Config.PROMPT_COMPACT is off"""
+        legacy = None
+        if not Config.PROMPT_COMPACT or Config.PROMPT_REDUCTION_REPORT:
+            legacy = '\n'.join(row if isinstance(row, str) else ' | '.join(str(value).strip() for value in row) for row in rows)
+        if not Config.PROMPT_COMPACT:
+            return legacy
+        lines = (row if isinstance(row, str) else encode_grid_row(row) for row in rows)
+        compact = '\n'.join(line for line in lines if line)
+        if legacy is not None:
+            log_reduction("Document grid", legacy, compact)
+        return compact
 
     def _save_cell_format(self, cell):
         """Saving cell formatting information"""
@@ -148,8 +157,7 @@ class DocumentProcessor:
                     })
                     field_index += 1
 
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_path = os.path.join(Config.MID_DIR, f"{base_name}_numbered_{int(time.time())}.docx")
+        output_path = self._mid_path(file_path, "numbered", ".docx")
         doc.save(output_path)
         return all_fields, output_path
 
@@ -190,6 +198,7 @@ class DocumentProcessor:
                             'row_index': row_index,
                             'col_index': col_index,
                             'text': cell_value.strip(),
+                            'bold': bool(cell.font and cell.font.bold),
                             'context': f'Sheet {sheet_name}, Row {row_index}, Col {col_index}'
                         })
                         field_index += 1
@@ -198,8 +207,7 @@ class DocumentProcessor:
                         print(f"Warning: Cannot modify cell at Row {row_index}, Col {col_index}: {e}")
                         continue
 
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_path = os.path.join(Config.MID_DIR, f"{base_name}_numbered_{int(time.time())}.xlsx")
+        output_path = self._mid_path(file_path, "numbered", ".xlsx")
         wb.save(output_path)
         wb.close()
         return all_fields, output_path
@@ -214,16 +222,17 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
 
-    def fill_document(self, file_path: str, field_answers: List[Dict[str, Any]]) -> str:
+    def fill_document(self, file_path: str, field_answers: List[Dict[str, Any]], output_dir: Optional[str] = None) -> str:
         file_ext = os.path.splitext(file_path)[1].lower()
+        output_dir = output_dir or Config.OUTPUT_DIR
         if file_ext == '.docx':
-            return self._fill_docx_document(file_path, field_answers)
+            return self._fill_docx_document(file_path, field_answers, output_dir)
         elif file_ext in ['.xlsx', '.xls']:
-            return self._fill_excel_document(file_path, field_answers)
+            return self._fill_excel_document(file_path, field_answers, output_dir)
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
 
-    def _fill_docx_document(self, file_path: str, field_answers: List[Dict[str, Any]]) -> str:
+    def _fill_docx_document(self, file_path: str, field_answers: List[Dict[str, Any]], output_dir: str) -> str:
         """填充Word文档"""
         doc = Document(file_path)
 
@@ -246,11 +255,12 @@ class DocumentProcessor:
         original_filename = os.path.basename(file_path)
         name_without_ext = original_filename.split("_numbered")[0].split("_highlighted")[0].split("_restored")[0].replace(".docx", "")
         filled_filename = f"{name_without_ext}.docx"
-        filled_path = os.path.join(Config.OUTPUT_DIR, filled_filename)
+        os.makedirs(output_dir, exist_ok=True)
+        filled_path = os.path.join(output_dir, filled_filename)
         doc.save(filled_path)
         return filled_path
 
-    def _fill_excel_document(self, file_path: str, field_answers: List[Dict[str, Any]]) -> str:
+    def _fill_excel_document(self, file_path: str, field_answers: List[Dict[str, Any]], output_dir: str) -> str:
         """填充Excel文档"""
         wb = openpyxl.load_workbook(file_path)
 
@@ -278,7 +288,8 @@ class DocumentProcessor:
         name_without_ext = original_filename.split("_numbered")[0].split("_highlighted")[0].split("_restored")[0]
         name_without_ext = os.path.splitext(name_without_ext)[0]
         filled_filename = f"{name_without_ext}.xlsx"
-        filled_path = os.path.join(Config.OUTPUT_DIR, filled_filename)
+        os.makedirs(output_dir, exist_ok=True)
+        filled_path = os.path.join(output_dir, filled_filename)
         wb.save(filled_path)
         wb.close()
         return filled_path
@@ -306,8 +317,7 @@ class DocumentProcessor:
                         break
                 if found:
                     break
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_path = os.path.join(Config.MID_DIR, f"{base_name}_restored_{int(time.time())}.docx")
+        output_path = self._mid_path(file_path, "restored", ".docx")
         doc.save(output_path)
         return output_path
 
@@ -366,8 +376,7 @@ class DocumentProcessor:
                 if found:
                     break
         
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_path = os.path.join(Config.MID_DIR, f"{base_name}_restored_{int(time.time())}.xlsx")
+        output_path = self._mid_path(file_path, "restored", ".xlsx")
         wb.save(output_path)
         wb.close()
         return output_path
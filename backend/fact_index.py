@@ -0,0 +1,241 @@
+import re
+import json
+import unicodedata
+from typing import List, Dict, Any, Optional, Iterable
+
+# Canonical form fields and the labels they commonly appear under
+FIELD_SYNONYMS = {
+    'name': ('姓名', '名字', '员工姓名', '申请人姓名', '申请人', 'name', 'full name', 'applicant name'),
+    'gender': ('性别', 'gender', 'sex'),
+    'ethnicity': ('民族', 'ethnicity', 'ethnic group'),
+    'birth_date': ('出生日期', '出生年月', '生日', 'date of birth', 'birth date', 'birthday', 'dob'),
+    'age': ('年龄', 'age'),
+    'native_place': ('籍贯', 'native place', 'hometown'),
+    'political_status': ('政治面貌', 'political status'),
+    'marital_status': ('婚姻状况', 'marital status'),
+    'phone': ('电话', '手机', '手机号', '手机号码', '手提电话', '移动电话', '联系电话', '电话号码', '联系方式',
+              'phone', 'phone number', 'mobile', 'mobile phone', 'telephone', 'tel', 'contact number'),
+    'email': ('邮箱', '电子邮箱', '电子邮件', '电邮', '电邮地址', '邮件地址', 'email', 'e-mail', 'email address'),
+    'id_number': ('身份证', '身份证号', '身份证号码', '证件号码', 'id number', 'id card number', 'identity card number'),
+    'address': ('地址', '住址', '家庭住址', '通讯地址', '联系地址', '现居住地', 'address', 'home address', 'mailing address'),
+    'postal_code': ('邮编', '邮政编码', 'postal code', 'zip code', 'zip'),
+    'education': ('学历', '最高学历', 'education', 'degree'),
+    'school': ('毕业院校', '毕业学校', '学校', 'school', 'university'),
+    'major': ('专业', '所学专业', 'major'),
+    'student_id': ('学号', 'student id', 'student number'),
+    'company': ('公司', '公司名称', '工作单位', '单位', 'company', 'employer'),
+    'position': ('职位', '职务', '岗位', 'position', 'job title'),
+    'department': ('部门', 'department'),
+}
+
+# Sanity checks for values of canonical fields with a well-defined shape
+VALUE_VALIDATORS = {
+    'email': re.compile(r'^[\w.+-]+@[\w-]+(\.[\w-]+)+$'),
+    'phone': re.compile(r'^\+?[\d\s()-]{7,20}$'),
+    'id_number': re.compile(r'^(\d{15}|\d{17}[\dXx])$'),
+    'postal_code': re.compile(r'^\d{6}$'),
+}
+
+# Values found by shape alone, used when no labelled fact exists
+TYPED_PATTERNS = {
+    'email': re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'),
+    'id_number': re.compile(r'(?<!\d)\d{17}[\dXx](?!\d)'),
+}
+
+# A value ends at a separator ("，；|。") or whitespace that is followed by the next "label:"
+_KEY_VALUE = re.compile(
+    r'([^\s:：,，;；|。]{1,20})\s*[:：]\s*(.*?)\s*(?=(?:\s*[,，;；|。]|\s)\s*[^\s:：,，;；|。]{1,20}\s*[:：]|$)'
+)
+_VALUE_TOKENS = re.compile(r'[\s,，;；|。]+')
+# Longer values are more likely to be a run of text than a single fact
+_HIGH_CONFIDENCE_MAX_LENGTH = 64
+_PARENTHESES = re.compile(r'\(.*?\)')
+_LABEL_NOISE = re.compile(r"^(?:the |applicant'?s? |请填写|填写)|(?: of (?:the )?applicant)$")
+_VALUE_TRIM = '。；;，,、 \t'
+
+
+def normalize_key(text: str) -> str:
+    """Normalize a field label: full-width to half-width, lowercase, no spacing or punctuation"""
+    text = unicodedata.normalize('NFKC', text or '').strip().lower()
+    text = _LABEL_NOISE.sub('', text)
+    text = re.sub(r'[\s:*_.#\[\]【】]+', ' ', text).strip()
+    return text
+
+
+def typed_key(canonical: str) -> str:
+    """Fact key of values found by shape alone, normalized like every other key ('@id number')"""
+    return normalize_key(f"@{canonical}")
+
+
+def _canonical_lookup() -> Dict[str, str]:
+    lookup = {}
+    for canonical, synonyms in FIELD_SYNONYMS.items():
+        lookup[canonical] = canonical
+        for synonym in synonyms:
+            lookup[normalize_key(synonym)] = canonical
+    return lookup
+
+
+_CANONICAL = _canonical_lookup()
+
+
+def canonical_field(label: str) -> Optional[str]:
+    """Canonical field name of a known label ('联系电话' -> 'phone'), None otherwise"""
+    return _CANONICAL.get(normalize_key(label))
+
+
+class FactIndex:
+    """
+    Normalized key/value facts extracted from knowledge chunks.
+    Labels are resolved by exact key first and through FIELD_SYNONYMS second,
+    so common form fields are answered with a dictionary lookup.
+    """
+
+    def __init__(self):
+        # normalized key -> {'key': original label, 'values': [...], 'sources': [...]}
+        self.facts: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]):
+        for doc in documents:
+            content = doc.get('content', '')
+            source = doc.get('id')
+            for line in content.replace('\r', '\n').split('\n'):
+                for match in _KEY_VALUE.finditer(line.strip()):
+                    self.add_fact(match.group(1), match.group(2), source)
+            for shape, pattern in TYPED_PATTERNS.items():
+                for value in pattern.findall(content):
+                    self.add_fact(typed_key(shape), value, source)
+
+    def add_fact(self, key: str, value: str, source: Any = None):
+        value = (value or '').strip(_VALUE_TRIM)
+        normalized = normalize_key(key)
+        if not normalized or not value:
+            return
+        keys = [normalized]
+        # "姓名（中文）" is also reachable as "姓名"
+        stripped = _PARENTHESES.sub('', normalized).strip()
+        if stripped and stripped != normalized:
+            keys.append(stripped)
+        for k in keys:
+            entry = self.facts.setdefault(k, {'key': key.strip(), 'values': [], 'sources': []})
+            self._merge_value(entry, value)
+            if source is not None and source not in entry['sources']:
+                entry['sources'].append(source)
+
+    def _merge_value(self, entry: Dict[str, Any], value: str):
+        values = entry['values']
+        for i, existing in enumerate(values):
+            if existing == value or existing.startswith(value):
+                return
+            # Overlapping chunks can cut a value short; keep the complete one
+            if value.startswith(existing):
+                values[i] = value
+                return
+        values.append(value)
+
+    def _candidate_keys(self, label: str) -> List[str]:
+        normalized = normalize_key(label)
+        if not normalized:
+            return []
+        candidates = [normalized]
+        canonical = _CANONICAL.get(normalized) or _CANONICAL.get(_PARENTHESES.sub('', normalized).strip())
+        if canonical:
+            candidates.extend(normalize_key(s) for s in FIELD_SYNONYMS[canonical] if normalize_key(s) != normalized)
+        return candidates
+
+    def _is_valid(self, canonical: Optional[str], value: str) -> bool:
+        validator = VALUE_VALIDATORS.get(canonical)
+        return validator is None or bool(validator.match(value))
+
+    @staticmethod
+    def _is_single_fact(value: str) -> bool:
+        """A short value without a colon or another field label in it, i.e. not several facts run together"""
+        if len(value) > _HIGH_CONFIDENCE_MAX_LENGTH or ':' in value or '：' in value:
+            return False
+        tokens = [token for token in _VALUE_TOKENS.split(value) if token]
+        return not any(token in _CANONICAL for token in (normalize_key(t) for t in tokens[1:]))
+
+    def lookup(self, labels: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """
+        Resolve the first label that maps to exactly one value.
+        Returns {'value', 'key', 'confidence', 'sources'} or None. Confidence is
+        'high' for short labelled facts (exact key or synonyms) and 'medium' when
+        only the value shape matched or the value may hold more than one fact;
+        conflicting values never resolve.
+
+        >>> index = FactIndex()
+        >>> index.add_documents([{'id': 0, 'content': '张三 110101199003071234 北京'}])
+        >>> index.lookup(['身份证号'])['value']
+        '110101199003071234'
+
+        Values end at "。", line breaks and whitespace before the next label:
+
+        >>> index = FactIndex()
+        >>> index.add_documents([{'id': 0, 'content': '姓名：张三。性别：男。联系电话：13800001111。'},
+        ...                      {'id': 1, 'content': '民族: 汉 籍贯: 浙江杭州\\n婚姻状况：未婚'}])
+        >>> [index.lookup([label])['value'] for label in ('姓名', '性别', '电话', '民族', '籍贯', '婚姻状况')]
+        ['张三', '男', '13800001111', '汉', '浙江杭州', '未婚']
+        >>> index.lookup(['姓名'])['confidence']
+        'high'
+
+        A value that still looks like several facts is never 'high':
+
+        >>> index = FactIndex()
+        >>> index.add_fact('地址', '北京市海淀区 电话 13800001111')
+        >>> index.lookup(['地址'])['confidence']
+        'medium'
+        """
+        for label in labels:
+            candidates = self._candidate_keys(label)
+            if not candidates:
+                continue
+            canonical = _CANONICAL.get(candidates[0]) or _CANONICAL.get(_PARENTHESES.sub('', candidates[0]).strip())
+
+            exact = self.facts.get(candidates[0])
+            if exact and len(exact['values']) == 1 and self._is_valid(canonical, exact['values'][0]):
+                value = exact['values'][0]
+                confidence = 'high' if self._is_single_fact(value) else 'medium'
+                return {'value': value, 'key': exact['key'], 'confidence': confidence, 'sources': exact['sources']}
+            if exact:
+                # The exact label exists but is ambiguous; synonyms cannot be more precise
+                continue
+
+            values, keys, sources = [], [], []
+            for key in candidates[1:]:
+                entry = self.facts.get(key)
+                if not entry:
+                    continue
+                keys.append(entry['key'])
+                sources.extend(s for s in entry['sources'] if s not in sources)
+                values.extend(v for v in entry['values'] if v not in values)
+            confidence = 'high'
+            if not values and canonical and typed_key(canonical) in self.facts:
+                entry = self.facts[typed_key(canonical)]
+                keys, values, sources = [entry['key']], list(entry['values']), list(entry['sources'])
+                confidence = 'medium'
+            if len(values) == 1 and self._is_valid(canonical, values[0]):
+                if not self._is_single_fact(values[0]):
+                    confidence = 'medium'
+                return {'value': values[0], 'key': keys[0], 'confidence': confidence, 'sources': sources}
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'facts': self.facts}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FactIndex':
+        index = cls()
+        index.facts = data.get('facts', {})
+        return index
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'FactIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
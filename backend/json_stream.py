@@ -0,0 +1,135 @@
+import re
+import json
+from typing import List, Dict, Any, Tuple, Iterable
+
+_FENCE = re.compile(r'```(?:json)?', re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class JSONArrayStream:
+    """
+    Incremental scanner over a JSON object reply that arrives in pieces.
+
+    Every object element of the top-level arrays named in `keys` is returned by
+    feed() as soon as its closing brace has arrived, e.g. each entry of
+    "fields_to_fill" while the model is still writing the rest of the reply.
+    Text before the first '{' (prose, ``` fences) and after the closing brace
+    of the object is ignored. Elements that fail to parse are skipped.
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = set(keys)
+        self.items: Dict[str, List[Dict[str, Any]]] = {key: [] for key in self.keys}
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._finished = False
+        self._object_span = (0, 0)
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._pending_key = None
+        self._array_key = None
+        self._element_start = None
+
+    @property
+    def text(self) -> str:
+        """Everything received so far"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Add a piece of the reply; returns the (key, element) pairs completed by it"""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            if self._finished:
+                break
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        try:
+                            self._last_string = json.loads(buffer[self._string_start:pos + 1])
+                        except ValueError:
+                            self._last_string = None
+                continue
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                    self._object_span = (pos, pos)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == ':' and self._depth == 1:
+                self._pending_key = self._last_string
+            elif ch == ',' and self._depth == 1:
+                self._pending_key = None
+            elif ch == '[':
+                self._depth += 1
+                if self._depth == 2 and self._pending_key in self.keys:
+                    self._array_key = self._pending_key
+            elif ch == '{':
+                self._depth += 1
+                if self._depth == 3 and self._array_key:
+                    self._element_start = pos
+            elif ch in '}]':
+                if ch == '}' and self._depth == 3 and self._element_start is not None:
+                    try:
+                        element = json.loads(buffer[self._element_start:pos + 1])
+                    except ValueError:
+                        element = None
+                    if isinstance(element, dict):
+                        self.items[self._array_key].append(element)
+                        completed.append((self._array_key, element))
+                    self._element_start = None
+                self._depth -= 1
+                if self._depth == 1:
+                    self._array_key = None
+                elif self._depth == 0:
+                    self._finished = True
+                    self._object_span = (self._object_span[0], pos + 1)
+        self._pos = len(buffer)
+        return completed
+
+    def object_text(self) -> str:
+        """Exact text of the top-level object once it is complete, '' before that"""
+        start, end = self._object_span
+        return self._buffer[start:end] if self._finished else ""
+
+    def partial(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The elements received so far, for a reply that was cut off or is not valid JSON"""
+        return {key: list(items) for key, items in self.items.items()}
+
+
+def parse_json_reply(text: str, keys: Iterable[str]) -> Tuple[Dict[str, Any], bool]:
+    """
+    The JSON object of an LLM reply whose answer is arrays under `keys`.
+    Tries the object as found in the text (prose and ``` fences around it
+    ignored), then with trailing commas removed. A reply that still does not
+    parse, e.g. one cut off by max_tokens, is reduced to its complete array
+    elements. Returns (object, complete).
+    """
+    stream = JSONArrayStream(keys)
+    stream.feed(text or "")
+    stripped = _FENCE.sub('', text or '')
+    greedy = stripped[stripped.find('{'):stripped.rfind('}') + 1] if '{' in stripped else ''
+    for candidate in dict.fromkeys(c for c in (stream.object_text(), greedy) if c):
+        for attempt in (candidate, _TRAILING_COMMA.sub(r'\1', candidate)):
+            try:
+                parsed = json.loads(attempt)
+            except ValueError:
+                continue
+            if isinstance(parsed, dict):
+                return parsed, True
+    return stream.partial(), False
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import threading
+from typing import Dict, Any, Optional
+
+from config import Config
+
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+# colorama foreground colors used by the backend -> log level of the line
+_LEVEL_COLORS = (('\x1b[31m', 'error'), ('\x1b[33m', 'warning'))
+
+_STOP = object()
+
+
+def remove_color_codes(text: str) -> str:
+    return ANSI_ESCAPE.sub('', text)
+
+
+class Logger:
+    """
+    stdout tee that mirrors everything printed to a log file.
+
+    write() only echoes to the terminal and enqueues the message; a background
+    thread strips color codes, appends to the text log, flushes every
+    flush_interval seconds and rotates the file once it exceeds max_bytes.
+    With json_log_path set, every completed line is also written as a JSON
+    record {"ts", "level", "thread", "message"} for downstream tools; the
+    JSON log is rotated the same way.
+    """
+
+    def __init__(self, log_file_path: str, json_log_path: Optional[str] = None,
+                 flush_interval: float = None, max_bytes: int = None, backup_count: int = None):
+        self.log_file_path = log_file_path
+        self.json_log_path = json_log_path
+        self.terminal = sys.stdout
+        self.flush_interval = flush_interval if flush_interval is not None else Config.LOG_FLUSH_INTERVAL
+        self.max_bytes = max_bytes if max_bytes is not None else Config.LOG_MAX_BYTES
+        self.backup_count = backup_count if backup_count is not None else Config.LOG_BACKUP_COUNT
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._partial: Dict[str, str] = {}
+        self._file = open(log_file_path, 'a', encoding='utf-8')
+        self._json_file = open(json_log_path, 'a', encoding='utf-8') if json_log_path else None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def encoding(self):
+        return getattr(self.terminal, 'encoding', 'utf-8')
+
+    def isatty(self) -> bool:
+        return self.terminal.isatty()
+
+    def write(self, message):
+        self.terminal.write(message)
+        self.terminal.flush()
+        if message and not self._closed:
+            self._queue.put((time.time(), threading.current_thread().name, message))
+        return len(message)
+
+    def flush(self):
+        self.terminal.flush()
+
+    def close(self):
+        """Drain the queue, flush and close the log files"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._drain_partial()
+                self._flush_files()
+                self._file.close()
+                if self._json_file is not None:
+                    self._json_file.close()
+                return
+            if item is not None:
+                self._write_text(*item)
+
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                self._flush_files()
+                last_flush = now
+
+    def _write_text(self, timestamp: float, thread_name: str, message: str):
+        clean_message = remove_color_codes(message)
+        self._file.write(clean_message)
+        if self._file.tell() >= self.max_bytes:
+            self._file = self._rotate(self._file, self.log_file_path)
+
+        if self._json_file is None:
+            return
+        # print() emits the text and the newline separately; assemble lines per thread
+        text = self._partial.pop(thread_name, '') + message
+        *lines, rest = text.split('\n')
+        if rest:
+            self._partial[thread_name] = rest
+        for line in lines:
+            self._write_line_record(timestamp, thread_name, line)
+
+    def _write_line_record(self, timestamp: float, thread_name: str, line: str):
+        message = remove_color_codes(line).strip()
+        if not message:
+            return
+        level = next((name for code, name in _LEVEL_COLORS if code in line), 'info')
+        self._write_json({"ts": round(timestamp, 3), "level": level, "thread": thread_name, "message": message})
+
+    def _write_json(self, record: Dict[str, Any]):
+        if self._json_file is not None:
+            self._json_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            if self._json_file.tell() >= self.max_bytes:
+                self._json_file = self._rotate(self._json_file, self.json_log_path)
+
+    def _drain_partial(self):
+        for thread_name, rest in list(self._partial.items()):
+            self._write_line_record(time.time(), thread_name, rest)
+        self._partial.clear()
+
+    def _flush_files(self):
+        self._file.flush()
+        if self._json_file is not None:
+            self._json_file.flush()
+
+    def _rotate(self, file, path: str):
+        """Shift path -> path.1 -> path.2 ..., keeping backup_count old files; returns the reopened file"""
+        file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        return open(path, 'a', encoding='utf-8')
@@ -0,0 +1,254 @@
+import math
+import threading
+from typing import Dict, List, Tuple, Optional, Iterable
+
+# Latency buckets in seconds for pipeline stages and LLM calls
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Latency buckets for in-memory retrieval
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def remove(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._children.pop(key, None)
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        samples = self.samples()
+        if not samples:
+            return []
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in samples)
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [(f"{self.name}_total" if not self.name.endswith("_total") else self.name,
+                 _format_labels(self.labelnames, key), child.value) for key, child in items]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [(self.name, _format_labels(self.labelnames, key), child.value) for key, child in items]
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        samples = []
+        for key, child in items:
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, ("le", _format_value(bound))), bucket_count))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, ("le", "+Inf")), count))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), count))
+        return samples
+
+
+class Registry:
+    """Process-wide collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Exposition text; metrics without any observation are omitted"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# Documents
+DOCUMENTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "sheet_fill_documents_in_flight", "Forms currently being processed"))
+DOCUMENTS = REGISTRY.register(Counter(
+    "sheet_fill_documents", "Processed forms by result", ["status"]))
+DOCUMENT_DURATION = REGISTRY.register(Histogram(
+    "sheet_fill_document_duration_seconds", "End-to-end processing time of one form"))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "sheet_fill_stage_duration_seconds", "Duration of pipeline stages", ["stage", "status"]))
+FACT_ANSWERS = REGISTRY.register(Counter(
+    "sheet_fill_fact_index_answers", "Fields answered from the key/value fact index"))
+TEMPLATE_LOOKUPS = REGISTRY.register(Counter(
+    "sheet_fill_template_lookups", "Form template store lookups", ["result"]))
+
+# Web job queue (set when /metrics is scraped)
+QUEUE_JOBS = REGISTRY.register(Gauge(
+    "sheet_fill_queue_jobs", "Jobs known to the web job queue by status", ["status"]))
+
+# Warm DocumentFillers of the fill service (set when /metrics is scraped)
+SERVICE_FILLERS = REGISTRY.register(Gauge(
+    "sheet_fill_service_fillers", "Fill service worker pool by state", ["state"]))
+
+# LLM
+LLM_CALLS = REGISTRY.register(Counter(
+    "sheet_fill_llm_calls", "Chat completion calls", ["operation", "status"]))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "sheet_fill_llm_retries", "Chat completion attempts retried after a transient error", ["operation", "error"]))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "sheet_fill_llm_duration_seconds", "Chat completion latency", ["operation"]))
+LLM_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "sheet_fill_llm_first_token_seconds", "Time to the first streamed token", ["operation"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "sheet_fill_llm_tokens", "Tokens reported by the API", ["operation", "kind"]))
+LLM_IMAGE_BYTES = REGISTRY.register(Counter(
+    "sheet_fill_llm_image_bytes", "Image bytes sent to the vision model", ["operation"]))
+
+# RAG
+RAG_QUERY_DURATION = REGISTRY.register(Histogram(
+    "sheet_fill_rag_query_duration_seconds", "RAG search latency per query", ["mode"], buckets=FAST_BUCKETS))
+RAG_INDEX_DOCUMENTS = REGISTRY.register(Gauge(
+    "sheet_fill_rag_index_documents", "Chunks in a loaded RAG collection", ["collection"]))
+RAG_CACHE = REGISTRY.register(Counter(
+    "sheet_fill_rag_cache_lookups", "Embedding model and collection cache lookups", ["cache", "result"]))
+
+# PDF rendering
+PDF_CONVERSIONS = REGISTRY.register(Counter(
+    "sheet_fill_pdf_conversions", "Document to PDF conversions", ["converter", "status"]))
+PDF_CONVERSION_DURATION = REGISTRY.register(Histogram(
+    "sheet_fill_pdf_conversion_duration_seconds", "Document to PDF conversion time", ["converter"]))
+LIBREOFFICE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "sheet_fill_libreoffice_in_flight", "LibreOffice conversions currently running"))
+PAGES_RENDERED = REGISTRY.register(Counter(
+    "sheet_fill_pages_rendered", "PDF pages rendered to images"))
@@ -3,280 +3,407 @@ import time
 import json
 import psutil
 import threading
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
 from typing import Dict, List, Optional
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib import rcParams
 import numpy as np
 
-rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
-rcParams['axes.unicode_minus'] = False
+
+def _load_pyplot():
+    """Import matplotlib only when a chart is actually drawn"""
+    import matplotlib.pyplot as plt
+    from matplotlib import rcParams
+
+    rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
+    rcParams['axes.unicode_minus'] = False
+    return plt
+
+# Numeric series sampled for the process tree, plus the stage tag of each sample
+SERIES = ('timestamps', 'cpu_percent', 'cpu_time_s', 'rss_mb', 'memory_percent',
+          'read_mb', 'write_mb', 'threads', 'children')
 
 class SystemMonitor:
-    """System resource monitor"""
-    
-    def __init__(self, interval: int = 100, max_records: int = 1000):
+    """
+    Resource monitor of the current process and its children (LibreOffice,
+    tesseract, ...).
+    Sampling never blocks: CPU usage is derived from CPU-time deltas between
+    samples. Samples live in fixed-size ring buffers (deque(maxlen)) and are
+    tagged with the pipeline stages running at the time (enter_stage() /
+    exit_stage()); overlapping stages are joined with '+', e.g. 'render+extract'.
+    """
+
+    def __init__(self, interval: int = 100, max_records: int = 1000, pid: Optional[int] = None):
         self.interval = interval
         self.max_records = max_records
         self.monitoring = False
         self.monitor_thread = None
-        self.data = {
-            'timestamps': [],
-            'cpu_percent': [],
-            'memory_percent': [],
-            'memory_used_mb': [],
-            'memory_available_mb': []
-        }
+        self._stop_event = threading.Event()
+        self.process = psutil.Process(pid or os.getpid())
+        self.total_memory_mb = psutil.virtual_memory().total / (1024 * 1024)
+        # Running stages in start order, with a count for stages entered more than once (restore)
+        self._active_stages: Dict[str, int] = {}
+        self._stage_lock = threading.Lock()
+        self.data = {key: deque(maxlen=max_records) for key in SERIES + ('stage',)}
+        self._last_cpu_time = None
+        self._last_sample_time = None
         self.lock = threading.Lock()
-        
+
         self.output_dir = os.path.join(os.path.dirname(__file__), 'monitor_output')
         os.makedirs(self.output_dir, exist_ok=True)
-        
+
+    def enter_stage(self, stage: str):
+        """Tag the following samples with a pipeline stage until exit_stage(stage)"""
+        with self._stage_lock:
+            self._active_stages[stage] = self._active_stages.get(stage, 0) + 1
+
+    def exit_stage(self, stage: str):
+        with self._stage_lock:
+            remaining = self._active_stages.get(stage, 0) - 1
+            if remaining > 0:
+                self._active_stages[stage] = remaining
+            else:
+                self._active_stages.pop(stage, None)
+
+    @property
+    def current_stage(self) -> str:
+        with self._stage_lock:
+            return '+'.join(self._active_stages) or 'idle'
+
+    def _process_tree(self) -> List[psutil.Process]:
+        try:
+            return [self.process] + self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
     def get_system_info(self) -> Dict:
-        """Get current system information"""
+        """Sample the monitored process tree"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            memory_used_mb = memory.used / (1024 * 1024)
-            memory_available_mb = memory.available / (1024 * 1024)
-            
+            now = time.time()
+            cpu_time = rss = read_bytes = write_bytes = 0
+            threads = 0
+            tree = self._process_tree()
+            for proc in tree:
+                try:
+                    with proc.oneshot():
+                        times = proc.cpu_times()
+                        cpu_time += times.user + times.system
+                        if proc.pid == self.process.pid:
+                            # CPU time of children that already exited and were reaped
+                            cpu_time += getattr(times, 'children_user', 0) + getattr(times, 'children_system', 0)
+                        rss += proc.memory_info().rss
+                        threads += proc.num_threads()
+                        try:
+                            io = proc.io_counters()
+                            read_bytes += io.read_bytes
+                            write_bytes += io.write_bytes
+                        except (AttributeError, psutil.AccessDenied):
+                            # io_counters is unavailable on macOS and for some children
+                            pass
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+
+            cpu_percent = 0.0
+            if self._last_cpu_time is not None and now > self._last_sample_time:
+                cpu_percent = max(0.0, (cpu_time - self._last_cpu_time) / (now - self._last_sample_time) * 100)
+            self._last_cpu_time, self._last_sample_time = cpu_time, now
+
+            rss_mb = rss / (1024 * 1024)
             return {
-                'timestamp': datetime.now(),
+                'timestamp': now,
                 'cpu_percent': cpu_percent,
-                'memory_percent': memory_percent,
-                'memory_used_mb': memory_used_mb,
-                'memory_available_mb': memory_available_mb
+                'cpu_time_s': cpu_time,
+                'rss_mb': rss_mb,
+                'memory_percent': rss_mb / self.total_memory_mb * 100,
+                'read_mb': read_bytes / (1024 * 1024),
+                'write_mb': write_bytes / (1024 * 1024),
+                'threads': threads,
+                'children': max(len(tree) - 1, 0),
+                'stage': self.current_stage,
             }
         except Exception as e:
-            print(f"Failed to get system information: {e}")
+            print(f"Failed to get process information: {e}")
             return None
-    
+
     def collect_data(self):
         """Data collection thread function"""
         while self.monitoring:
             try:
-                system_info = self.get_system_info()
-                if system_info:
+                sample = self.get_system_info()
+                if sample:
                     with self.lock:
-                        # Add data
-                        self.data['timestamps'].append(system_info['timestamp'])
-                        self.data['cpu_percent'].append(system_info['cpu_percent'])
-                        self.data['memory_percent'].append(system_info['memory_percent'])
-                        self.data['memory_used_mb'].append(system_info['memory_used_mb'])
-                        self.data['memory_available_mb'].append(system_info['memory_available_mb'])
-                        
-                        # Limit record count
-                        if len(self.data['timestamps']) > self.max_records:
-                            for key in self.data:
-                                if isinstance(self.data[key], list):
-                                    self.data[key] = self.data[key][-self.max_records:]
-                
-                time.sleep(self.interval / 1000.0)
+                        self.data['timestamps'].append(sample['timestamp'])
+                        for key in SERIES[1:] + ('stage',):
+                            self.data[key].append(sample[key])
             except Exception as e:
                 print(f"Data collection error: {e}")
-                time.sleep(self.interval / 1000.0)
-    
+            self._stop_event.wait(self.interval / 1000.0)
+
     def start_monitoring(self):
         """Start monitoring"""
         if not self.monitoring:
             self.monitoring = True
-            self.monitor_thread = threading.Thread(target=self.collect_data, daemon=True)
+            self._stop_event.clear()
+            self.monitor_thread = threading.Thread(target=self.collect_data, name="resource-monitor", daemon=True)
             self.monitor_thread.start()
-            print(f"System monitoring started, interval: {self.interval} ms")
-    
+            print(f"Process monitoring started (pid {self.process.pid}), interval: {self.interval} ms")
+
     def stop_monitoring(self):
         """Stop monitoring"""
         self.monitoring = False
+        self._stop_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=2)
-        print("System monitoring stopped")
-    
+        print("Process monitoring stopped")
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        with self.lock:
+            arrays = {key: np.asarray(self.data[key], dtype=float) for key in SERIES}
+            arrays['stage'] = np.asarray(self.data['stage'], dtype=str)
+        return arrays
+
     def get_current_stats(self) -> Dict:
         """Get current statistics"""
-        with self.lock:
-            if not self.data['timestamps']:
-                return {}
-            
-            latest_data = {
-                'cpu_percent': self.data['cpu_percent'][-1] if self.data['cpu_percent'] else 0,
-                'memory_percent': self.data['memory_percent'][-1] if self.data['memory_percent'] else 0,
-                'memory_used_mb': self.data['memory_used_mb'][-1] if self.data['memory_used_mb'] else 0,
-                'memory_available_mb': self.data['memory_available_mb'][-1] if self.data['memory_available_mb'] else 0,
-                'total_records': len(self.data['timestamps'])
-            }
-            
-            # Calculate statistics
-            if len(self.data['cpu_percent']) > 1:
-                latest_data.update({
-                    'cpu_avg': np.mean(self.data['cpu_percent']),
-                    'cpu_max': np.max(self.data['cpu_percent']),
-                    'memory_avg': np.mean(self.data['memory_percent']),
-                    'memory_max': np.max(self.data['memory_percent'])
-                })
-            
-            return latest_data
-    
+        data = self._arrays()
+        if not len(data['timestamps']):
+            return {}
+
+        stats = {
+            'cpu_percent': data['cpu_percent'][-1],
+            'memory_percent': data['memory_percent'][-1],
+            'rss_mb': data['rss_mb'][-1],
+            'threads': int(data['threads'][-1]),
+            'children': int(data['children'][-1]),
+            'total_records': len(data['timestamps']),
+        }
+        if len(data['timestamps']) > 1:
+            stats.update({
+                'cpu_avg': float(np.mean(data['cpu_percent'][1:])),
+                'cpu_max': float(np.max(data['cpu_percent'])),
+                'memory_avg': float(np.mean(data['memory_percent'])),
+                'memory_max': float(np.max(data['memory_percent'])),
+                'rss_max_mb': float(np.max(data['rss_mb'])),
+                'cpu_time_s': float(data['cpu_time_s'][-1] - data['cpu_time_s'][0]),
+                'read_mb': float(data['read_mb'][-1] - data['read_mb'][0]),
+                'write_mb': float(data['write_mb'][-1] - data['write_mb'][0]),
+                'threads_max': int(np.max(data['threads'])),
+            })
+        return stats
+
+    def get_stage_stats(self) -> List[Dict]:
+        """Per-stage resource usage in order of first appearance"""
+        data = self._arrays()
+        stages = []
+        for stage in dict.fromkeys(data['stage'].tolist()):
+            mask = data['stage'] == stage
+            cpu_time = data['cpu_time_s'][mask]
+            stages.append({
+                'stage': stage,
+                'samples': int(mask.sum()),
+                'cpu_avg': float(np.mean(data['cpu_percent'][mask])),
+                'cpu_time_s': float(cpu_time[-1] - cpu_time[0]) if len(cpu_time) > 1 else 0.0,
+                'rss_max_mb': float(np.max(data['rss_mb'][mask])),
+                'children_max': int(np.max(data['children'][mask])),
+            })
+        return stages
+
     def save_data(self, filename: Optional[str] = None) -> str:
-        """Save monitoring data to JSON file"""
+        """
+        Save monitoring data as a columnar NumPy archive (.npz).
+        Each series is one float64 array; stage tags are stored as small
+        integer codes plus the list of stage names. A '.json' filename keeps
+        the legacy text format.
+        """
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"monitor_data_{timestamp}.json"
-        
+            filename = f"monitor_data_{timestamp}.npz"
+
         filepath = os.path.join(self.output_dir, filename)
-        
+        if filepath.endswith('.json'):
+            return self._save_json(filepath)
+
+        data = self._arrays()
+        stage_names, stage_codes = np.unique(data.pop('stage'), return_inverse=True)
+        with open(filepath, 'wb') as f:
+            np.savez(f, stage_codes=stage_codes.astype(np.uint16), stage_names=stage_names,
+                     pid=np.int64(self.process.pid), interval_ms=np.int64(self.interval), **data)
+
+        print(f"Monitoring data saved to: {filepath}")
+        return filepath
+
+    def _save_json(self, filepath: str) -> str:
         with self.lock:
-            # Convert datetime objects to strings
-            data_to_save = {}
-            for key, value in self.data.items():
-                if key == 'timestamps':
-                    data_to_save[key] = [ts.isoformat() for ts in value]
-                else:
-                    data_to_save[key] = value
-        
+            data_to_save = {key: list(value) for key, value in self.data.items()}
+        data_to_save['timestamps'] = [datetime.fromtimestamp(ts).isoformat() for ts in data_to_save['timestamps']]
+
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-        
+
         print(f"Monitoring data saved to: {filepath}")
         return filepath
-    
+
     def load_data(self, filepath: str):
-        """Load monitoring data from JSON file"""
+        """Load monitoring data from a .npz archive or a legacy JSON file"""
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                loaded_data = json.load(f)
-            
+            if filepath.endswith('.npz'):
+                with np.load(filepath) as archive:
+                    loaded_data = {key: archive[key].tolist() for key in SERIES if key in archive}
+                    loaded_data['stage'] = archive['stage_names'][archive['stage_codes']].tolist()
+            else:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    loaded_data = json.load(f)
+                loaded_data['timestamps'] = [datetime.fromisoformat(ts).timestamp() for ts in loaded_data['timestamps']]
+
             with self.lock:
-                # Convert strings back to datetime objects
-                self.data = {}
-                for key, value in loaded_data.items():
-                    if key == 'timestamps':
-                        self.data[key] = [datetime.fromisoformat(ts) for ts in value]
-                    else:
-                        self.data[key] = value
-            
+                max_records = max(self.max_records, len(loaded_data['timestamps']))
+                for key in self.data:
+                    self.data[key] = deque(loaded_data.get(key, []), maxlen=max_records)
+
             print(f"Monitoring data loaded from {filepath}")
         except Exception as e:
             print(f"Failed to load data: {e}")
-    
+
     def generate_charts(self, save_path: Optional[str] = None) -> str:
         """Generate monitoring charts"""
-        if not self.data['timestamps']:
+        data = self._arrays()
+        if not len(data['timestamps']):
             print("No data available for chart generation")
             return ""
-        
+
         if not save_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             save_path = os.path.join(self.output_dir, f"monitor_charts_{timestamp}.png")
-        
-        with self.lock:
-            timestamps = self.data['timestamps']
-            cpu_data = self.data['cpu_percent']
-            memory_data = self.data['memory_percent']
-            memory_used = self.data['memory_used_mb']
-            memory_available = self.data['memory_available_mb']
-        
-        if len(timestamps) > 0:
-            start_time = timestamps[0]
-            seconds = [(ts - start_time).total_seconds() for ts in timestamps]
-        else:
-            seconds = []
-        
+
+        seconds = data['timestamps'] - data['timestamps'][0]
+
         # Create chart
+        plt = _load_pyplot()
         fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-        fig.suptitle('System Resource Monitoring Report', fontsize=16, fontweight='bold')
-        
-        # 1. CPU usage
-        axes[0].plot(seconds, cpu_data, 'b-', linewidth=2, label='CPU Usage')
+        fig.suptitle('Process Resource Monitoring Report', fontsize=16, fontweight='bold')
+
+        # 1. CPU usage of the process tree (100% = one core)
+        axes[0].plot(seconds, data['cpu_percent'], 'b-', linewidth=2, label='CPU Usage')
         axes[0].set_title('CPU Usage (%)')
         axes[0].set_ylabel('Usage (%)')
-        axes[0].set_xlabel('Running time (s)')
-        axes[0].grid(True, alpha=0.3)
-        axes[0].legend()
-        
-        # 2. Memory usage
-        axes[1].plot(seconds, memory_data, 'r-', linewidth=2, label='Memory Usage')
-        axes[1].set_title('Memory Usage (%)')
-        axes[1].set_ylabel('Usage (%)')
-        axes[1].set_xlabel('Running time (s)')
-        axes[1].grid(True, alpha=0.3)
-        axes[1].legend()
-        
-        # 3. Memory usage (MB)
-        axes[2].plot(seconds, memory_used, 'g-', linewidth=2, label='Used Memory')
-        axes[2].plot(seconds, memory_available, 'orange', linewidth=2, label='Available Memory')
-        axes[2].set_title('Memory Usage (MB)')
-        axes[2].set_ylabel('Memory (MB)')
-        axes[2].set_xlabel('Running time (s)')
-        axes[2].grid(True, alpha=0.3)
-        axes[2].legend()
-        
+
+        # 2. Resident memory
+        axes[1].plot(seconds, data['rss_mb'], 'r-', linewidth=2, label='RSS')
+        axes[1].set_title('Resident Memory (MB)')
+        axes[1].set_ylabel('Memory (MB)')
+
+        # 3. Cumulative disk I/O
+        axes[2].plot(seconds, data['read_mb'] - data['read_mb'][0], 'g-', linewidth=2, label='Read')
+        axes[2].plot(seconds, data['write_mb'] - data['write_mb'][0], 'orange', linewidth=2, label='Written')
+        axes[2].set_title('Disk I/O (MB)')
+        axes[2].set_ylabel('Data (MB)')
+
+        # Stage boundaries
+        stages = data['stage']
+        boundaries = [i for i in range(len(stages)) if i == 0 or stages[i] != stages[i - 1]]
+        for ax in axes:
+            for i in boundaries:
+                ax.axvline(seconds[i], color='gray', linestyle='--', linewidth=0.8, alpha=0.6)
+            ax.set_xlabel('Running time (s)')
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+        for i in boundaries:
+            axes[1].text(seconds[i], axes[1].get_ylim()[1], stages[i], rotation=90, va='top', fontsize=8, color='gray')
+
         plt.tight_layout()
-        
+
         plt.savefig(save_path, dpi=300, bbox_inches='tight')
         plt.close()
-        
+
         print(f"Monitoring chart saved to: {save_path}")
         return save_path
-    
+
     def print_summary(self):
         """Print monitoring summary"""
         stats = self.get_current_stats()
         if not stats:
             print("No monitoring data available")
             return
-        
+
         print("\n" + "="*50)
-        print("System Monitoring Summary")
+        print("Process Monitoring Summary")
         print("="*50)
         print(f"Total records: {stats.get('total_records', 0)}")
         print(f"Current CPU usage: {stats.get('cpu_percent', 0):.2f}%")
-        print(f"Current memory usage: {stats.get('memory_percent', 0):.2f}%")
-        print(f"Current memory usage: {stats.get('memory_used_mb', 0):.1f} MB")
-        print(f"Current available memory: {stats.get('memory_available_mb', 0):.1f} MB")
-        
+        print(f"Current resident memory: {stats.get('rss_mb', 0):.1f} MB ({stats.get('memory_percent', 0):.2f}%)")
+        print(f"Current threads / child processes: {stats.get('threads', 0)} / {stats.get('children', 0)}")
+
         if 'cpu_avg' in stats:
             print(f"CPU average usage: {stats['cpu_avg']:.2f}%")
             print(f"CPU maximum usage: {stats['cpu_max']:.2f}%")
-            print(f"Memory average usage: {stats['memory_avg']:.2f}%")
-            print(f"Memory maximum usage: {stats['memory_max']:.2f}%")
+            print(f"CPU time: {stats['cpu_time_s']:.2f} s")
+            print(f"Peak resident memory: {stats['rss_max_mb']:.1f} MB")
+            print(f"Disk read / written: {stats['read_mb']:.1f} / {stats['write_mb']:.1f} MB")
+            print(f"Maximum threads: {stats['threads_max']}")
+
+        stage_stats = self.get_stage_stats()
+        if len(stage_stats) > 1:
+            print("-"*50)
+            print(f"{'stage':<16}{'samples':>8}{'cpu avg%':>10}{'cpu s':>8}{'peak MB':>10}")
+            for row in stage_stats:
+                print(f"{row['stage'][:15]:<16}{row['samples']:>8}{row['cpu_avg']:>10.1f}{row['cpu_time_s']:>8.2f}{row['rss_max_mb']:>10.1f}")
         print("="*50)
 
 
+def render_charts(data_file: str, save_path: Optional[str] = None) -> str:
+    """Draw the charts of a saved monitoring run (on demand, not at the end of every run)"""
+    monitor = SystemMonitor(max_records=0)
+    monitor.load_data(data_file)
+    if not save_path:
+        save_path = os.path.splitext(os.path.abspath(data_file))[0] + '.png'
+    monitor.generate_charts(save_path)
+    monitor.print_summary()
+    return save_path
+
+
 def main():
-    """Main function - for standalone monitoring"""
+    """Main function - standalone monitoring, or `chart <data file>` to render a saved run"""
     import argparse
-    
-    parser = argparse.ArgumentParser(description='System Resource Monitor')
+
+    parser = argparse.ArgumentParser(description='Process Resource Monitor')
+    subparsers = parser.add_subparsers(dest='command')
+    chart_parser = subparsers.add_parser('chart', help='Render charts from a saved .npz/.json monitoring file')
+    chart_parser.add_argument('data_file', help='Monitoring data file written by save_data()')
+    chart_parser.add_argument('--output', help='PNG path (default: next to the data file)')
     parser.add_argument('--interval', type=int, default=100, help='Monitoring interval (milliseconds)')
     parser.add_argument('--max-records', type=int, default=1000, help='Maximum number of records')
-    
+    parser.add_argument('--pid', type=int, help='Process to monitor together with its children (default: this process)')
+    parser.add_argument('--charts', action='store_true', help='Render charts when monitoring stops')
+
     args = parser.parse_args()
-    
-    monitor = SystemMonitor(interval=args.interval, max_records=args.max_records)
-    
+
+    if args.command == 'chart':
+        render_charts(args.data_file, args.output)
+        return
+
+    monitor = SystemMonitor(interval=args.interval, max_records=args.max_records, pid=args.pid)
+
     try:
-        print("Starting system monitoring...")
+        print("Starting process monitoring...")
         print("Press Ctrl+C to stop monitoring")
         monitor.start_monitoring()
-        
+
         # Continuous monitoring until user interrupts
         while True:
             time.sleep(1)
-        
+
     except KeyboardInterrupt:
         print("\nUser interrupted monitoring")
         monitor.stop_monitoring()
-        
+
         # Generate report
         monitor.print_summary()
-        monitor.save_data()
-        monitor.generate_charts()
-        
+        data_file = monitor.save_data()
+        if args.charts:
+            monitor.generate_charts()
+        else:
+            print(f"Render charts with: python monitor.py chart {data_file}")
+
         print("Monitoring completed!")
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
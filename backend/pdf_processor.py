@@ -3,17 +3,11 @@ import time
 import subprocess
 import shutil
 from typing import List, Dict, Any
-from pdf2image import convert_from_path
-from PIL import Image
-import base64
-from io import BytesIO
 from config import Config
-import fitz  # PyMuPDF
-import openpyxl
-from openpyxl.drawing.image import Image as OpenpyxlImage
-import win32com.client as win32
-import pythoncom
-import pytesseract
+import metrics
+
+# PyMuPDF, OCR and COM automation are imported on first use: only the
+# rendering/OCR paths need them, and win32com/pythoncom exist on Windows only.
 
 class PDFProcessor:
     def __init__(self):
@@ -35,6 +29,9 @@ class PDFProcessor:
         
         print(f"Converting {docx_path} to PDF using LibreOffice...")
         
+        started = time.perf_counter()
+        status = "error"
+        metrics.LIBREOFFICE_IN_FLIGHT.inc()
         try:
             subprocess.run([
                 # soffice_path,
@@ -50,6 +47,7 @@ class PDFProcessor:
             if os.path.exists(generated_pdf):
                 shutil.move(generated_pdf, pdf_path)
                 print(f"PDF conversion completed: {pdf_path}")
+                status = "ok"
                 return pdf_path
             else:
                 raise Exception("LibreOffice did not generate the expected PDF file")
@@ -57,6 +55,10 @@ class PDFProcessor:
         except Exception as e:
             print(f"PDF conversion failed: {e}")
             raise
+        finally:
+            metrics.LIBREOFFICE_IN_FLIGHT.dec()
+            metrics.PDF_CONVERSIONS.labels(converter="libreoffice", status=status).inc()
+            metrics.PDF_CONVERSION_DURATION.labels(converter="libreoffice").observe(time.perf_counter() - started)
 
     def excel_to_pdf(self, excel_path: str) -> str:
         """Convert Excel file to PDF using COM automation"""
@@ -66,6 +68,9 @@ class PDFProcessor:
             
             print(f"Converting {excel_path} to PDF...")
             
+            import win32com.client as win32
+            import pythoncom
+
             # Initialize COM
             pythoncom.CoInitialize()
             
@@ -102,6 +107,7 @@ class PDFProcessor:
             from reportlab.lib.pagesizes import letter
             from reportlab.pdfgen import canvas
             from reportlab.lib.units import inch
+            import openpyxl
             
             base_name = os.path.splitext(os.path.basename(excel_path))[0]
             pdf_path = os.path.join(self.temp_dir, f"{base_name}_{int(time.time())}_fallback.pdf")
@@ -154,6 +160,8 @@ class PDFProcessor:
 
     def pdf_to_images(self, pdf_path: str, dpi: int = 200) -> List[Dict[str, Any]]:
         """Use PyMuPDF to convert each page of PDF to an image"""
+        import fitz  # PyMuPDF
+
         base_name = os.path.splitext(os.path.basename(pdf_path))[0]
         page_images = []
         doc = fitz.open(pdf_path)
@@ -171,6 +179,7 @@ class PDFProcessor:
                 'dpi': dpi
             })
         doc.close()
+        metrics.PAGES_RENDERED.inc(len(page_images))
         print(f"PDF to image conversion completed, total {len(page_images)} pages")
         return page_images
 
@@ -207,6 +216,10 @@ class PDFProcessor:
         if not os.path.exists(pdf_path):
             print(f"PDF file not found: {pdf_path}")
             return ""
+        import fitz  # PyMuPDF
+        import pytesseract
+        from PIL import Image
+
         all_content = ""
         doc = None
         try:
@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Callable, Iterable, Set, Union
+from colorama import Fore, Style
+
+import tracing
+
+
+class StopPipeline(Exception):
+    """Raised by a stage to end the run early; `result` becomes the result of the run"""
+
+    def __init__(self, result: Any = None):
+        super().__init__("pipeline stopped")
+        self.result = result
+
+
+class StageGraph:
+    """
+    Stages with dependencies, each started on a worker thread as soon as all
+    stages it depends on have finished, so independent work overlaps and the
+    run takes about as long as its critical path. A stage is called with the
+    results of its dependencies as positional arguments, in the order given.
+    Stages must be added after their dependencies, which keeps the graph acyclic.
+    With max_workers=1 the stages run one at a time in the order they were added.
+
+    With a checkpoint store (see checkpoint.CheckpointStore), results of
+    checkpointed stages are saved as they finish; with resume=True saved
+    results are loaded instead of running those stages again, and stages
+    only needed to produce them are skipped.
+    """
+
+    def __init__(self, name: str, max_workers: Optional[int] = None, checkpoint=None, resume: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Any] = {}
+        self.durations: Dict[str, float] = {}
+        self.resumed: List[str] = []
+        self.wall_time = 0.0
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = (),
+            checkpoint: Union[bool, Callable[[Any], Any], None] = None):
+        """
+        checkpoint: True to save the stage result, or a function returning
+        (value to save, files the value refers to) for results that are not
+        picklable as they are or point to files
+        """
+        deps = list(deps)
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = {"func": func, "deps": deps, "checkpoint": checkpoint}
+
+    def _run_stage(self, ctx, name: str, args: List[Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            with tracing.attach(ctx):
+                result = self.stages[name]["func"](*args)
+        finally:
+            self.durations[name] = time.perf_counter() - started
+        checkpoint = self.stages[name]["checkpoint"]
+        if checkpoint and self.checkpoint is not None:
+            value, files = checkpoint(result) if callable(checkpoint) else (result, ())
+            try:
+                self.checkpoint.save(name, value, files)
+            except Exception as e:
+                print(f"{Fore.YELLOW}Failed to checkpoint stage '{name}': {e}{Style.RESET_ALL}")
+        return result
+
+    def _load_checkpoints(self, output: str) -> Set[str]:
+        """Load saved results; returns the stages that still have to run"""
+        saved = {}
+        # A stage that runs again may produce a different result, so nothing saved after it is used
+        rerun: Set[str] = set()
+        for name, stage in self.stages.items():
+            found = False
+            if (self.resume and self.checkpoint is not None and stage["checkpoint"]
+                    and not rerun.intersection(stage["deps"])):
+                found, value = self.checkpoint.load(name)
+                if found:
+                    saved[name] = value
+            if not found and (stage["checkpoint"] or rerun.intersection(stage["deps"])):
+                rerun.add(name)
+        needed: Set[str] = set()
+        stack = [output]
+        while stack:
+            name = stack.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            if name not in saved:
+                stack.extend(self.stages[name]["deps"])
+        for name in self.stages:
+            if name in saved and name in needed:
+                self.results[name] = saved[name]
+                self.resumed.append(name)
+        if self.resumed:
+            print(f"{Fore.CYAN}Resuming from checkpoint: {', '.join(self.resumed)}{Style.RESET_ALL}")
+        return needed - set(self.resumed)
+
+    def run(self, output: str) -> Any:
+        """Run every stage; returns the result of stage `output`, or of the StopPipeline that ended the run"""
+        ctx = tracing.context()
+        started = time.perf_counter()
+        needed = self._load_checkpoints(output)
+        pending = [name for name in self.stages if name in needed]
+        running = {}
+        workers = self.max_workers or len(self.stages)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.name) as executor:
+            try:
+                while pending or running:
+                    for name in [n for n in pending if all(dep in self.results for dep in self.stages[n]["deps"])]:
+                        pending.remove(name)
+                        args = [self.results[dep] for dep in self.stages[name]["deps"]]
+                        running[executor.submit(self._run_stage, ctx, name, args)] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.results[running.pop(future)] = future.result()
+            except StopPipeline as stop:
+                for future in running:
+                    future.cancel()
+                return stop.result
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+            finally:
+                self.wall_time = time.perf_counter() - started
+        return self.results[output]
+
+    def critical_path(self) -> List[str]:
+        """Chain of finished stages with the longest total duration"""
+        best: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name, stage in self.stages.items():
+            if name not in self.durations:
+                continue
+            before = max((dep for dep in stage["deps"] if dep in best), key=lambda dep: best[dep], default=None)
+            best[name] = self.durations[name] + (best[before] if before else 0.0)
+            previous[name] = before
+        if not best:
+            return []
+        path = [max(best, key=best.get)]
+        while previous[path[-1]]:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def print_summary(self):
+        path = self.critical_path()
+        on_path = sum(self.durations[name] for name in path)
+        total = sum(self.durations.values())
+        resumed = f", resumed {len(self.resumed)} stages from checkpoint" if self.resumed else ""
+        print(f"{Fore.CYAN}Pipeline: {self.wall_time:.2f}s wall, {total:.2f}s of stage time, "
+              f"critical path {on_path:.2f}s ({' -> '.join(path)}){resumed}{Style.RESET_ALL}")
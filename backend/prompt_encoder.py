@@ -0,0 +1,111 @@
+import re
+import json
+from typing import List, Dict, Any, Tuple, Optional
+from colorama import Fore, Style
+
+import tracing
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one token per CJK character, one per four other characters"""
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def clean_text(value: Any) -> str:
+    """Cell or chunk text on a single line; None (empty Excel cell) becomes ''"""
+    if value is None:
+        return ""
+    return _WHITESPACE.sub(' ', str(value)).strip()
+
+
+def encode_grid_row(cells: List[Any]) -> str:
+    """
+    One table row as 'a | b | c'.
+    A merged cell is returned by the readers once per grid position, so repeats
+    of the previous cell are dropped, as are empty cells at the end of the row.
+    """
+    parts: List[str] = []
+    for cell in cells:
+        text = clean_text(cell)
+        if parts and text and text == parts[-1]:
+            continue
+        parts.append(text)
+    while parts and not parts[-1]:
+        parts.pop()
+    return ' | '.join(parts)
+
+
+def encode_index_ranges(indices: List[int]) -> str:
+    """Cell indices as compact ranges: [1, 2, 3, 7, 9, 10] -> '1-3,7,9-10'"""
+    ranges: List[List[int]] = []
+    for index in sorted(set(indices)):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+class EvidenceTable:
+    """
+    Retrieved chunks shared by all fields of a form, numbered E1, E2, ... in
+    first-seen order. A chunk hit by several fields is stored once; fields
+    carry only its reference.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, str] = {}
+        self.hits: List[Dict[str, Any]] = []
+
+    def add(self, hit: Dict[str, Any]) -> str:
+        content = clean_text(hit.get('content', ''))
+        ref = self._refs.get(content)
+        if ref is None:
+            self.hits.append(hit)
+            ref = self._refs[content] = f"E{len(self.hits)}"
+        return ref
+
+    def get(self, ref: str) -> Dict[str, Any]:
+        return self.hits[int(ref[1:]) - 1]
+
+    def __len__(self) -> int:
+        return len(self.hits)
+
+    def lines(self) -> List[str]:
+        return [f"E{i}: {clean_text(hit.get('content', ''))}" for i, hit in enumerate(self.hits, 1)]
+
+
+def encode_decision_fields(fields: List[Dict[str, Any]], evidence: Optional[EvidenceTable] = None) -> Tuple[str, str]:
+    """
+    Cells for the fill decision, one line each:
+        [index] "current text" | meaning | content type | evidence: E1,E4
+    Evidence is referenced by id and listed once in the returned evidence block:
+    fields carry either 'evidence_refs' into `evidence` or their own
+    'rag_evidence' hits. Formatting, coordinates and context are left out.
+    """
+    evidence = evidence if evidence is not None else EvidenceTable()
+    lines = []
+    for field in fields:
+        parts = [f"[{field['index']}] {json.dumps(clean_text(field.get('text', '')), ensure_ascii=False)}"]
+        description = clean_text(field.get('description'))
+        if description:
+            parts.append(description)
+            parts.append(clean_text(field.get('suggested_content_type')) or 'text')
+        refs = field.get('evidence_refs') or [evidence.add(hit) for hit in field.get('rag_evidence') or []]
+        if refs:
+            parts.append("evidence: " + ",".join(dict.fromkeys(refs)))
+        lines.append(" | ".join(parts))
+    return "\n".join(lines), "\n".join(evidence.lines()) or "(none)"
+
+
+def log_reduction(name: str, legacy: str, compact: str) -> Tuple[int, int]:
+    """Print and trace the estimated tokens saved by the compact form of a prompt part"""
+    before, after = estimate_tokens(legacy), estimate_tokens(compact)
+    tracing.increment("prompt.legacy_tokens", before)
+    tracing.increment("prompt.compact_tokens", after)
+    saved = 1 - after / before if before else 0.0
+    print(f"{Fore.CYAN}{name}: ~{before} -> ~{after} tokens ({saved:.0%} smaller){Style.RESET_ALL}")
+    return before, after
@@ -1,23 +1,336 @@
 import os
+import re
 import json
-from typing import List, Dict, Any
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
 from config import Config
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from fact_index import FactIndex
+from prompt_encoder import EvidenceTable
+import tracing
+import metrics
 
-class RAGEngine:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        """Initialize RAG engine"""
+# sentence_transformers (torch) and faiss are imported on first use so that
+# importing this module, and lexical/fact lookups, stay cheap.
+_model_cache: Dict[str, "SentenceTransformer"] = {}
+_model_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str) -> "SentenceTransformer":
+    """Load an embedding model once per process and share it between engines"""
+    with _model_lock:
+        model = _model_cache.get(model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            with tracing.span("rag.load_model", model=model_name):
+                model = SentenceTransformer(model_name)
+            _model_cache[model_name] = model
+            tracing.increment("rag.model_cache_miss")
+            metrics.RAG_CACHE.labels(cache="model", result="miss").inc()
+        else:
+            tracing.increment("rag.model_cache_hit")
+            metrics.RAG_CACHE.labels(cache="model", result="hit").inc()
+        return model
+
+
+INDEX_TYPES = ('flat', 'hnsw')
+
+
+def build_index(dimension: int, index_type: Optional[str] = None):
+    """Empty inner-product FAISS index of the given type (default Config.RAG_INDEX_TYPE)"""
+    import faiss
+    index_type = index_type or Config.RAG_INDEX_TYPE
+    if index_type == 'flat':
+        return faiss.IndexFlatIP(dimension)
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, Config.RAG_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = Config.RAG_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = Config.RAG_HNSW_EF_SEARCH
+        return index
+    raise ValueError(f"Unknown RAG index type: {index_type} (expected one of {INDEX_TYPES})")
+
+
+def index_type_of(index) -> str:
+    return 'hnsw' if hasattr(index, 'hnsw') else 'flat'
+
+
+def normalize_collection_name(name: Optional[str]) -> str:
+    """Map an arbitrary tenant/job name to a safe directory name"""
+    name = (name or Config.RAG_DEFAULT_COLLECTION).strip()
+    name = re.sub(r'[^0-9A-Za-z_.-]', '_', name).strip('.')
+    return name or Config.RAG_DEFAULT_COLLECTION
+
+
+class RAGCollection:
+    """Index, document store and manifest of a single named knowledge collection"""
+
+    def __init__(self, name: str, model_name: str):
+        self.name = name
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.directory = os.path.normpath(os.path.join(Config.RAG_COLLECTIONS_DIR, name))
+        self.index_path = os.path.join(self.directory, "index.faiss")
+        self.documents_path = os.path.join(self.directory, "documents.json")
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.facts_path = os.path.join(self.directory, "facts.json")
         self.index = None
-        self.documents = []
-        self.document_embeddings = None
+        self.documents: List[Dict[str, Any]] = []
+        self.lexical_index = BM25Index()
+        self.fact_index = FactIndex()
+        self.manifest: Dict[str, Any] = {}
+        self.lock = threading.RLock()
+        # Set once the initial disk load by CollectionCache.get has finished (or was not needed)
+        self.ready = threading.Event()
+
+    def _legacy_paths(self):
+        """Pre-collection single index location, still readable as the default collection"""
+        if self.name != Config.RAG_DEFAULT_COLLECTION:
+            return None
+        index_path = os.path.normpath(os.path.join(Config.TEMP_DIR, "rag_index"))
+        documents_path = os.path.normpath(os.path.join(Config.TEMP_DIR, "rag_documents.json"))
+        if os.path.exists(index_path) and os.path.exists(documents_path):
+            return index_path, documents_path
+        return None
+
+    def exists(self) -> bool:
+        return (os.path.exists(self.index_path) and os.path.exists(self.documents_path)) or self._legacy_paths() is not None
+
+    def load(self) -> bool:
+        """Load index, documents and manifest from disk"""
+        with self.lock:
+            try:
+                index_path, documents_path = self.index_path, self.documents_path
+                if not (os.path.exists(index_path) and os.path.exists(documents_path)):
+                    legacy = self._legacy_paths()
+                    if legacy is None:
+                        return False
+                    index_path, documents_path = legacy
+
+                import faiss
+                self.index = faiss.read_index(index_path)
+                if hasattr(self.index, 'hnsw'):
+                    self.index.hnsw.efSearch = Config.RAG_HNSW_EF_SEARCH
+                with open(documents_path, 'r', encoding='utf-8') as f:
+                    self.documents = json.load(f)
+                # The inverted index is cheap to rebuild, so it is not persisted separately
+                self.lexical_index = BM25Index()
+                self.lexical_index.add(doc.get('content', '') for doc in self.documents)
+                if os.path.exists(self.facts_path):
+                    self.fact_index = FactIndex.load(self.facts_path)
+                else:
+                    self.fact_index = FactIndex()
+                    self.fact_index.add_documents(self.documents)
+                if os.path.exists(self.manifest_path):
+                    with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                        self.manifest = json.load(f)
+
+                manifest_model = self.manifest.get('model_name')
+                if manifest_model and manifest_model != self.model_name:
+                    print(f"Warning: collection '{self.name}' was built with {manifest_model}, querying with {self.model_name}")
+
+                metrics.RAG_INDEX_DOCUMENTS.labels(collection=self.name).set(len(self.documents))
+                print(f"RAG collection '{self.name}' loaded successfully, contains {len(self.documents)} documents")
+                return True
+            except Exception as e:
+                print(f"Failed to load RAG collection '{self.name}': {e}")
+                return False
+
+    def replace(self, index, documents: List[Dict[str, Any]]):
+        """Swap in a freshly built dense index and rebuild the lexical index to match"""
+        with self.lock:
+            self.index = index
+            self.documents = list(documents)
+            self.lexical_index = BM25Index()
+            self.lexical_index.add(doc.get('content', '') for doc in self.documents)
+            self.fact_index = FactIndex()
+            self.fact_index.add_documents(self.documents)
+            # The previous contents, and with them the record of ingested files, are gone
+            self.manifest.pop('knowledge_files', None)
+            metrics.RAG_INDEX_DOCUMENTS.labels(collection=self.name).set(len(self.documents))
+
+    def append(self, embeddings: np.ndarray, documents: List[Dict[str, Any]]):
+        """
+        Add documents to both indexes without re-encoding existing ones.
+        Every batch numbers its chunks from 0, so integer ids are offset by
+        the current size to stay unique within the collection.
+        """
+        with self.lock:
+            offset = len(self.documents)
+            documents = [{**doc, 'id': doc['id'] + offset} if type(doc.get('id')) is int else doc
+                         for doc in documents]
+            self.index.add(embeddings.astype('float32'))
+            self.documents.extend(documents)
+            self.lexical_index.add(doc.get('content', '') for doc in documents)
+            self.fact_index.add_documents(documents)
+            metrics.RAG_INDEX_DOCUMENTS.labels(collection=self.name).set(len(self.documents))
+
+    def save(self):
+        """Save index, documents and manifest"""
+        with self.lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                import faiss
+                print(f"Saving FAISS index to: {self.index_path}")
+                faiss.write_index(self.index, self.index_path)
+
+                print(f"Saving documents to: {self.documents_path}")
+                with open(self.documents_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.documents, f, ensure_ascii=False, indent=2)
+
+                self.fact_index.save(self.facts_path)
+
+                now = time.time()
+                self.manifest = {
+                    'name': self.name,
+                    'model_name': self.model_name,
+                    'dimension': self.index.d,
+                    'index_type': index_type_of(self.index),
+                    'document_count': len(self.documents),
+                    'fact_count': len(self.fact_index),
+                    'created_at': self.manifest.get('created_at', now),
+                    'updated_at': now,
+                    'knowledge_files': self.manifest.get('knowledge_files', {}),
+                }
+                self._write_manifest()
+
+                print(f"✓ RAG collection '{self.name}' successfully saved to {self.directory}")
+            except Exception as e:
+                print(f"Failed to save RAG collection '{self.name}': {e}")
+                print(f"Index path: {self.index_path}")
+                print(f"Documents path: {self.documents_path}")
+
+
+    def _write_manifest(self):
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+    def knowledge_version(self) -> str:
+        """Fingerprint of the collection contents; changes whenever documents are added, replaced or saved"""
+        with self.lock:
+            files = ','.join(sorted(self.manifest.get('knowledge_files', {})))
+            return f"{len(self.documents)}:{self.manifest.get('updated_at', '')}:{files}"
+
+    def has_knowledge(self, digest: str) -> bool:
+        """Whether a knowledge file with this content hash was ingested into the collection"""
+        with self.lock:
+            return digest in self.manifest.get('knowledge_files', {})
+
+    def mark_knowledge(self, files: Dict[str, str]):
+        """Record ingested knowledge files ({content hash: file name}) in the manifest"""
+        with self.lock:
+            if self.index is None or not files:
+                return
+            self.manifest.setdefault('knowledge_files', {}).update(files)
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_manifest()
+
+
+class CollectionCache:
+    """Process-wide LRU of loaded collections, so hot tenants skip the disk reload"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._collections: "OrderedDict[str, RAGCollection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, model_name: str) -> RAGCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            created = collection is None
+            if created:
+                collection = RAGCollection(name, model_name)
+                self._collections[name] = collection
+                self._evict()
+            else:
+                self._collections.move_to_end(name)
+        if not created:
+            # It may have been published before its load finished: wait rather than search it empty
+            collection.ready.wait()
+            metrics.RAG_CACHE.labels(cache="collection", result="hit").inc()
+            return collection
+        tracing.increment("rag.collection_cache_miss")
+        metrics.RAG_CACHE.labels(cache="collection", result="miss").inc()
+        # Disk load happens outside the cache lock; other callers wait on collection.ready
+        try:
+            if collection.exists():
+                with tracing.span("rag.load_collection", collection=name):
+                    collection.load()
+        finally:
+            collection.ready.set()
+            with self._lock:
+                # Entries pinned while this one loaded may have left the cache over capacity
+                self._evict()
+        return collection
+
+    def _evict(self):
+        """Drop least recently used collections over capacity; one still loading stays pinned"""
+        loaded = [key for key, value in self._collections.items() if value.ready.is_set()]
+        for evicted in loaded[:max(0, len(self._collections) - self.capacity)]:
+            del self._collections[evicted]
+            metrics.RAG_INDEX_DOCUMENTS.remove(collection=evicted)
+            print(f"RAG collection '{evicted}' evicted from memory cache")
+
+    def discard(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+        metrics.RAG_INDEX_DOCUMENTS.remove(collection=name)
+
+    def loaded_names(self) -> List[str]:
+        with self._lock:
+            return list(self._collections.keys())
+
+
+collection_cache = CollectionCache(Config.RAG_CACHE_SIZE)
+
+
+def drop_collection(name: str):
+    """Forget a collection in memory and delete it from disk"""
+    name = normalize_collection_name(name)
+    collection_cache.discard(name)
+    directory = os.path.normpath(os.path.join(Config.RAG_COLLECTIONS_DIR, name))
+    if os.path.isdir(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+        print(f"RAG collection '{name}' deleted")
+
+
+class RAGEngine:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", collection: Optional[str] = None):
+        """Initialize RAG engine bound to a named knowledge collection"""
+        self.model_name = model_name
+        self._model = None
+        self.collection_name = normalize_collection_name(collection)
+        os.makedirs(Config.RAG_COLLECTIONS_DIR, exist_ok=True)
+
+    @property
+    def model(self):
+        """Embedding model, loaded on the first dense encode"""
+        if self._model is None:
+            self._model = get_embedding_model(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        """Load the embedding model and the current collection ahead of the first request"""
+        self.model
+        self.collection
+
+    @property
+    def collection(self) -> RAGCollection:
+        return collection_cache.get(self.collection_name, self.model_name)
+
+    @property
+    def index(self):
+        return self.collection.index
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        return self.collection.documents
 
-        self.index_path = os.path.normpath(os.path.join(Config.TEMP_DIR, "rag_index"))
-        self.documents_path = os.path.normpath(os.path.join(Config.TEMP_DIR, "rag_documents.json"))
-        os.makedirs(Config.TEMP_DIR, exist_ok=True)
+    def use_collection(self, collection: Optional[str]):
+        """Switch this engine to another named collection"""
+        self.collection_name = normalize_collection_name(collection)
 
     def l2_normalize(self, vectors):
         norms = np.linalg.norm(vectors, axis=1, keepdims=True)
@@ -45,93 +358,186 @@ class RAGEngine:
                     block_id += 1
         return blocks
 
+    def _encode(self, documents: List[Dict[str, Any]]) -> np.ndarray:
+        text_chunks = [doc.get('content', '') for doc in documents]
+        embeddings = self.model.encode(text_chunks, batch_size=Config.RAG_ENCODE_BATCH_SIZE, show_progress_bar=True)
+        return self.l2_normalize(embeddings)
+
     def add_documents(self, documents: List[Dict[str, Any]]):
         """Add documents and build index"""
         if not documents:
             print("No documents to add")
             return
-            
-        print(f"Adding {len(documents)} documents to RAG index...")
 
-        text_chunks = [doc.get('content', '') for doc in documents]
-        embeddings = self.model.encode(text_chunks, show_progress_bar=True)
-        embeddings = self.l2_normalize(embeddings)
+        print(f"Adding {len(documents)} documents to RAG collection '{self.collection_name}'...")
 
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(embeddings.astype('float32'))
+        embeddings = self._encode(documents)
+        index = build_index(embeddings.shape[1])
+        index.add(embeddings.astype('float32'))
 
-        self.documents = documents
-        self.document_embeddings = embeddings
-        self._save_index()
+        collection = self.collection
+        with collection.lock:
+            collection.replace(index, documents)
+            collection.save()
         print(f"✓ RAG index created with {len(documents)} documents")
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Semantic search for relevant documents"""
-        if self.index is None:
-            print("RAG index not initialized, attempting to load...")
-            if not self._load_index():
+    def _dense_search(self, collection: RAGCollection, query: str, top_k: int) -> List[tuple]:
+        with tracing.span("rag.dense_search", top_k=top_k):
+            query_embedding = self.l2_normalize(self.model.encode([query]))
+            with collection.lock:
+                scores, indices = collection.index.search(query_embedding.astype('float32'), top_k)
+                document_count = len(collection.documents)
+        return [(int(idx), float(score)) for score, idx in zip(scores[0], indices[0]) if 0 <= idx < document_count]
+
+    def search(self, query: str, top_k: int = 5, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search relevant documents.
+        mode: 'dense' (embeddings), 'lexical' (BM25) or 'hybrid' (both fused with
+        reciprocal-rank fusion); defaults to Config.RAG_RETRIEVAL_MODE.
+        """
+        collection = self.collection
+        if collection.index is None:
+            print(f"RAG collection '{self.collection_name}' not initialized, attempting to load...")
+            if not collection.load():
                 return []
 
-        query_embedding = self.model.encode([query])
-        query_embedding = self.l2_normalize(query_embedding)
-        scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
+        mode = mode or Config.RAG_RETRIEVAL_MODE
+        started = time.perf_counter()
+        pool = max(top_k, Config.RAG_CANDIDATE_POOL) if mode == 'hybrid' else top_k
 
+        dense_hits = self._dense_search(collection, query, pool) if mode in ('dense', 'hybrid') else []
+        with collection.lock:
+            lexical_hits = collection.lexical_index.search(query, pool) if mode in ('lexical', 'hybrid') else []
+            documents = collection.documents
+
+        if mode == 'hybrid':
+            fused = reciprocal_rank_fusion([[pos for pos, _ in dense_hits], [pos for pos, _ in lexical_hits]], k=Config.RAG_RRF_K)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        else:
+            ranked = (dense_hits or lexical_hits)[:top_k]
+
+        dense_scores = dict(dense_hits)
+        lexical_scores = dict(lexical_hits)
         results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx < len(self.documents):
-                result = self.documents[idx].copy()
-                result['similarity_score'] = float(score)
-                result['rank'] = i + 1
-                results.append(result)
+        for i, (idx, score) in enumerate(ranked):
+            result = documents[idx].copy()
+            result['similarity_score'] = float(score)
+            if idx in dense_scores:
+                result['dense_score'] = dense_scores[idx]
+            if idx in lexical_scores:
+                result['bm25_score'] = lexical_scores[idx]
+            result['rank'] = i + 1
+            # Scores are only comparable within one mode (cosine, BM25 or RRF)
+            result['score_kind'] = mode
+            results.append(result)
 
+        metrics.RAG_QUERY_DURATION.labels(mode=mode).observe(time.perf_counter() - started)
         return results
 
+    def _field_query(self, field: Dict[str, Any]) -> str:
+        """Build the retrieval query for one field"""
+        field_type = field.get('field_type', '')
+        description = field.get('description', '')
+        suggested_type = field.get('suggested_content_type', '')
+
+        if '姓名' in field_type or 'name' in field_type.lower():
+            query = "姓名 名字 员工姓名"
+        elif '邮箱' in field_type or 'email' in field_type.lower():
+            query = "邮箱 email 电子邮件"
+        elif '电话' in field_type or 'phone' in field_type.lower():
+            query = "电话 手机 联系方式"
+        elif '地址' in field_type or 'address' in field_type.lower():
+            query = "地址 住址 工作地址"
+        elif '公司' in field_type or 'company' in field_type.lower():
+            query = "公司 企业 工作单位"
+        elif '职位' in field_type or 'position' in field_type.lower():
+            query = "职位 岗位 职务"
+        elif '部门' in field_type or 'department' in field_type.lower():
+            query = "部门 科室 团队"
+        elif '技能' in field_type or 'skill' in field_type.lower():
+            query = "技能 技术 能力"
+        elif '教育' in field_type or 'education' in field_type.lower():
+            query = "教育 学历 学校"
+        elif '经验' in field_type or 'experience' in field_type.lower():
+            query = "经验 工作经历 履历"
+        else:
+            return " ".join([description, suggested_type]).strip()
+        # Keep the field's own wording so the lexical side can match it exactly
+        return f"{query} {description}".strip()
+
     def semantic_search(self, field_info: List[Dict[str, Any]], top_k: int = 3) -> List[Dict[str, Any]]:
         """Semantic search based on field information"""
         if not field_info:
             return []
 
-        queries = []
-        for field in field_info:
-            field_type = field.get('field_type', '')
-            description = field.get('description', '')
-            suggested_type = field.get('suggested_content_type', '')
-
-            if '姓名' in field_type or 'name' in field_type.lower():
-                queries.append("姓名 名字 员工姓名")
-            elif '邮箱' in field_type or 'email' in field_type.lower():
-                queries.append("邮箱 email 电子邮件")
-            elif '电话' in field_type or 'phone' in field_type.lower():
-                queries.append("电话 手机 联系方式")
-            elif '地址' in field_type or 'address' in field_type.lower():
-                queries.append("地址 住址 工作地址")
-            elif '公司' in field_type or 'company' in field_type.lower():
-                queries.append("公司 企业 工作单位")
-            elif '职位' in field_type or 'position' in field_type.lower():
-                queries.append("职位 岗位 职务")
-            elif '部门' in field_type or 'department' in field_type.lower():
-                queries.append("部门 科室 团队")
-            elif '技能' in field_type or 'skill' in field_type.lower():
-                queries.append("技能 技术 能力")
-            elif '教育' in field_type or 'education' in field_type.lower():
-                queries.append("教育 学历 学校")
-            elif '经验' in field_type or 'experience' in field_type.lower():
-                queries.append("经验 工作经历 履历")
-            else:
-                queries.append(" ".join([description, suggested_type]).strip())
-
         all_results = []
-        for query in queries:
+        for field in field_info:
+            query = self._field_query(field)
             if query.strip():
-                results = self.search(query, top_k)
+                results = []
+                if self._is_exact_value_field(field):
+                    # Exact tokens (IDs, phones, dates) resolve from the cheap lexical index
+                    results = self.search(query, top_k, mode='lexical')
+                if not results:
+                    results = self.search(query, top_k)
                 all_results.extend(results)
 
         unique_results = self._deduplicate_results(all_results)
         return unique_results[:top_k]
 
+    def semantic_search_batch(self, fields: List[Dict[str, Any]], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve evidence for every field of a form.
+        With Config.RERANK_ENABLED each field gets a candidate pool of
+        Config.RERANK_CANDIDATES chunks that the cross-encoder re-scores in one
+        batch; only the best Config.RERANK_TOP_N above Config.RERANK_MIN_SCORE are kept.
+        """
+        if not Config.RERANK_ENABLED:
+            return [self.semantic_search([field], top_k=top_k) for field in fields]
+
+        pool_size = max(top_k, Config.RERANK_CANDIDATES)
+        pools = [self.semantic_search([field], top_k=pool_size) for field in fields]
+        queries = [" ".join([field.get('description', ''), field.get('suggested_content_type', '')]).strip()
+                   or self._field_query(field) for field in fields]
+        try:
+            from reranker import get_reranker
+            with tracing.span("rag.rerank", pairs=sum(len(pool) for pool in pools)):
+                return get_reranker().rerank_batch(queries, pools, top_n=min(top_k, Config.RERANK_TOP_N),
+                                                   min_score=Config.RERANK_MIN_SCORE)
+        except Exception as e:
+            print(f"Re-ranking failed, falling back to retrieval order: {e}")
+            return [pool[:top_k] for pool in pools]
+
+    def retrieve_evidence(self, fields: List[Dict[str, Any]], top_k: int = 3,
+                          prefetched: Optional[Dict[Any, List[Dict[str, Any]]]] = None) -> Tuple[EvidenceTable, List[List[str]]]:
+        """
+        Evidence for every field of a form as one table of unique chunks plus
+        per-field references into it, so a chunk hit by many fields is kept once.
+        `prefetched` maps field indices to hits already retrieved for them
+        (while the analysis reply was streaming); only the other fields are searched.
+        """
+        prefetched = prefetched or {}
+        missing = [field for field in fields if field.get('index') not in prefetched]
+        hits = dict(zip((field.get('index') for field in missing), self.semantic_search_batch(missing, top_k=top_k)))
+        hits.update(prefetched)
+        evidence = EvidenceTable()
+        refs = [list(dict.fromkeys(evidence.add(hit) for hit in hits.get(field.get('index'), []))) for field in fields]
+        return evidence, refs
+
+    def lookup_fact(self, labels: List[str]) -> Optional[Dict[str, Any]]:
+        """Answer a field from the collection's key/value fact index"""
+        collection = self.collection
+        with collection.lock:
+            return collection.fact_index.lookup(labels)
+
+    def _is_exact_value_field(self, field: Dict[str, Any]) -> bool:
+        if Config.RAG_RETRIEVAL_MODE != 'hybrid':
+            return False
+        description = (field.get('description') or '').lower()
+        return any(keyword in description for keyword in Config.RAG_EXACT_VALUE_KEYWORDS)
+
     def _deduplicate_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Deduplicate and sort by similarity"""
+        """Deduplicate and sort by similarity; results scored in different modes are ordered by rank instead"""
         seen_ids = set()
         unique_results = []
 
@@ -141,57 +547,48 @@ class RAGEngine:
                 seen_ids.add(result_id)
                 unique_results.append(result)
 
-        unique_results.sort(key=lambda x: x.get('similarity_score', 0), reverse=True)
+        if len({result.get('score_kind') for result in unique_results}) > 1:
+            unique_results.sort(key=lambda x: x.get('rank', 0))
+        else:
+            unique_results.sort(key=lambda x: x.get('similarity_score', 0), reverse=True)
         return unique_results
 
     def _save_index(self):
-        """Save index and documents"""
-        try:
-            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-            print(f"Saving FAISS index to: {self.index_path}")
-            faiss.write_index(self.index, self.index_path)
-
-            print(f"Saving documents to: {self.documents_path}")
-            with open(self.documents_path, 'w', encoding='utf-8') as f:
-                json.dump(self.documents, f, ensure_ascii=False, indent=2)
-
-            print(f"✓ RAG index successfully saved to {Config.TEMP_DIR}")
-        except Exception as e:
-            print(f"Failed to save RAG index: {e}")
-            print(f"Index path: {self.index_path}")
-            print(f"Documents path: {self.documents_path}")
+        """Save index and documents of the current collection"""
+        self.collection.save()
 
     def _load_index(self) -> bool:
-        """Load existing index"""
-        try:
-            if not os.path.exists(self.index_path) or not os.path.exists(self.documents_path):
-                return False
-
-            self.index = faiss.read_index(self.index_path)
-            with open(self.documents_path, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
-
-            print(f"RAG index loaded successfully, contains {len(self.documents)} documents")
-            return True
-        except Exception as e:
-            print(f"Failed to load RAG index: {e}")
-            return False
+        """Load the current collection from disk"""
+        return self.collection.load()
 
     def update_index(self, new_documents: List[Dict[str, Any]]):
-        """Merge and rebuild index"""
-        if self.index is None:
+        """Merge new documents into the collection, encoding only the new ones"""
+        collection = self.collection
+        if collection.index is None:
             self.add_documents(new_documents)
-        else:
-            all_documents = self.documents + new_documents
-            self.add_documents(all_documents)
+            return
+        if not new_documents:
+            print("No documents to add")
+            return
+
+        print(f"Appending {len(new_documents)} documents to RAG collection '{self.collection_name}'...")
+        embeddings = self._encode(new_documents)
+        with collection.lock:
+            collection.append(embeddings, new_documents)
+            collection.save()
+        print(f"✓ RAG index updated, now {len(collection.documents)} documents")
 
     def get_index_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
-        if self.index is None:
-            return {"status": "Not initialized", "document_count": 0}
+        collection = self.collection
+        if collection.index is None:
+            return {"status": "Not initialized", "document_count": 0, "collection": self.collection_name}
         return {
             "status": "Initialized",
-            "document_count": len(self.documents),
-            "index_size": self.index.ntotal,
+            "collection": self.collection_name,
+            "document_count": len(collection.documents),
+            "index_size": collection.index.ntotal,
+            "index_type": index_type_of(collection.index),
+            "fact_count": len(collection.fact_index),
             "model_name": self.model_name
         }
@@ -0,0 +1,63 @@
+import threading
+from typing import List, Dict, Any, Optional
+from sentence_transformers import CrossEncoder
+from config import Config
+
+_reranker_cache: Dict[str, "CrossEncoderReranker"] = {}
+_reranker_lock = threading.Lock()
+
+
+def get_reranker(model_name: Optional[str] = None) -> "CrossEncoderReranker":
+    """Load a cross-encoder once per process and share it between engines"""
+    model_name = model_name or Config.RERANK_MODEL
+    with _reranker_lock:
+        reranker = _reranker_cache.get(model_name)
+        if reranker is None:
+            reranker = CrossEncoderReranker(model_name)
+            _reranker_cache[model_name] = reranker
+        return reranker
+
+
+class CrossEncoderReranker:
+    """Small cross-encoder run on CPU that re-scores (query, chunk) pairs"""
+
+    def __init__(self, model_name: str, device: str = 'cpu', max_length: int = 512):
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device=device, max_length=max_length)
+
+    def rerank_batch(self, queries: List[str], candidates: List[List[Dict[str, Any]]],
+                     top_n: int = 2, min_score: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Re-rank the candidate pool of every query.
+        All pairs of all queries are scored together so the model runs one
+        batched forward pass per form instead of one per field.
+        Returns, per query, at most top_n candidates with a 'rerank_score',
+        dropping those below min_score.
+        """
+        pairs = []
+        owners = []
+        for query_pos, (query, pool) in enumerate(zip(queries, candidates)):
+            for candidate in pool:
+                pairs.append((query, candidate.get('content', '')))
+                owners.append((query_pos, candidate))
+
+        reranked: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not pairs:
+            return reranked
+
+        batch_size = min(len(pairs), Config.RERANK_MAX_BATCH)
+        scores = self.model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+        for (query_pos, candidate), score in zip(owners, scores):
+            result = candidate.copy()
+            result['rerank_score'] = float(score)
+            reranked[query_pos].append(result)
+
+        for query_pos, pool in enumerate(reranked):
+            pool.sort(key=lambda r: r['rerank_score'], reverse=True)
+            if min_score is not None:
+                pool = [r for r in pool if r['rerank_score'] >= min_score]
+            for rank, result in enumerate(pool[:top_n], 1):
+                result['rank'] = rank
+            reranked[query_pos] = pool[:top_n]
+        return reranked
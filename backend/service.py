@@ -0,0 +1,248 @@
+import os
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit, parse_qs
+from typing import Dict, Any, Optional
+from colorama import Fore, Style
+
+from config import Config
+import metrics
+from document_filler import DocumentFiller
+from rag_engine import collection_cache, drop_collection, normalize_collection_name
+
+
+class _EventStream:
+    """
+    Progress listener writing NDJSON lines to a streamed response. Concurrent
+    stages and the evidence prefetch emit from several threads, so writes are
+    serialized; once the client is gone the listener detaches itself.
+    """
+
+    def __init__(self, wfile, filler: DocumentFiller):
+        self.wfile = wfile
+        self.filler = filler
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def __call__(self, event: Dict[str, Any]):
+        line = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write(line)
+                self.wfile.flush()
+                return
+            except (OSError, ValueError) as e:
+                self.closed = True
+                print(f"{Fore.YELLOW}[service] Client stopped reading the progress stream: {e}{Style.RESET_ALL}")
+        self.filler.remove_progress_listener(self)
+
+
+class FillerPool:
+    """
+    Fixed set of warm DocumentFiller instances.
+    A request borrows one filler for its whole duration, so the pool size is
+    the number of forms processed concurrently; further requests wait.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._fillers: "queue.Queue[DocumentFiller]" = queue.Queue()
+        for _ in range(size):
+            filler = DocumentFiller(enable_monitoring=False)
+            filler.warm_up()
+            self._fillers.put(filler)
+
+    def acquire(self) -> DocumentFiller:
+        return self._fillers.get()
+
+    def release(self, filler: DocumentFiller):
+        self._fillers.put(filler)
+
+    def available(self) -> int:
+        return self._fillers.qsize()
+
+
+class FillServiceHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the fill service.
+
+    GET  /health   service status and loaded collections
+    GET  /metrics  Prometheus text exposition of the process metrics
+    POST /ingest   {"collection", "knowledge_file" | "knowledge_files"}
+    POST /process  {"collection", "file_path", "output_dir", "stream"}
+    DELETE /collections/<name>   drop a collection from memory and disk
+                                 (the default collection only with ?allow_default=1)
+
+    With "stream": true, /process answers with newline-delimited JSON: every
+    progress event of the pipeline followed by a final {"event": "result"}.
+    Paths are resolved on the service host, which shares the filesystem with
+    its clients.
+    """
+
+    server_version = "SheetFillService/1.0"
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/health':
+            self._send_json(200, {
+                "status": "ok",
+                "workers": self.server.pool.size,
+                "idle_workers": self.server.pool.available(),
+                "collections": collection_cache.loaded_names(),
+            })
+        elif self.path.rstrip('/') == '/metrics':
+            idle = self.server.pool.available()
+            metrics.SERVICE_FILLERS.labels(state="idle").set(idle)
+            metrics.SERVICE_FILLERS.labels(state="busy").set(self.server.pool.size - idle)
+            data = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_DELETE(self):
+        prefix = '/collections/'
+        url = urlsplit(self.path)
+        if url.path.startswith(prefix) and len(url.path) > len(prefix):
+            name = unquote(url.path[len(prefix):].rstrip("/"))
+            if normalize_collection_name(name) != name:
+                # A name the store would rewrite (e.g. '..' -> default) must not drop some other collection
+                self._send_json(400, {"error": f"Invalid collection name: {name}"})
+                return
+            allow_default = parse_qs(url.query).get("allow_default", [""])[0].lower() in ("1", "true", "yes")
+            if name == Config.RAG_DEFAULT_COLLECTION and not allow_default:
+                self._send_json(400, {"error": "Refusing to drop the default collection without ?allow_default=1"})
+                return
+            drop_collection(name)
+            self._send_json(200, {"dropped": name})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+            return
+
+        endpoint = self.path.rstrip('/')
+        if endpoint == '/ingest':
+            self._handle_ingest(body)
+        elif endpoint == '/process':
+            self._handle_process(body)
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def _handle_ingest(self, body: Dict[str, Any]):
+        knowledge_file = body.get("knowledge_file")
+        knowledge_files = body.get("knowledge_files")
+        if not knowledge_file and not knowledge_files:
+            self._send_json(400, {"error": "knowledge_file or knowledge_files is required"})
+            return
+
+        filler = self.server.pool.acquire()
+        try:
+            filler.use_collection(body.get("collection") or Config.RAG_DEFAULT_COLLECTION)
+            success = filler.ingest_knowledge(knowledge_file=knowledge_file, knowledge_files=knowledge_files)
+            stats = filler.ai_client.get_rag_stats()
+        finally:
+            self.server.pool.release(filler)
+        self._send_json(200 if success else 500, {"success": success, "stats": stats})
+
+    def _handle_process(self, body: Dict[str, Any]):
+        file_path = body.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            self._send_json(400, {"error": f"Form file not found: {file_path}"})
+            return
+
+        stream = bool(body.get("stream"))
+        if stream:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+        filler = self.server.pool.acquire()
+        listener = _EventStream(self.wfile, filler) if stream else None
+        if listener:
+            filler.add_progress_listener(listener)
+        output_path: Optional[str] = None
+        error = None
+        try:
+            filler.use_collection(body.get("collection") or Config.RAG_DEFAULT_COLLECTION)
+            form_path = filler.prepare_form(file_path)
+            if not form_path:
+                error = "Unsupported form format"
+            else:
+                output_path = filler.process_document(form_path, output_dir=body.get("output_dir"))
+                if not output_path or output_path == form_path or not os.path.exists(output_path):
+                    output_path, error = None, "Output file was not generated"
+        except Exception as e:
+            output_path, error = None, str(e)
+        finally:
+            if listener:
+                filler.remove_progress_listener(listener)
+            self.server.pool.release(filler)
+
+        success = error is None
+        result = {"event": "result", "success": success, "output_path": output_path, "error": error}
+        if listener:
+            listener(result)
+        else:
+            self._send_json(200 if success else 500, result)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.path.rstrip('/') == '/metrics':
+            return
+        print(f"{Fore.BLUE}[service] {self.address_string()} {format % args}{Style.RESET_ALL}")
+
+
+class FillService(ThreadingHTTPServer):
+    """HTTP server handling every request on its own thread around a shared FillerPool"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.pool = FillerPool(workers)
+        super().__init__((host, port), FillServiceHandler)
+
+
+def serve(host: str = None, port: int = None, workers: int = None):
+    """Start the fill service and block until interrupted"""
+    host = host or Config.SERVICE_HOST
+    port = port or Config.SERVICE_PORT
+    workers = workers or Config.SERVICE_WORKERS
+
+    print(f"{Fore.CYAN}Starting fill service with {workers} warm workers...{Style.RESET_ALL}")
+    # Creating the fillers loads the embedding model and the default collection once
+    server = FillService(host, port, workers)
+    print(f"{Fore.GREEN}✓ Fill service listening on http://{host}:{port}{Style.RESET_ALL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{Fore.YELLOW}Fill service stopping...{Style.RESET_ALL}")
+    finally:
+        server.server_close()
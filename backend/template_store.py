@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional
+from colorama import Fore, Style
+
+from config import Config
+from prompt_encoder import clean_text
+
+# Bump when the meaning of a stored analysis changes (prompt or numbering changes)
+FINGERPRINT_VERSION = 1
+
+
+def template_fingerprint(all_fields: List[Dict[str, Any]], candidates: Optional[List[int]] = None) -> str:
+    """
+    Structural fingerprint of a numbered form: the grid position and text of
+    every cell, in numbering order. Blank copies of the same template hash the
+    same; any change to the layout, the labels or pre-filled text does not.
+    `candidates` (the cells left for the model by the pre-classifier) is part
+    of the key, since the stored analysis only covers those cells.
+    """
+    cells = [[field.get('type'), field.get('sheet_name', field.get('table_index')),
+              field.get('row_index'), field.get('col_index'), clean_text(field.get('text'))]
+             for field in sorted(all_fields, key=lambda f: f['index'])]
+    payload = {'version': FINGERPRINT_VERSION, 'cells': cells,
+               'candidates': sorted(candidates) if candidates is not None else None}
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class TemplateStore:
+    """
+    Field analysis results ("fields_to_fill" / "restored_cells") of forms
+    already seen, one JSON file per template fingerprint under
+    Config.TEMPLATE_STORE_DIR. A hit lets the pipeline skip page rendering and
+    the analysis LLM call.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.TEMPLATE_STORE_DIR
+        self.lock = threading.Lock()
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def lookup(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Stored analysis of the template, or None"""
+        path = self._path(fingerprint)
+        with self.lock:
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"{Fore.YELLOW}Ignoring unreadable template record {path}: {e}{Style.RESET_ALL}")
+                return None
+            record['hits'] = record.get('hits', 0) + 1
+            record['last_used'] = time.time()
+            self._write(path, record)
+        return {'fields_to_fill': record.get('fields_to_fill') or [],
+                'restored_cells': record.get('restored_cells') or []}
+
+    def save(self, fingerprint: str, analysis: Dict[str, Any], source: Optional[str] = None):
+        """Store the analysis of a template; analyses without fields to fill are not stored"""
+        if not analysis.get('fields_to_fill'):
+            return
+        record = {
+            'fingerprint': fingerprint,
+            'source': os.path.basename(source) if source else None,
+            'model': Config.OPENAI_MODEL,
+            'created': time.time(),
+            'last_used': time.time(),
+            'hits': 0,
+            'fields_to_fill': analysis.get('fields_to_fill') or [],
+            'restored_cells': analysis.get('restored_cells') or [],
+        }
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(self._path(fingerprint), record)
+
+    def remove(self, fingerprint: str) -> bool:
+        with self.lock:
+            try:
+                os.remove(self._path(fingerprint))
+                return True
+            except FileNotFoundError:
+                return False
+
+    def clear(self) -> int:
+        """Remove all stored templates, returns how many were removed"""
+        removed = 0
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                return 0
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+        return removed
+
+    @staticmethod
+    def _write(path: str, record: Dict[str, Any]):
+        # Write-then-rename so a concurrent reader never sees a half-written record
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
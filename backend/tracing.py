@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from colorama import Fore, Style
+
+from config import Config
+
+# Tracer of the document being processed on the current thread
+_local = threading.local()
+
+
+def get_tracer() -> Optional["Tracer"]:
+    return getattr(_local, "tracer", None)
+
+
+def set_tracer(tracer: Optional["Tracer"]):
+    _local.tracer = tracer
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Record a span on the current thread's tracer.
+    Yields the span's attribute dict so callers can add results (token counts,
+    hit counts, ...) before it closes; without an active tracer it is a no-op.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield dict(attributes)
+        return
+    with tracer.span(name, **attributes) as attrs:
+        yield attrs
+
+
+def context():
+    """Tracer and innermost open span of the current thread, to continue on another thread"""
+    tracer = get_tracer()
+    if tracer is None:
+        return None, None
+    parents = tracer._parents()
+    return tracer, parents[-1] if parents else None
+
+
+@contextmanager
+def attach(ctx):
+    """
+    Continue a context() captured on another thread: the tracer becomes current
+    and spans opened inside become children of the captured span.
+    """
+    tracer, parent_id = ctx
+    previous = get_tracer()
+    set_tracer(tracer)
+    parents = tracer._parents() if tracer is not None else None
+    if parents is not None and parent_id:
+        parents.append(parent_id)
+    try:
+        yield
+    finally:
+        if parents is not None and parent_id:
+            parents.pop()
+        set_tracer(previous)
+
+
+def increment(name: str, value: float = 1):
+    """Add to a named counter of the current tracer (cache hits, bytes, ...)"""
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.increment(name, value)
+
+
+class Tracer:
+    """
+    Span recorder for one run of the fill pipeline.
+    Spans nest per thread; finished spans are kept in order of completion and
+    can be exported as plain JSON or as an OTLP/JSON trace file.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.attributes = attributes
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self.started_at = time.time()
+        self._stack = threading.local()
+        self._lock = threading.Lock()
+
+    def _parents(self) -> List[str]:
+        if not hasattr(self._stack, "ids"):
+            self._stack.ids = []
+        return self._stack.ids
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parents = self._parents()
+        record = {
+            "name": name,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parents[-1] if parents else None,
+            "start": time.time(),
+            "attributes": dict(attributes),
+            "status": "ok",
+        }
+        parents.append(record["span_id"])
+        started = time.perf_counter()
+        try:
+            yield record["attributes"]
+        except BaseException as e:
+            record["status"] = "error"
+            record["attributes"]["error"] = str(e)
+            raise
+        finally:
+            parents.pop()
+            record["duration"] = time.perf_counter() - started
+            record["end"] = record["start"] + record["duration"]
+            with self._lock:
+                self.spans.append(record)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "attributes": self.attributes,
+                "started_at": self.started_at,
+                "counters": dict(self.counters),
+                "spans": sorted(self.spans, key=lambda s: s["start"]),
+            }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OpenTelemetry OTLP/JSON representation (one resource, one scope)"""
+        spans = []
+        for record in self.to_dict()["spans"]:
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": record["span_id"],
+                "parentSpanId": record["parent_id"] or "",
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(int(record["start"] * 1e9)),
+                "endTimeUnixNano": str(int(record["end"] * 1e9)),
+                "attributes": [_otlp_attribute(k, v) for k, v in record["attributes"].items()],
+                "status": {"code": 2 if record["status"] == "error" else 1},
+            })
+        resource = {"service.name": "sheet-fill", "run.name": self.name, **self.attributes}
+        resource.update({f"counter.{k}": v for k, v in self.counters.items()})
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute(k, v) for k, v in resource.items()]},
+            "scopeSpans": [{"scope": {"name": "sheet-fill.tracing"}, "spans": spans}],
+        }]}
+
+    def save(self, directory: str = None, fmt: str = None) -> List[str]:
+        """Write the trace as 'json', 'otlp' or 'both'; returns the written paths"""
+        directory = directory or Config.TRACE_DIR
+        fmt = fmt or Config.TRACE_FORMAT
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"trace_{time.strftime('%Y%m%d_%H%M%S')}_{self.trace_id[:8]}")
+        exports = []
+        if fmt in ("json", "both"):
+            exports.append((f"{base}.json", self.to_dict()))
+        if fmt in ("otlp", "both"):
+            exports.append((f"{base}.otlp.json", self.to_otlp()))
+        for path, data in exports:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        return [path for path, _ in exports]
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        """Aggregate spans by name: count, total/avg seconds, share of the run and LLM usage"""
+        spans = self.to_dict()["spans"]
+        roots = [s for s in spans if s["parent_id"] is None]
+        run_time = sum(s["duration"] for s in roots) or 1e-9
+        rows: Dict[str, Dict[str, Any]] = {}
+        for record in spans:
+            row = rows.setdefault(record["name"], {
+                "name": record["name"], "count": 0, "total": 0.0, "errors": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "image_bytes": 0, "first_start": record["start"],
+            })
+            attrs = record["attributes"]
+            row["count"] += 1
+            row["total"] += record["duration"]
+            row["errors"] += record["status"] == "error"
+            for key in ("prompt_tokens", "completion_tokens", "image_bytes"):
+                row[key] += attrs.get(key) or 0
+            row["first_start"] = min(row["first_start"], record["start"])
+        for row in rows.values():
+            row["avg"] = row["total"] / row["count"]
+            row["share"] = row["total"] / run_time
+        return sorted(rows.values(), key=lambda r: r["first_start"])
+
+    def print_summary(self):
+        rows = self.summary_rows()
+        if not rows:
+            return
+        print(f"\n{Fore.CYAN}=== Trace summary ({self.name}) ==={Style.RESET_ALL}")
+        print(f"{'span':<28}{'count':>6}{'total s':>10}{'avg s':>9}{'share':>8}{'prompt tok':>12}{'compl tok':>11}{'image KB':>10}")
+        for row in rows:
+            print(f"{row['name'][:27]:<28}{row['count']:>6}{row['total']:>10.2f}{row['avg']:>9.2f}{row['share']:>8.1%}"
+                  f"{row['prompt_tokens']:>12}{row['completion_tokens']:>11}{row['image_bytes'] / 1024:>10.1f}")
+        if self.counters:
+            counters = ", ".join(f"{k}={v:g}" for k, v in sorted(self.counters.items()))
+            print(f"{Fore.CYAN}Counters: {counters}{Style.RESET_ALL}")
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)}
+    return {"key": key, "value": typed}
@@ -0,0 +1,145 @@
+"""
+Cold-start import benchmark.
+
+Every entry point is imported in a fresh interpreter several times and the
+median wall time is reported, together with the most expensive external
+packages according to `python -X importtime`. Results can be written as JSON
+and compared against a previous run to catch regressions.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --repeat 7 --json temp/import_time.json
+    python benchmarks/bench_import_time.py --baseline temp/import_time.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Any, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+FRONT_DIR = os.path.join(ROOT_DIR, "front")
+
+# name -> (module, directory added to sys.path, working directory)
+ENTRY_POINTS = {
+    "cli": ("main", BACKEND_DIR, BACKEND_DIR),
+    "document_filler": ("document_filler", BACKEND_DIR, BACKEND_DIR),
+    "service": ("service", BACKEND_DIR, BACKEND_DIR),
+    "rag_engine": ("rag_engine", BACKEND_DIR, BACKEND_DIR),
+    "pdf_processor": ("pdf_processor", BACKEND_DIR, BACKEND_DIR),
+    "monitor": ("monitor", BACKEND_DIR, BACKEND_DIR),
+    "web": ("main", FRONT_DIR, ROOT_DIR),
+}
+
+_TIMER = (
+    "import sys, time\n"
+    "sys.path.insert(0, {path!r})\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+def _project_modules() -> set:
+    names = set()
+    for directory in (BACKEND_DIR, FRONT_DIR):
+        names.update(os.path.splitext(f)[0] for f in os.listdir(directory) if f.endswith(".py"))
+    return names
+
+
+def time_import(module: str, path: str, cwd: str) -> float:
+    """Import a module in a fresh interpreter and return the import time in seconds"""
+    result = subprocess.run([sys.executable, "-c", _TIMER.format(path=path, module=module)],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else "import failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_packages(module: str, path: str, cwd: str, top: int) -> List[Dict[str, Any]]:
+    """Top-level external packages with the largest cumulative import time"""
+    code = f"import sys; sys.path.insert(0, {path!r}); import {module}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=cwd, capture_output=True, text=True)
+    project = _project_modules()
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        if "." in name or name in project:
+            continue
+        packages[name] = max(packages.get(name, 0.0), int(cumulative_us) / 1000)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "cumulative_ms": round(ms, 1)} for name, ms in ranked]
+
+
+def run(entries: List[str], repeat: int, top: int) -> Dict[str, Any]:
+    results = {}
+    for name in entries:
+        module, path, cwd = ENTRY_POINTS[name]
+        try:
+            samples = [time_import(module, path, cwd) for _ in range(repeat)]
+        except RuntimeError as e:
+            results[name] = {"error": str(e)}
+            print(f"{name:<16} failed: {e}")
+            continue
+        results[name] = {
+            "median_ms": round(statistics.median(samples) * 1000, 1),
+            "min_ms": round(min(samples) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+            "slowest_packages": slowest_packages(module, path, cwd, top) if top else [],
+        }
+        slow = ", ".join(f"{p['package']} {p['cumulative_ms']:.0f}ms" for p in results[name]["slowest_packages"])
+        print(f"{name:<16} median {results[name]['median_ms']:>8.1f} ms   {slow}")
+    return {"python": sys.version.split()[0], "repeat": repeat, "entry_points": results}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print the change per entry point; False if any got slower than the tolerance allows"""
+    ok = True
+    print("\nComparison with baseline:")
+    for name, current in report["entry_points"].items():
+        previous = baseline.get("entry_points", {}).get(name)
+        if not previous or "median_ms" not in previous or "median_ms" not in current:
+            continue
+        change = (current["median_ms"] - previous["median_ms"]) / max(previous["median_ms"], 1e-6)
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<16} {previous['median_ms']:>8.1f} -> {current['median_ms']:>8.1f} ms ({change:+.1%}){flag}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the entry points")
+    parser.add_argument('--entries', nargs='+', choices=sorted(ENTRY_POINTS), default=list(ENTRY_POINTS),
+                        help='Entry points to measure (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per entry point (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=5, help='Slowest external packages to list (default: %(default)s)')
+    parser.add_argument('--json', type=str, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, help='Compare against a previous JSON result')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    report = run(args.entries, args.repeat, args.top)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
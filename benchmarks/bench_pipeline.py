@@ -0,0 +1,282 @@
+"""
+End-to-end pipeline benchmark.
+
+Runs DocumentFiller.process_document over generated docx/xlsx forms of
+increasing size against knowledge files of increasing volume. All LLM calls go
+to the local mock server (benchmarks/mock_llm_server.py) with a fixed, seeded
+latency, so runs are comparable; embedding, retrieval and document I/O are
+the real code paths. Reports per-stage median timings, the memory high-water
+mark of the process tree and throughput, and compares against a baseline.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --fields 20 100 400 --knowledge 50 500 --latency 200 --json temp/pipeline.json
+    python benchmarks/bench_pipeline.py --baseline temp/pipeline.json
+    python benchmarks/bench_pipeline.py --fail-rate 0.2 --truncate-rate 0.1   # flaky endpoint
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import contextlib
+from typing import Dict, List, Any, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockLLMServer
+
+# Labels shared by the generated forms and knowledge files
+LABELS = ["姓名", "性别", "出生日期", "联系电话", "电子邮箱", "通讯地址", "最高学历", "毕业院校", "所学专业", "工作单位",
+          "职务", "身份证号", "籍贯", "民族", "政治面貌", "项目名称", "项目金额", "开始日期", "结束日期", "项目负责人"]
+FORMATS = ("docx", "xlsx")
+
+
+def _label(i: int) -> str:
+    base = LABELS[i % len(LABELS)]
+    return base if i < len(LABELS) else f"{base}{i // len(LABELS)}"
+
+
+def make_knowledge(path: str, facts: int, seed: int = 0) -> str:
+    """Knowledge text with one "label：value。" sentence per fact"""
+    rng = random.Random(seed)
+    lines = [f"{_label(i)}：示例值{rng.randint(1000, 9999)}。" for i in range(facts)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return path
+
+
+def make_form(path: str, fields: int) -> str:
+    """Two-column-pair form (label | empty | label | empty) with `fields` empty cells"""
+    rows = [[_label(i), "", _label(i + 1), ""] for i in range(0, fields, 2)]
+    if path.endswith(".docx"):
+        from docx import Document
+        document = Document()
+        document.add_heading("基准测试表", level=1)
+        table = document.add_table(rows=len(rows), cols=4)
+        for row, values in zip(table.rows, rows):
+            for cell, value in zip(row.cells, values):
+                cell.text = value
+        document.save(path)
+    else:
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "Form"
+        for values in rows:
+            sheet.append([value or None for value in values])
+        workbook.save(path)
+        workbook.close()
+    return path
+
+
+def configure(work_dir: str, base_url: str):
+    """Point every output directory and the OpenAI client at the benchmark sandbox"""
+    from config import Config
+    Config.OPENAI_BASE_URL = base_url
+    Config.OPENAI_API_KEY = "bench"
+    for attr, sub in (("INPUT_DIR", "input"), ("OUTPUT_DIR", "output"), ("MID_DIR", "mid_docs"), ("TEMP_DIR", "temp")):
+        setattr(Config, attr, os.path.join(work_dir, sub))
+    Config.RAG_COLLECTIONS_DIR = os.path.join(work_dir, "temp", "rag_collections")
+    Config.TRACE_DIR = os.path.join(work_dir, "traces")
+    Config.TEMPLATE_STORE_DIR = os.path.join(work_dir, "temp", "templates")
+    Config.CHECKPOINT_DIR = os.path.join(work_dir, "mid_docs", "checkpoints")
+    Config.TRACE_SUMMARY = False
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool):
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class _StageRecorder:
+    """Progress listener collecting stage_end durations of one run"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def __call__(self, event: Dict[str, Any]):
+        if event.get("event") == "stage_end":
+            self.stages[event["stage"]] = self.stages.get(event["stage"], 0.0) + event.get("duration", 0.0)
+
+
+def run_case(filler, server: MockLLMServer, form_path: str, fields: int, repeat: int, quiet: bool) -> Dict[str, Any]:
+    from monitor import SystemMonitor
+
+    totals, calls, llm_wait = [], [], []
+    stage_samples: Dict[str, List[float]] = {}
+    with _quiet(quiet):
+        monitor = SystemMonitor(interval=50, max_records=100000)
+        monitor.start_monitoring()
+    try:
+        for _ in range(repeat):
+            recorder = _StageRecorder()
+            filler.add_progress_listener(recorder)
+            calls_before, busy_before = server.calls, server.busy_seconds
+            started = time.perf_counter()
+            try:
+                with _quiet(quiet):
+                    output = filler.process_document(form_path)
+            finally:
+                filler.remove_progress_listener(recorder)
+            totals.append(time.perf_counter() - started)
+            calls.append(server.calls - calls_before)
+            llm_wait.append(server.busy_seconds - busy_before)
+            for stage, seconds in recorder.stages.items():
+                stage_samples.setdefault(stage, []).append(seconds)
+            if output == form_path:
+                raise RuntimeError(f"pipeline failed for {os.path.basename(form_path)}")
+    finally:
+        with _quiet(quiet):
+            monitor.stop_monitoring()
+    stats = monitor.get_current_stats()
+
+    median = statistics.median(totals)
+    return {
+        "fields": fields,
+        "median_s": round(median, 4),
+        "min_s": round(min(totals), 4),
+        "max_s": round(max(totals), 4),
+        "stages_s": {stage: round(statistics.median(samples), 4) for stage, samples in stage_samples.items()},
+        "llm_calls": statistics.median(calls),
+        "llm_wait_s": round(statistics.median(llm_wait), 4),
+        "rss_max_mb": round(stats.get("rss_max_mb", stats.get("rss_mb", 0.0)), 1),
+        "fields_per_s": round(fields / median, 2) if median else None,
+        "docs_per_min": round(60 / median, 2) if median else None,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    server = MockLLMServer(latency_ms=args.latency, jitter_ms=args.jitter, per_kchar_ms=args.per_kchar, seed=args.seed,
+                           fail_rate=args.fail_rate, truncate_rate=args.truncate_rate).start()
+    configure(work_dir, server.base_url)
+    from config import Config
+    Config.LLM_BACKOFF_BASE = args.backoff
+    # Off by default: repeats of a case would otherwise measure template-store hits
+    Config.TEMPLATE_STORE_ENABLED = args.reuse_templates
+
+    from document_filler import DocumentFiller
+    from rag_engine import drop_collection
+
+    cases: Dict[str, Any] = {}
+    ingest: Dict[str, Any] = {}
+    try:
+        with _quiet(not args.verbose):
+            filler = DocumentFiller(enable_monitoring=False)
+            filler.warm_up()
+        for facts in args.knowledge:
+            collection = f"bench_k{facts}"
+            knowledge_file = make_knowledge(os.path.join(work_dir, f"knowledge_{facts}.txt"), facts, args.seed)
+            with _quiet(not args.verbose):
+                drop_collection(collection)
+                filler.use_collection(collection)
+                started = time.perf_counter()
+                ok = filler.ingest_knowledge(knowledge_file=knowledge_file)
+            ingest[str(facts)] = {"seconds": round(time.perf_counter() - started, 4), "ok": ok,
+                                  "chunks": filler.ai_client.get_rag_stats().get("document_count")}
+            print(f"knowledge {facts:>6} facts: ingest {ingest[str(facts)]['seconds']:.2f}s, "
+                  f"{ingest[str(facts)]['chunks']} chunks")
+
+            for fmt in args.formats:
+                for fields in args.fields:
+                    name = f"{fmt}_f{fields}_k{facts}"
+                    form_path = make_form(os.path.join(work_dir, f"form_{fields}.{fmt}"), fields)
+                    try:
+                        cases[name] = run_case(filler, server, form_path, fields, args.repeat, not args.verbose)
+                    except Exception as e:
+                        cases[name] = {"error": str(e)}
+                        print(f"{name:<22} failed: {e}")
+                        continue
+                    case = cases[name]
+                    stages = ", ".join(f"{stage} {seconds:.2f}" for stage, seconds in case["stages_s"].items())
+                    print(f"{name:<22} median {case['median_s']:>7.2f}s  {case['fields_per_s']:>7.1f} fields/s  "
+                          f"rss {case['rss_max_mb']:>7.1f} MB  llm {case['llm_calls']:g} calls  [{stages}]")
+    finally:
+        server.stop()
+
+    return {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "reuse_templates": args.reuse_templates,
+        "mock": {"latency_ms": args.latency, "jitter_ms": args.jitter, "per_kchar_ms": args.per_kchar, "seed": args.seed,
+                 "fail_rate": args.fail_rate, "truncate_rate": args.truncate_rate},
+        "faults": dict(server.faults),
+        "ingest": ingest,
+        "cases": cases,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print the change per case and stage; False if any case got slower than the tolerance allows"""
+    if report.get("mock") != baseline.get("mock"):
+        print("\nWarning: baseline was recorded with different mock latency settings")
+    ok = True
+    print("\nComparison with baseline:")
+    for name, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous or "median_s" not in previous or "median_s" not in current:
+            continue
+        change = (current["median_s"] - previous["median_s"]) / max(previous["median_s"], 1e-9)
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<22} {previous['median_s']:>7.2f} -> {current['median_s']:>7.2f} s ({change:+.1%})"
+              f"  rss {previous['rss_max_mb']:.0f} -> {current['rss_max_mb']:.0f} MB{flag}")
+        for stage, seconds in current["stages_s"].items():
+            before = previous.get("stages_s", {}).get(stage)
+            if before and (seconds - before) / before > tolerance and seconds - before > 0.05:
+                print(f"    stage {stage:<16} {before:.2f} -> {seconds:.2f} s")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the fill pipeline against a local mock LLM")
+    parser.add_argument('--fields', type=int, nargs='+', default=[10, 50, 200], help='Empty cells per form (default: %(default)s)')
+    parser.add_argument('--knowledge', type=int, nargs='+', default=[20, 200, 2000], help='Facts per knowledge file (default: %(default)s)')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=100, help='Mock LLM base latency in ms (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0, help='Mock LLM latency jitter in ms (default: %(default)s)')
+    parser.add_argument('--per-kchar', type=float, default=5, help='Mock LLM ms per 1000 prompt characters (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of mock calls failing with 503 (default: %(default)s)')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Share of mock replies cut off halfway (default: %(default)s)')
+    parser.add_argument('--backoff', type=float, default=0.1, help='Config.LLM_BACKOFF_BASE for the run, in seconds (default: %(default)s)')
+    parser.add_argument('--work-dir', default=os.path.join(ROOT_DIR, 'temp', 'bench_pipeline'),
+                        help='Sandbox for generated files, collections and outputs')
+    parser.add_argument('--json', type=str, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, help='Compare against a previous JSON result')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline (default: %(default)s)')
+    parser.add_argument('--reuse-templates', action='store_true',
+                        help='Keep the form template store on (runs after the first reuse the stored field analysis)')
+    parser.add_argument('--verbose', action='store_true', help='Show the pipeline output')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResults saved to: {args.json}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+RAG micro-benchmarks.
+
+  encode   embedding throughput of the configured model per batch size
+  index    build time, single-query search latency and recall@k against exact
+           search, per index type (rag_engine.INDEX_TYPES), at each scale
+  engine   RAGEngine.search (dense / lexical / hybrid) and semantic_search
+           latency, and the disk load done by _load_index(), on a collection
+           of the same size
+
+Index scales use synthetic clustered unit vectors, so 1M chunks do not need
+1M forward passes; the engine level uses synthetic "label：value" chunks.
+Results are printed and optionally written as JSON for comparison.
+
+    python benchmarks/bench_rag.py
+    python benchmarks/bench_rag.py --scales 1000 10000 100000 1000000 --engine-max 100000 --json temp/rag.json
+    python benchmarks/bench_rag.py --skip-encode --index-types hnsw
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+LABELS = ["姓名", "性别", "出生日期", "联系电话", "电子邮箱", "通讯地址", "最高学历", "毕业院校", "所学专业", "工作单位",
+          "职务", "身份证号", "籍贯", "民族", "政治面貌", "项目名称", "项目金额", "开始日期", "结束日期", "项目负责人"]
+
+
+@contextlib.contextmanager
+def _quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3)}
+
+
+def synthetic_chunks(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1000, 99999, size=count)
+    return [{"id": i, "content": f"第{i // len(LABELS)}条记录 {LABELS[i % len(LABELS)]}：示例值{values[i]}。"}
+            for i in range(count)]
+
+
+def synthetic_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around sqrt(count) cluster centres, roughly like topical text embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, int(count ** 0.5)), dimension)).astype('float32')
+    vectors = centres[rng.integers(0, len(centres), size=count)]
+    vectors += 0.6 * rng.standard_normal((count, dimension)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_encode(model, batch_sizes: List[int], sample: int) -> List[Dict[str, Any]]:
+    texts = [doc["content"] for doc in synthetic_chunks(sample)]
+    model.encode(texts[:min(8, sample)], batch_size=8, show_progress_bar=False)  # warm-up
+    results = []
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        seconds = time.perf_counter() - started
+        results.append({"batch_size": batch_size, "seconds": round(seconds, 4), "chunks_per_s": round(sample / seconds, 1)})
+        print(f"encode  batch {batch_size:>4}: {sample / seconds:>9.1f} chunks/s")
+    return results
+
+
+def bench_index(vectors: np.ndarray, queries: np.ndarray, index_types: List[str], top_k: int) -> Dict[str, Any]:
+    import faiss
+    from rag_engine import build_index
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, top_k)
+
+    results = {}
+    for index_type in index_types:
+        started = time.perf_counter()
+        index = build_index(vectors.shape[1], index_type)
+        index.add(vectors)
+        build_s = time.perf_counter() - started
+
+        latencies, found = [], []
+        for i in range(len(queries)):
+            started = time.perf_counter()
+            _, ids = index.search(queries[i:i + 1], top_k)
+            latencies.append(time.perf_counter() - started)
+            found.append(len(set(ids[0]) & set(truth[i])) / top_k)
+        results[index_type] = {"build_s": round(build_s, 4), **_percentiles(latencies),
+                               f"recall_at_{top_k}": round(float(np.mean(found)), 4)}
+    return results
+
+
+def bench_engine(vectors: np.ndarray, index_type: str, queries: int, top_k: int, dense: bool) -> Dict[str, Any]:
+    from rag_engine import RAGEngine, RAGCollection, build_index, drop_collection
+
+    count = len(vectors)
+    name = f"bench_rag_{count}_{index_type}"
+    with _quiet():
+        drop_collection(name)
+        engine = RAGEngine(collection=name)
+        documents = synthetic_chunks(count)
+        index = build_index(vectors.shape[1], index_type)
+        index.add(vectors)
+        collection = engine.collection
+        collection.replace(index, documents)
+        collection.save()
+
+    rng = np.random.default_rng(1)
+    labels = [LABELS[i] for i in rng.integers(0, len(LABELS), size=queries)]
+    modes = ['dense', 'lexical', 'hybrid'] if dense else ['lexical']
+    results: Dict[str, Any] = {}
+    with _quiet():
+        for mode in modes:
+            latencies = []
+            for label in labels:
+                started = time.perf_counter()
+                engine.search(f"{label} 示例值", top_k, mode=mode)
+                latencies.append(time.perf_counter() - started)
+            results[f"search_{mode}"] = _percentiles(latencies)
+        if dense:
+            latencies = []
+            for label in labels:
+                field = {"index": 1, "description": label, "suggested_content_type": "text", "text": ""}
+                started = time.perf_counter()
+                engine.semantic_search([field], top_k=top_k)
+                latencies.append(time.perf_counter() - started)
+            results["semantic_search"] = _percentiles(latencies)
+
+        # The disk load behind RAGEngine._load_index(), on a collection object that is not cached
+        started = time.perf_counter()
+        loaded = RAGCollection(name, engine.model_name).load()
+        results["load_s"] = round(time.perf_counter() - started, 4)
+        results["loaded"] = loaded
+    results["disk_mb"] = round(sum(os.path.getsize(os.path.join(collection.directory, f))
+                                   for f in os.listdir(collection.directory)) / (1024 * 1024), 2)
+    with _quiet():
+        drop_collection(name)
+    return results
+
+
+def run(args) -> Dict[str, Any]:
+    from config import Config
+    work_dir = os.path.abspath(args.work_dir)
+    Config.RAG_COLLECTIONS_DIR = os.path.join(work_dir, "rag_collections")
+    os.makedirs(Config.RAG_COLLECTIONS_DIR, exist_ok=True)
+
+    report: Dict[str, Any] = {"python": sys.version.split()[0], "top_k": args.top_k, "queries": args.queries,
+                              "index_types": args.index_types, "hnsw": {"m": Config.RAG_HNSW_M,
+                              "ef_construction": Config.RAG_HNSW_EF_CONSTRUCTION, "ef_search": Config.RAG_HNSW_EF_SEARCH}}
+    dimension = args.dimension
+    if not args.skip_encode:
+        from rag_engine import RAGEngine, get_embedding_model
+        model_name = RAGEngine().model_name
+        with _quiet():
+            model = get_embedding_model(model_name)
+        dimension = model.get_sentence_embedding_dimension()
+        report["model"] = model_name
+        report["encode"] = bench_encode(model, args.batch_sizes, args.encode_sample)
+    report["dimension"] = dimension
+
+    report["scales"] = {}
+    for count in args.scales:
+        vectors = synthetic_vectors(count, dimension, args.seed)
+        picks = np.random.default_rng(args.seed + 1).integers(0, count, size=args.queries)
+        queries = vectors[picks] + 0.3 * np.random.default_rng(args.seed + 2).standard_normal((args.queries, dimension)).astype('float32')
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        scale = {"index": bench_index(vectors, queries, args.index_types, args.top_k)}
+        for index_type, result in scale["index"].items():
+            print(f"{count:>8} {index_type:<5} build {result['build_s']:>8.3f}s  search p50 {result['p50_ms']:>8.3f} ms  "
+                  f"p95 {result['p95_ms']:>8.3f} ms  recall@{args.top_k} {result[f'recall_at_{args.top_k}']:.3f}")
+        if count <= args.engine_max:
+            scale["engine"] = {}
+            for index_type in args.index_types:
+                result = bench_engine(vectors, index_type, args.queries, args.top_k, dense=not args.skip_encode)
+                scale["engine"][index_type] = result
+                searches = "  ".join(f"{key[7:] if key.startswith('search_') else key} {value['p50_ms']:.2f}ms"
+                                     for key, value in result.items() if isinstance(value, dict))
+                print(f"{count:>8} {index_type:<5} engine {searches}  load {result['load_s']:.3f}s  disk {result['disk_mb']:.1f} MB")
+        report["scales"][str(count)] = scale
+
+    shutil.rmtree(Config.RAG_COLLECTIONS_DIR, ignore_errors=True)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from rag_engine import INDEX_TYPES
+    parser = argparse.ArgumentParser(description="Benchmark embedding, index build and retrieval of the RAG engine")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000], help='Chunks per collection (default: %(default)s)')
+    parser.add_argument('--index-types', nargs='+', choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument('--engine-max', type=int, default=100000, help='Largest scale also measured through RAGEngine (default: %(default)s)')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per measurement (default: %(default)s)')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 16, 32, 64, 128])
+    parser.add_argument('--encode-sample', type=int, default=1024, help='Chunks encoded per batch size (default: %(default)s)')
+    parser.add_argument('--skip-encode', action='store_true', help='Do not load the embedding model (no encode or dense engine numbers)')
+    parser.add_argument('--dimension', type=int, default=384, help='Vector dimension with --skip-encode (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=os.path.join(ROOT_DIR, 'temp', 'bench_rag'))
+    parser.add_argument('--json', type=str, help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResults saved to: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Local OpenAI-compatible chat completion stub for reproducible benchmarks.
+
+Answers POST .../chat/completions with deterministic JSON that matches what
+the pipeline asks for (field analysis, fill decision, text splitting,
+knowledge extraction), after a configurable, seeded latency. Token usage is
+estimated from the text length so per-operation token accounting still works.
+Requests with "stream": true get server-sent chunk events: the first piece
+after FIRST_TOKEN_SHARE of the latency, the rest spread over the remainder.
+A flaky endpoint can be simulated with a share of 503 responses and of
+replies cut off halfway (--fail-rate, --truncate-rate).
+
+    python benchmarks/mock_llm_server.py --port 8900 --latency 300 --jitter 50
+
+Point the backend at it with OPENAI_BASE_URL = 'http://127.0.0.1:8900/v1'.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+
+# numbered cell: "<original text> [<index>]" or "[<index>]"
+_CELL_PATTERN = re.compile(r'^(.*?)\s*\[(\d+)\]$')
+_SENTENCE_END = re.compile(r'(?<=[。！？.!?\n])')
+# Streamed replies: share of the latency before the first token, characters per chunk
+FIRST_TOKEN_SHARE = 0.3
+STREAM_CHUNK_CHARS = 24
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one token per CJK character, one per four other characters"""
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def _section(prompt: str, start: str, end: Optional[str] = None) -> str:
+    if start not in prompt:
+        return ""
+    text = prompt.split(start, 1)[1]
+    if end and end in text:
+        text = text.rsplit(end, 1)[0]
+    return text.strip()
+
+
+def _numbered_cells(document: str) -> List[Dict[str, Any]]:
+    """Cells of the numbered document text, with the label to their left"""
+    cells = []
+    for line in document.splitlines():
+        left = ""
+        for raw in line.split(" | "):
+            match = _CELL_PATTERN.match(raw.strip())
+            if not match:
+                continue
+            text, index = match.group(1).strip(), int(match.group(2))
+            if text == "None":  # empty Excel cell rendered by str(None)
+                text = ""
+            cells.append({"index": index, "text": text, "label": left})
+            if text:
+                left = text
+    return cells
+
+
+def _index_ranges(text: str) -> set:
+    """'1-3,7' -> {1, 2, 3, 7}"""
+    indices = set()
+    for part in text.split(","):
+        start, _, end = part.strip().partition("-")
+        if start.isdigit():
+            indices.update(range(int(start), int(end or start) + 1))
+    return indices
+
+
+def analyze_reply(prompt: str) -> Dict[str, Any]:
+    """
+    Empty cells are fields to fill, described by their left neighbour; all others are restored.
+    A "Candidate cells:" line limits the reply to those indices.
+    """
+    cells = _numbered_cells(_section(prompt, "Document content:", "Only return valid JSON."))
+    match = re.search(r'Candidate cells:\s*([\d,\-]*)', prompt)
+    if match:
+        candidates = _index_ranges(match.group(1))
+        cells = [cell for cell in cells if cell["index"] in candidates]
+    fields, restored = [], []
+    for cell in cells:
+        if cell["text"]:
+            restored.append({"index": cell["index"], "restored_content": cell["text"]})
+        else:
+            fields.append({"index": cell["index"], "description": cell["label"] or f"Field {cell['index']}",
+                           "suggested_content_type": "text"})
+    return {"fields_to_fill": fields, "restored_cells": restored}
+
+
+def _evidence_value(label: str, evidence: List[Dict[str, Any]]) -> str:
+    """Value of the "label：value" fact matching the field, else the start of the top chunk"""
+    pattern = re.compile(re.escape(label) + r'\s*[：:]\s*([^。；;\n]+)') if label else None
+    for hit in evidence:
+        match = pattern.search(str(hit.get("content", ""))) if pattern else None
+        if match:
+            return match.group(1).strip()
+    return str(evidence[0].get("content", "")).strip()[:40]
+
+
+_COMPACT_FIELD = re.compile(r'^\[(\d+)\] (".*?")(?: \| (.*?) \| (\S+))?(?: \| evidence: ([E\d,]+))?$')
+
+
+def _decision_fields(prompt: str) -> List[Dict[str, Any]]:
+    """Fields of the decision prompt, from the JSON list or the compact one-line-per-cell form"""
+    if "Input fields:" in prompt:
+        try:
+            return json.loads(_section(prompt, "Input fields:", "Only return valid JSON."))
+        except ValueError:
+            return []
+    evidence = {}
+    for line in _section(prompt, "Evidence:", "Only return valid JSON.").splitlines():
+        ref, _, content = line.strip().partition(": ")
+        evidence[ref] = content
+    fields = []
+    for line in _section(prompt, "Cells:", "Evidence:").splitlines():
+        match = _COMPACT_FIELD.match(line.strip())
+        if not match:
+            continue
+        refs = (match.group(5) or "").split(",")
+        fields.append({"index": int(match.group(1)), "text": json.loads(match.group(2)),
+                       "description": match.group(3) or "",
+                       "rag_evidence": [{"content": evidence[ref]} for ref in refs if ref in evidence]})
+    return fields
+
+
+def decision_reply(prompt: str) -> Dict[str, Any]:
+    """Fill described cells that have evidence with the matching fact, restore the rest"""
+    filled, restored = [], []
+    for field in _decision_fields(prompt):
+        text = re.sub(r'\s*\[\d+\]$', '', str(field.get("text", "")))
+        evidence = field.get("rag_evidence") or []
+        if not text and evidence:
+            filled.append({"index": field["index"], "content": _evidence_value(field.get("description", ""), evidence)})
+        else:
+            restored.append({"index": field["index"], "restored_content": text})
+    return {"filled_cells": filled, "restored_cells": restored}
+
+
+def split_reply(prompt: str) -> List[str]:
+    """Split on sentence ends and pack the pieces into chunks of about 200 characters"""
+    text = _section(prompt, "Original text:")
+    chunks, current = [], ""
+    for piece in _SENTENCE_END.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and len(current) + len(piece) > 200:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Text parts of all messages; image parts are ignored"""
+    return "\n".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for message in messages
+        for part in (message.get("content") if isinstance(message.get("content"), list) else [message.get("content") or ""])
+    )
+
+
+def build_reply(prompt: str) -> str:
+    if '"fields_to_fill"' in prompt:
+        return json.dumps(analyze_reply(prompt), ensure_ascii=False)
+    if '"filled_cells"' in prompt:
+        return json.dumps(decision_reply(prompt), ensure_ascii=False)
+    if "Original text:" in prompt:
+        return json.dumps(split_reply(prompt), ensure_ascii=False)
+    if "knowledge" in prompt.lower() and "Document content:" in prompt:
+        return _section(prompt, "Document content:", "Please return")
+    return "{}"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown endpoint: {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        messages = request.get("messages") or []
+        started = time.perf_counter()
+        prompt = prompt_text(messages)
+        reply = build_reply(prompt)
+        delay = self.server.next_delay(len(prompt))
+        fault = self.server.next_fault()
+        if fault == "fail":
+            time.sleep(delay * FIRST_TOKEN_SHARE)
+            self.server.record(time.perf_counter() - started)
+            self._send(503, {"error": {"message": "mock: service unavailable", "type": "server_error"}})
+            return
+        if fault == "truncate":
+            reply = reply[:len(reply) // 2]
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(reply),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(reply),
+        }
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(request, reply, delay, usage if include_usage else None)
+            self.server.record(time.perf_counter() - started)
+            return
+
+        time.sleep(delay)
+        self.server.record(time.perf_counter() - started)
+        self._send(200, {
+            "id": f"chatcmpl-mock-{self.server.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, request: Dict[str, Any], reply: str, delay: float, usage: Optional[Dict[str, int]]):
+        """Send the reply as chat.completion.chunk events, spreading `delay` over the pieces"""
+        pieces = [reply[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(reply), STREAM_CHUNK_CHARS)] or [""]
+        base = {"id": f"chatcmpl-mock-{self.server.calls}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "mock")}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        time.sleep(delay * FIRST_TOKEN_SHARE)
+        step = delay * (1 - FIRST_TOKEN_SHARE) / len(pieces)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(step)
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            self._event({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if usage is not None:
+            self._event({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _event(self, payload: Dict[str, Any]):
+        self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Stub server with latency = latency_ms + per_kchar_ms * prompt_kchars +/- jitter_ms.
+    Jitter comes from a seeded generator, so a run is reproducible.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+                 per_kchar_ms: float = 0, seed: int = 0, verbose: bool = False,
+                 fail_rate: float = 0.0, truncate_rate: float = 0.0):
+        super().__init__((host, port), MockLLMHandler)
+        self.fail_rate = fail_rate
+        self.truncate_rate = truncate_rate
+        self.faults = {"fail": 0, "truncate": 0}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_kchar_ms = per_kchar_ms
+        self.verbose = verbose
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_delay(self, prompt_chars: int) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + self.per_kchar_ms * prompt_chars / 1000 + jitter) / 1000
+
+    def next_fault(self) -> Optional[str]:
+        """'fail' (503), 'truncate' (reply cut in half) or None, from the seeded generator"""
+        with self._lock:
+            roll = self._random.random() if self.fail_rate or self.truncate_rate else 1.0
+            fault = "fail" if roll < self.fail_rate else "truncate" if roll < self.fail_rate + self.truncate_rate else None
+            if fault:
+                self.faults[fault] += 1
+        return fault
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self.busy_seconds += seconds
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server with canned replies")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0, help='Base latency per call in ms (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0, help='Uniform +/- jitter in ms (default: %(default)s)')
+    parser.add_argument('--per-kchar', type=float, default=0, help='Extra ms per 1000 prompt characters (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of calls answered with 503 (default: %(default)s)')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Share of replies cut off halfway (default: %(default)s)')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.jitter, args.per_kchar, args.seed, args.verbose,
+                           args.fail_rate, args.truncate_rate)
+    print(f"Mock LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import os
+import json
+import urllib.parse
+import urllib.request
+import urllib.error
+from typing import Dict, List, Optional, Any, Callable
+
+# 支持的表格格式（.doc 由后端服务转换）
+FORM_EXTENSIONS = {'.xls', '.xlsx', '.docx', '.doc'}
+
+
+class RemoteFiller:
+    """
+    通过 HTTP 调用常驻后端服务（backend/main.py --serve）的 DocumentFiller 替身。
+    接口与 JobManager 使用的 DocumentFiller 方法一致；前端与服务共享文件系统，
+    因此只传递绝对路径。
+    """
+
+    def __init__(self, base_url: str, timeout: float = 3600):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.collection: Optional[str] = None
+        self.progress_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def use_collection(self, collection: str):
+        self.collection = collection
+
+    def add_progress_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self.progress_listeners:
+            self.progress_listeners.remove(listener)
+
+    def health(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.base_url}/health", timeout=10) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def metrics(self) -> str:
+        with urllib.request.urlopen(f"{self.base_url}/metrics", timeout=10) as response:
+            return response.read().decode("utf-8")
+
+    def _post(self, endpoint: str, payload: Dict[str, Any]):
+        request = urllib.request.Request(
+            f"{self.base_url}{endpoint}",
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def ingest_knowledge(self, knowledge_file: Optional[str] = None, knowledge_files: Optional[List[str]] = None) -> bool:
+        payload = {"collection": self.collection}
+        if knowledge_files:
+            payload["knowledge_files"] = [os.path.abspath(f) for f in knowledge_files]
+        elif knowledge_file:
+            payload["knowledge_file"] = os.path.abspath(knowledge_file)
+        try:
+            with self._post("/ingest", payload) as response:
+                return bool(json.loads(response.read().decode("utf-8")).get("success"))
+        except urllib.error.HTTPError:
+            return False
+
+    def drop_collection(self, collection: str):
+        request = urllib.request.Request(
+            f"{self.base_url}/collections/{urllib.parse.quote(collection, safe='')}", method="DELETE")
+        with urllib.request.urlopen(request, timeout=60):
+            pass
+
+    def prepare_form(self, file_path: str) -> Optional[str]:
+        ext = os.path.splitext(file_path)[1].lower()
+        return file_path if ext in FORM_EXTENSIONS else None
+
+    def process_document(self, file_path: str, output_dir: Optional[str] = None) -> str:
+        """提交表格并逐行读取服务推送的进度事件，返回输出文件路径（失败时返回输入路径）"""
+        payload = {
+            "collection": self.collection,
+            "file_path": os.path.abspath(file_path),
+            "output_dir": os.path.abspath(output_dir) if output_dir else None,
+            "stream": True,
+        }
+        result: Dict[str, Any] = {}
+        try:
+            with self._post("/process", payload) as response:
+                for line in response:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line.decode("utf-8"))
+                    if event.get("event") == "result":
+                        result = event
+                        continue
+                    for listener in list(self.progress_listeners):
+                        listener(event)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"后端服务返回错误: {e.code} {e.read().decode('utf-8', 'replace')}")
+        if not result.get("success"):
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+            return file_path
+        return result["output_path"]
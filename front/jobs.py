@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Any, Tuple
+
+# The backend is a flat script directory; make its modules importable in-process
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# 每个任务保留的最近事件数；更早的事件被丢弃，最后的任务状态事件总会保留
+MAX_JOB_EVENTS = int(os.environ.get("SHEET_FILL_MAX_JOB_EVENTS", "500"))
+
+
+class Job:
+    """状态：queued -> running -> succeeded / failed"""
+
+    def __init__(self, workspace, table_file: Dict[str, Any], material_files: List[Dict[str, Any]]):
+        self.id = str(uuid.uuid4())
+        self.workspace = workspace
+        self.session_id = workspace.session_id
+        self.table_file = table_file
+        self.material_files = material_files
+        # 只使用会话自己的知识库集合，不同用户之间互不可见
+        self.collection = workspace.collection
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.message = "任务排队中"
+        self.error: Optional[str] = None
+        self.output_path: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=MAX_JOB_EVENTS)
+        self.event_count = 0  # 包括已丢弃事件在内的事件总数
+        self.lock = threading.Lock()
+        self._waiters: List[tuple] = []
+
+    def update(self, **fields):
+        with self.lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+        self.add_event({"event": "job", "timestamp": time.time(), **self.to_dict()})
+
+    def add_event(self, event: Dict[str, Any]):
+        """Record a progress event (called from worker threads) and wake up event streams"""
+        with self.lock:
+            if event.get("event") == "stage_end" and event.get("position"):
+                # 处理阶段占 30%~100% 的进度
+                self.progress = max(self.progress, 0.3 + 0.7 * event["position"] / event["total"])
+            if event.get("event") == "stage_start" and self.status == "running":
+                self.stage = event.get("stage", self.stage)
+            self.events.append(event)
+            self.event_count += 1
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # 事件循环已关闭（客户端断开）
+                pass
+
+    def events_since(self, position: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Events from an absolute position on, skipping those already dropped, and the position after them"""
+        with self.lock:
+            first = self.event_count - len(self.events)
+            return list(itertools.islice(self.events, max(0, position - first), None)), self.event_count
+
+    def subscribe(self) -> asyncio.Event:
+        """Create an asyncio.Event set whenever a new event arrives; call from the event loop"""
+        waiter = asyncio.Event()
+        with self.lock:
+            self._waiters.append((asyncio.get_running_loop(), waiter))
+        return waiter
+
+    def unsubscribe(self, waiter: asyncio.Event):
+        with self.lock:
+            self._waiters = [(loop, w) for loop, w in self._waiters if w is not waiter]
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": round(self.progress, 3),
+                "message": self.message,
+                "error": self.error,
+                "table_file": self.table_file["original_name"],
+                "output_filename": os.path.basename(self.output_path) if self.output_path else None,
+                "result_url": f"/jobs/{self.id}/result" if self.status == "succeeded" else None,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    In-process fill job queue.
+    Jobs run on a fixed worker pool; every worker thread keeps its own
+    DocumentFiller (and through it the shared embedding model) warm across jobs.
+    The pool size is the concurrency limit: jobs of different sessions run side
+    by side, extra jobs wait in the queue.
+    """
+
+    def __init__(self, max_workers: int = 2, backend_url: Optional[str] = None):
+        self.max_workers = max_workers
+        # 设置后任务交给常驻后端服务处理，否则在本进程内处理
+        self.backend_url = backend_url
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fill-worker")
+        self.jobs: Dict[str, Job] = {}
+        self.jobs_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_filler(self):
+        filler = getattr(self._local, "filler", None)
+        if filler is None:
+            if self.backend_url:
+                from backend_client import RemoteFiller
+                filler = RemoteFiller(self.backend_url)
+            else:
+                from document_filler import DocumentFiller
+                filler = DocumentFiller(enable_monitoring=False)
+                filler.warm_up()
+            self._local.filler = filler
+        return filler
+
+    def warm_up(self):
+        """Create the worker fillers ahead of the first request"""
+        for _ in range(self.max_workers):
+            self.executor.submit(self._get_filler)
+
+    def submit(self, workspace, table_file: Dict[str, Any], material_files: List[Dict[str, Any]]) -> Job:
+        job = Job(workspace, table_file, material_files)
+        with self.jobs_lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def list(self, session_id: Optional[str] = None) -> List[Job]:
+        with self.jobs_lock:
+            return [job for job in self.jobs.values() if session_id is None or job.session_id == session_id]
+
+    def busy_sessions(self) -> set:
+        """会话 ID 集合：仍有排队或运行中任务的会话"""
+        with self.jobs_lock:
+            return {job.session_id for job in self.jobs.values() if not job.done}
+
+    def forget_session(self, session_id: str):
+        """Drop the finished jobs of a cleared or expired session"""
+        with self.jobs_lock:
+            self.jobs = {job_id: job for job_id, job in self.jobs.items()
+                         if job.session_id != session_id or not job.done}
+
+    def drop_collection(self, collection: str):
+        """删除知识库集合（在后端服务或本进程中）"""
+        if self.backend_url:
+            from backend_client import RemoteFiller
+            RemoteFiller(self.backend_url).drop_collection(collection)
+        else:
+            from rag_engine import drop_collection
+            drop_collection(collection)
+
+    def metrics_text(self) -> str:
+        """Prometheus 文本格式的指标；使用后端服务时附加服务进程的指标"""
+        import metrics
+        counts = {status: 0 for status in ("queued", "running", "succeeded", "failed")}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        for status, count in counts.items():
+            metrics.QUEUE_JOBS.labels(status=status).set(count)
+        text = metrics.render()
+        if self.backend_url:
+            from backend_client import RemoteFiller
+            try:
+                text += RemoteFiller(self.backend_url).metrics()
+            except Exception as e:
+                text += f"# backend metrics unavailable: {e}\n"
+        return text
+
+    def _ingest_materials(self, filler, job: Job) -> bool:
+        """
+        Add every material file of the job that is not yet in the collection.
+        Ingestion is serialized per session so concurrent jobs of one session
+        never embed the same file twice.
+        """
+        workspace = job.workspace
+        with workspace.ingest_lock:
+            with workspace.lock:
+                ingested = set(workspace.ingested_ids.get(job.collection, ()))
+            pending = [f for f in job.material_files if f["id"] not in ingested]
+            if not pending:
+                job.add_event({"event": "ingest_skipped", "timestamp": time.time(), "collection": job.collection})
+                return True
+            if not filler.ingest_knowledge(knowledge_files=[f["saved_path"] for f in pending]):
+                return False
+            with workspace.lock:
+                workspace.ingested_ids.setdefault(job.collection, set()).update(f["id"] for f in pending)
+            return True
+
+    def _run(self, job: Job):
+        job.update(status="running", stage="starting", message="正在加载模型", started_at=time.time(), progress=0.05)
+        filler = None
+        try:
+            filler = self._get_filler()
+            filler.use_collection(job.collection)
+            filler.add_progress_listener(job.add_event)
+
+            job.update(stage="ingest", message="正在构建知识库", progress=0.1)
+            # 全部资料文件都写入知识库，已入库的文件跳过
+            if not self._ingest_materials(filler, job):
+                raise RuntimeError("知识库构建失败")
+
+            job.update(stage="process", message="正在填写表格", progress=0.3)
+            form_path = filler.prepare_form(job.table_file["saved_path"])
+            if not form_path:
+                raise RuntimeError("不支持的表格格式")
+            # 每个任务单独的输出目录，同一会话中同名表格的并发任务不会互相覆盖
+            output_path = filler.process_document(form_path, output_dir=str(job.workspace.output_dir / job.id))
+            if not output_path or output_path == form_path or not os.path.exists(output_path):
+                raise RuntimeError("输出文件未生成")
+
+            job.update(status="succeeded", stage="done", message="表格填写完成", progress=1.0,
+                       output_path=output_path, finished_at=time.time())
+        except Exception as e:
+            job.update(status="failed", stage="failed", message="处理失败", error=str(e), finished_at=time.time())
+        finally:
+            if filler is not None:
+                filler.remove_progress_listener(job.add_event)
@@ -1,16 +1,20 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from typing import List
 import os
-import shutil
-import subprocess
+import json
+import asyncio
 from pathlib import Path
-import uuid
 import pandas as pd
 from docx import Document
 
+from jobs import JobManager
+from sessions import SessionStore, Workspace
+from uploads import save_upload_stream, commit_upload, discard_upload, media_type_for, UploadSizeLimit
+
 app = FastAPI(title="表格填写系统", description="上传资料文件和表格文件，自动填写表格")
 
 # 配置 CORS
@@ -22,6 +26,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 上传请求体在 multipart 解析之前按大小拦截
+app.add_middleware(UploadSizeLimit)
+
 # 创建必要的目录
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("output")
@@ -32,11 +39,42 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory=PUBLIC_DIR), name="static")
 
-# 存储上传的文件信息
-uploaded_files = {
-    "material_files": [],
-    "table_file": None
-}
+# 每个会话拥有独立的上传目录、输出目录和知识库集合
+SESSION_COOKIE = "session_id"
+SESSION_TTL = int(os.environ.get("SHEET_FILL_SESSION_TTL", str(24 * 3600)))
+session_store = SessionStore(UPLOAD_DIR, OUTPUT_DIR, ttl_seconds=SESSION_TTL)
+
+# 后台填写任务队列（工作线程常驻，模型只加载一次；线程数即并发上限）
+# 设置 SHEET_FILL_BACKEND_URL（如 http://127.0.0.1:8765）时由常驻后端服务处理任务
+MAX_WORKERS = int(os.environ.get("SHEET_FILL_WORKERS", "2"))
+BACKEND_URL = os.environ.get("SHEET_FILL_BACKEND_URL")
+job_manager = JobManager(max_workers=MAX_WORKERS, backend_url=BACKEND_URL)
+
+@app.on_event("startup")
+async def warm_up_workers():
+    """启动时预热工作线程中的 DocumentFiller"""
+    job_manager.warm_up()
+
+def get_workspace(request: Request, response: Response) -> Workspace:
+    """按 Cookie 或 X-Session-Id 请求头找到当前会话的工作区，没有则新建"""
+    session_id = request.headers.get("X-Session-Id") or request.cookies.get(SESSION_COOKIE)
+    workspace = session_store.get_or_create(session_id)
+    if workspace.session_id != session_id:
+        response.set_cookie(SESSION_COOKIE, workspace.session_id, max_age=SESSION_TTL, httponly=True, samesite="lax")
+    for expired in session_store.expire_idle(job_manager.busy_sessions()):
+        job_manager.forget_session(expired.session_id)
+        try:
+            job_manager.drop_collection(expired.collection)
+        except Exception as e:
+            print(f"删除过期会话的知识库集合失败 {expired.collection}: {e}")
+    return workspace
+
+def get_session_job(workspace: Workspace, job_id: str):
+    """只允许访问本会话的任务"""
+    job = job_manager.get(job_id)
+    if not job or job.session_id != workspace.session_id:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -56,194 +94,200 @@ async def api_root():
     """API 信息接口"""
     return {"message": "表格填写系统 API"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 指标（任务队列、流水线阶段、LLM 调用、RAG 检索、PDF 转换）"""
+    text = await run_in_threadpool(job_manager.metrics_text)
+    return Response(content=text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/session")
+async def get_session(workspace: Workspace = Depends(get_workspace)):
+    """返回（必要时创建）当前会话"""
+    return {"session_id": workspace.session_id, "collection": workspace.collection}
+
 @app.post("/upload/material")
-async def upload_material_files(files: List[UploadFile] = File(...)):
+async def upload_material_files(files: List[UploadFile] = File(...), workspace: Workspace = Depends(get_workspace)):
     """上传资料文件（可多个）"""
     try:
         saved_files = []
         for file in files:
             if not file.filename:
                 continue
-            
-            # 使用原始文件名，如果重名则添加时间戳
-            file_id = str(uuid.uuid4())
-            original_name = file.filename
-            file_path = UPLOAD_DIR / original_name
-            
-            # 如果文件已存在，添加唯一标识避免冲突
-            if file_path.exists():
-                name_parts = Path(original_name).stem
-                extension = Path(original_name).suffix
-                unique_name = f"{name_parts}_{file_id[:8]}{extension}"
-                file_path = UPLOAD_DIR / unique_name
-            
-            # 保存文件
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            file_info = {
-                "id": file_id,
-                "original_name": file.filename,
-                "saved_path": str(file_path),
-                "size": file_path.stat().st_size
-            }
-            
-            uploaded_files["material_files"].append(file_info)
+
+            file_info = await save_upload_stream(file, workspace.upload_dir)
+            with workspace.lock:
+                existing = workspace.find_material(file_info["sha256"])
+                if existing is None:
+                    file_info = commit_upload(file_info, workspace.upload_dir)
+                    workspace.material_files.append(file_info)
+            if existing is not None:
+                # 内容相同的文件只保留一份
+                discard_upload(file_info)
+                file_info = {**existing, "duplicate": True}
             saved_files.append(file_info)
         
         return {
             "message": f"成功上传 {len(saved_files)} 个资料文件",
             "files": saved_files
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
 @app.post("/upload/table")
-async def upload_table_file(file: UploadFile = File(...)):
+async def upload_table_file(file: UploadFile = File(...), workspace: Workspace = Depends(get_workspace)):
     """上传表格文件（仅一个）"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="未选择文件")
+
+    # 检查文件扩展名
+    allowed_extensions = {'.xlsx', '.xls', '.csv', '.doc', '.docx'}
+    file_extension = Path(file.filename).suffix.lower()
+    if file_extension not in allowed_extensions:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"不支持的文件格式。支持的格式: {', '.join(allowed_extensions)}"
+        )
+
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="未选择文件")
-        
-        # 检查文件扩展名
-        allowed_extensions = {'.xlsx', '.xls', '.csv', '.doc', '.docx'}
-        file_extension = Path(file.filename).suffix.lower()
-        if file_extension not in allowed_extensions:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"不支持的文件格式。支持的格式: {', '.join(allowed_extensions)}"
-            )
-        
-        # 如果已经有表格文件，删除旧的
-        if uploaded_files["table_file"]:
-            old_path = Path(uploaded_files["table_file"]["saved_path"])
-            if old_path.exists():
-                old_path.unlink()
-        
-        # 使用原始文件名，如果重名则添加时间戳
-        file_id = str(uuid.uuid4())
-        original_name = file.filename
-        file_path = UPLOAD_DIR / original_name
-        
-        # 如果文件已存在，添加唯一标识避免冲突
-        if file_path.exists():
-            name_parts = Path(original_name).stem
-            extension = Path(original_name).suffix
-            unique_name = f"{name_parts}_{file_id[:8]}{extension}"
-            file_path = UPLOAD_DIR / unique_name
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_info = {
-            "id": file_id,
-            "original_name": file.filename,
-            "saved_path": str(file_path),
-            "size": file_path.stat().st_size
-        }
-        
-        uploaded_files["table_file"] = file_info
+        file_info = await save_upload_stream(file, workspace.upload_dir)
+
+        with workspace.lock:
+            current = workspace.table_file
+            duplicate = current is not None and current.get("sha256") == file_info["sha256"]
+            if not duplicate:
+                # 替换记录（旧文件可能仍被排队中的任务使用，随会话清理）
+                file_info = commit_upload(file_info, workspace.upload_dir)
+                workspace.table_file = file_info
+        if duplicate:
+            discard_upload(file_info)
+            file_info = {**current, "duplicate": True}
         
         return {
             "message": "表格文件上传成功",
             "file": file_info
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
 @app.get("/files/status")
-async def get_files_status():
-    """获取已上传文件的状态"""
+async def get_files_status(workspace: Workspace = Depends(get_workspace)):
+    """获取当前会话已上传文件的状态"""
+    snapshot = workspace.snapshot()
     return {
-        "material_files": uploaded_files["material_files"],
-        "table_file": uploaded_files["table_file"],
-        "material_count": len(uploaded_files["material_files"]),
-        "has_table": uploaded_files["table_file"] is not None
+        "session_id": workspace.session_id,
+        "material_files": snapshot["material_files"],
+        "table_file": snapshot["table_file"],
+        "material_count": len(snapshot["material_files"]),
+        "has_table": snapshot["table_file"] is not None
     }
 
 @app.post("/process")
-async def process_files():
-    """处理文件并填写表格"""
-    try:
-        if not uploaded_files["table_file"]:
-            raise HTTPException(status_code=400, detail="请先上传表格文件")
-        
-        if not uploaded_files["material_files"]:
-            raise HTTPException(status_code=400, detail="请先上传资料文件")
-        
-        # 获取表格文件路径和资料文件路径
-        table_file_path = uploaded_files["table_file"]["saved_path"]
-        table_file_name = uploaded_files["table_file"]["original_name"]
-        table_file_id = uploaded_files["table_file"]["id"]
-        
-        # 假设第一个资料文件是知识库文件
-        knowledge_file_path = uploaded_files["material_files"][0]["saved_path"]
- 
-        main_args = ['--knowledge', knowledge_file_path, '--forms', table_file_path]
-        print("开始运行 main.py ... 参数:", main_args)
-        subprocess.run(['python', 'backend/main.py'] + main_args)
-    
-        # 查找生成的输出文件（文件名保持不变，位于output目录下）
-        output_file_path = OUTPUT_DIR / table_file_name
-        if not output_file_path.exists():
-            raise Exception("输出文件未生成")
-        
-        return {
-            "message": "表格填写完成",
-            "download_url": f"/download/{table_file_id}",
-            "result": {
-                "output_filename": table_file_name
-            }
-        }
+async def process_files(workspace: Workspace = Depends(get_workspace)):
+    """提交填写任务，立即返回任务 ID（只使用会话自己的知识库集合）"""
+    snapshot = workspace.snapshot()
+    if not snapshot["table_file"]:
+        raise HTTPException(status_code=400, detail="请先上传表格文件")
 
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=500, detail="处理超时，请稍后重试")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
+    if not snapshot["material_files"]:
+        raise HTTPException(status_code=400, detail="请先上传资料文件")
+
+    job = job_manager.submit(workspace, snapshot["table_file"], snapshot["material_files"])
+
+    return {
+        "message": "任务已提交",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }
+
+@app.get("/jobs")
+async def list_jobs(workspace: Workspace = Depends(get_workspace)):
+    """列出当前会话的任务"""
+    return {"jobs": [job.to_dict() for job in job_manager.list(workspace.session_id)]}
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, workspace: Workspace = Depends(get_workspace)):
+    """查询任务状态和进度"""
+    return get_session_job(workspace, job_id).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, workspace: Workspace = Depends(get_workspace)):
+    """通过 Server-Sent Events 推送任务进度事件，任务结束后关闭连接"""
+    job = get_session_job(workspace, job_id)
+
+    async def event_stream():
+        waiter = job.subscribe()
+        position = 0
+        try:
+            while True:
+                waiter.clear()
+                events, position = job.events_since(position)
+                for event in events:
+                    yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+                if job.done and not job.events_since(position)[0]:
+                    break
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 保持连接
+                    yield ": keep-alive\n\n"
+        finally:
+            job.unsubscribe(waiter)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, workspace: Workspace = Depends(get_workspace)):
+    """下载任务结果"""
+    job = get_session_job(workspace, job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"处理失败: {job.error}")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail="任务尚未完成")
+
+    output_path = Path(job.output_path)
+    if not output_path.exists():
+        raise HTTPException(status_code=404, detail="处理后的文件不存在")
+    return FileResponse(
+        path=output_path,
+        filename=f"filled_{Path(job.table_file['original_name']).stem}{output_path.suffix}",
+        media_type=media_type_for(output_path)
+    )
 
 @app.get("/download/{file_id}")
-async def download_file(file_id: str):
-    """下载处理后的文件"""
-    try:
-        # 通过file_id找到对应的原始文件名
-        if uploaded_files["table_file"] and uploaded_files["table_file"]["id"] == file_id:
-            original_filename = uploaded_files["table_file"]["original_name"]
-            output_file_path = OUTPUT_DIR / original_filename
-            
-            if not output_file_path.exists():
-                raise HTTPException(status_code=404, detail="处理后的文件不存在")
-            
-            return FileResponse(
-                path=output_file_path,
-                filename=f"filled_{original_filename}",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            raise HTTPException(status_code=404, detail="文件ID不存在")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"下载失败: {str(e)}")
+async def download_file(file_id: str, workspace: Workspace = Depends(get_workspace)):
+    """下载表格文件最近一次成功填写的结果"""
+    jobs = [job for job in job_manager.list(workspace.session_id)
+            if job.table_file["id"] == file_id and job.status == "succeeded"]
+    if not jobs:
+        raise HTTPException(status_code=404, detail="文件ID不存在")
+
+    job = max(jobs, key=lambda j: j.finished_at or 0)
+    output_file_path = Path(job.output_path)
+    if not output_file_path.exists():
+        raise HTTPException(status_code=404, detail="处理后的文件不存在")
+
+    return FileResponse(
+        path=output_file_path,
+        filename=f"filled_{Path(job.table_file['original_name']).stem}{output_file_path.suffix}",
+        media_type=media_type_for(output_file_path)
+    )
 
 @app.delete("/clear")
-async def clear_files():
-    """清空所有上传的文件"""
+async def clear_files(workspace: Workspace = Depends(get_workspace)):
+    """清空当前会话上传的文件、输出文件和知识库集合"""
+    if workspace.session_id in job_manager.busy_sessions():
+        raise HTTPException(status_code=409, detail="仍有任务在处理中，请稍后再清空")
     try:
-        # 删除上传的文件
-        for file_info in uploaded_files["material_files"]:
-            file_path = Path(file_info["saved_path"])
-            if file_path.exists():
-                file_path.unlink()
-        
-        if uploaded_files["table_file"]:
-            file_path = Path(uploaded_files["table_file"]["saved_path"])
-            if file_path.exists():
-                file_path.unlink()
-        
-        # 清空记录
-        uploaded_files["material_files"] = []
-        uploaded_files["table_file"] = None
-        
+        workspace.clear()
+        await run_in_threadpool(job_manager.drop_collection, workspace.collection)
+        job_manager.forget_session(workspace.session_id)
+
         return {"message": "已清空所有文件"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"清空失败: {str(e)}")
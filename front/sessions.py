@@ -0,0 +1,98 @@
+import time
+import uuid
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+
+class Workspace:
+    """单个会话的上传目录、输出目录和知识库集合"""
+
+    def __init__(self, session_id: str, upload_root: Path, output_root: Path):
+        self.session_id = session_id
+        self.upload_dir = upload_root / session_id
+        self.output_dir = output_root / session_id
+        self.collection = f"session_{session_id}"
+        self.material_files: List[Dict[str, Any]] = []
+        self.table_file: Optional[Dict[str, Any]] = None
+        # 每个知识库集合中已写入的资料文件 ID，避免重复入库
+        self.ingested_ids: Dict[str, set] = {}
+        self.last_active = time.time()
+        self.lock = threading.RLock()
+        # 入库过程串行化，同一会话的并发任务不会重复入库
+        self.ingest_lock = threading.Lock()
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def find_material(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """按内容哈希查找已上传的资料文件"""
+        with self.lock:
+            for file_info in self.material_files:
+                if file_info.get("sha256") == sha256:
+                    return file_info
+        return None
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "material_files": [dict(f) for f in self.material_files],
+                "table_file": dict(self.table_file) if self.table_file else None,
+            }
+
+    def clear(self):
+        """删除该会话的全部上传文件和输出文件"""
+        with self.lock:
+            shutil.rmtree(self.upload_dir, ignore_errors=True)
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+            self.upload_dir.mkdir(parents=True, exist_ok=True)
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.material_files = []
+            self.table_file = None
+            self.ingested_ids = {}
+
+
+class SessionStore:
+    """按会话 ID 管理相互隔离的工作区"""
+
+    def __init__(self, upload_root: Path, output_root: Path, ttl_seconds: int = 24 * 3600):
+        self.upload_root = upload_root
+        self.output_root = output_root
+        self.ttl_seconds = ttl_seconds
+        self.workspaces: Dict[str, Workspace] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_id(session_id: Optional[str]) -> bool:
+        if not session_id:
+            return False
+        try:
+            return uuid.UUID(session_id).hex == session_id
+        except ValueError:
+            return False
+
+    def get_or_create(self, session_id: Optional[str]) -> Workspace:
+        with self.lock:
+            if not self.is_valid_id(session_id):
+                session_id = uuid.uuid4().hex
+            workspace = self.workspaces.get(session_id)
+            if workspace is None:
+                workspace = Workspace(session_id, self.upload_root, self.output_root)
+                self.workspaces[session_id] = workspace
+            workspace.touch()
+            return workspace
+
+    def expire_idle(self, busy_sessions: set) -> List[Workspace]:
+        """清理长时间未活动且没有运行中任务的会话的文件，返回被清理的工作区（知识库集合由调用方删除）"""
+        now = time.time()
+        with self.lock:
+            expired = [sid for sid, ws in self.workspaces.items()
+                       if now - ws.last_active > self.ttl_seconds and sid not in busy_sessions]
+            removed = [self.workspaces.pop(sid) for sid in expired]
+        for workspace in removed:
+            shutil.rmtree(workspace.upload_dir, ignore_errors=True)
+            shutil.rmtree(workspace.output_dir, ignore_errors=True)
+        return removed
@@ -0,0 +1,164 @@
+import os
+import json
+import uuid
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import aiofiles
+except ImportError:  # aiofiles 可选，缺失时写文件交给线程池
+    aiofiles = None
+
+# 单个上传文件的大小上限与读写块大小
+MAX_UPLOAD_BYTES = int(float(os.environ.get("SHEET_FILL_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 整个上传请求体（可含多个文件）的大小上限，在 multipart 解析、落盘之前检查
+MAX_REQUEST_BYTES = int(float(os.environ.get("SHEET_FILL_MAX_REQUEST_MB", "200")) * 1024 * 1024)
+
+MEDIA_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xls": "application/vnd.ms-excel",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+    ".csv": "text/csv",
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+}
+
+
+def media_type_for(path) -> str:
+    """根据扩展名返回下载时使用的 Content-Type"""
+    ext = Path(path).suffix.lower()
+    return MEDIA_TYPES.get(ext) or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+
+
+def unique_path(directory: Path, original_name: str, file_id: str) -> Path:
+    """使用原始文件名，重名时添加唯一标识避免冲突"""
+    original_name = Path(original_name).name
+    file_path = directory / original_name
+    if file_path.exists():
+        file_path = directory / f"{Path(original_name).stem}_{file_id[:8]}{Path(original_name).suffix}"
+    return file_path
+
+
+class UploadSizeLimit:
+    """
+    ASGI 中间件：限制上传接口的请求体大小。
+    Starlette 在调用接口之前就会把整个 multipart 请求体解析并缓存到临时文件，
+    因此必须在这里拦截：Content-Length 超限直接返回 413；没有 Content-Length
+    （分块传输）时边接收边计数，超限即中止。
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, path_prefix: str = "/upload"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"上传请求过大（上限 {self.max_bytes // (1024 * 1024)} MB）"
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": self._detail()}, ensure_ascii=False).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _open_binary(path: Path):
+    return open(path, "wb")
+
+
+async def save_upload_stream(file: UploadFile, directory: Path,
+                             max_bytes: int = MAX_UPLOAD_BYTES) -> Dict[str, Any]:
+    """
+    分块写入上传文件，同时增量计算 sha256。
+    文件先写入临时名，超过 max_bytes 时删除并返回 413；
+    返回的 file_info 包含 sha256，调用方据此去重。
+    注意：此时 Starlette 已把请求体缓存到临时文件，max_bytes 只限制复制到工作区的
+    单个文件；服务端接收的请求体大小由 UploadSizeLimit 中间件限制。
+    """
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"文件过大: {file.filename}（上限 {max_bytes // (1024 * 1024)} MB）")
+
+    file_id = str(uuid.uuid4())
+    temp_path = directory / f".upload_{file_id}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    if aiofiles is not None:
+        out = await aiofiles.open(temp_path, "wb")
+        write, close = out.write, out.close
+    else:
+        out = await run_in_threadpool(_open_binary, temp_path)
+        write = lambda data: run_in_threadpool(out.write, data)
+        close = lambda: run_in_threadpool(out.close)
+
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"文件过大: {file.filename}（上限 {max_bytes // (1024 * 1024)} MB）")
+            digest.update(chunk)
+            await write(chunk)
+    except BaseException:
+        await close()
+        temp_path.unlink(missing_ok=True)
+        raise
+    await close()
+
+    return {
+        "id": file_id,
+        "original_name": file.filename,
+        "temp_path": temp_path,
+        "sha256": digest.hexdigest(),
+        "size": size,
+    }
+
+
+def commit_upload(file_info: Dict[str, Any], directory: Path) -> Dict[str, Any]:
+    """把临时文件改名为最终文件名，返回对外的 file_info"""
+    temp_path = file_info.pop("temp_path")
+    file_path = unique_path(directory, file_info["original_name"], file_info["id"])
+    os.replace(temp_path, file_path)
+    file_info["saved_path"] = str(file_path)
+    return file_info
+
+
+def discard_upload(file_info: Dict[str, Any]):
+    temp_path: Optional[Path] = file_info.pop("temp_path", None)
+    if temp_path is not None:
+        temp_path.unlink(missing_ok=True)